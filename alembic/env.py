@@ -30,6 +30,15 @@ if config.config_file_name is not None:
 
 config.set_main_option("sqlalchemy.url", settings.DATABASES["default"]["sync_engine"])
 
+
+def include_name(name, type_, parent_names):
+    # FTS5 tables (and their shadow tables) are not in the metadata,
+    # see fastbg.search
+    if type_ == "table":
+        return "_fts" not in name
+    return True
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -49,6 +58,7 @@ def run_migrations_offline() -> None:
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
         render_as_batch=True,
+        include_name=include_name,
     )
 
     with context.begin_transaction():
@@ -71,6 +81,7 @@ def run_migrations_online() -> None:
     with connectable.connect() as connection:
         context.configure(
             connection=connection, target_metadata=target_metadata, render_as_batch=True,
+            include_name=include_name,
         )
 
         with context.begin_transaction():
@@ -0,0 +1,32 @@
+"""Add (updated_at, id) seek indexes
+
+Revision ID: 293120445cc1
+Revises: 63428ea3174d
+Create Date: 2026-10-17 09:12:40.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "293120445cc1"
+down_revision: Union[str, Sequence[str], None] = "63428ea3174d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ["user", "post", "comment", "tag", "post_tags"]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in TABLES:
+        op.create_index(f"ix_{table}_updated_at_id", table, ["updated_at", "id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TABLES:
+        op.drop_index(f"ix_{table}_updated_at_id", table_name=table)
@@ -0,0 +1,32 @@
+"""Add (post_id, parent_comment_id) index on comment
+
+Revision ID: 4b7d2e9a1c3f
+Revises: 626c5ed543d1
+Create Date: 2026-10-17 11:02:17.204931
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "4b7d2e9a1c3f"
+down_revision: Union[str, Sequence[str], None] = "626c5ed543d1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_comment_post_id_parent_comment_id",
+        "comment",
+        ["post_id", "parent_comment_id"],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_comment_post_id_parent_comment_id", table_name="comment")
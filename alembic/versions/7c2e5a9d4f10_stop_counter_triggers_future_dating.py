@@ -0,0 +1,316 @@
+"""Stop counter triggers from stamping versions ahead of the clock
+
+Revision ID: 7c2e5a9d4f10
+Revises: 3d9a47c1e8b6
+Create Date: 2026-10-17 21:40:12.118406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "7c2e5a9d4f10"
+down_revision: Union[str, Sequence[str], None] = "3d9a47c1e8b6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRIGGER_NAMES = [
+    "post_comment_count_ai",
+    "post_comment_count_ad",
+    "post_comment_count_au",
+    "comment_reply_count_ai",
+    "comment_reply_count_ad",
+    "comment_reply_count_au",
+    "tag_post_count_ai",
+    "tag_post_count_ad",
+    "tag_post_count_au",
+    "tag_post_count_live",
+    "tag_post_count_pd",
+]
+
+# the counter triggers of fastbg.counters at this revision: updated_at is
+# SQLite's clock, or one microsecond past a previous version not behind it
+TRIGGERS = [
+    (
+        "CREATE TRIGGER IF NOT EXISTS post_comment_count_ai AFTER INSERT ON "
+        "comment WHEN new.is_soft_deleted = 0 BEGIN UPDATE post SET "
+        "comment_count = comment_count + 1, updated_at = CASE WHEN "
+        "strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' > COALESCE(updated_at, "
+        "'') THEN strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' WHEN "
+        "substr(updated_at, 21) < '999999' THEN substr(updated_at, 1, 20) || "
+        "printf('%06d', substr(updated_at, 21) + 1) ELSE strftime('%Y-%m-%d "
+        "%H:%M:%S', updated_at, '+1 seconds') || '.000000' END WHERE id = "
+        "new.post_id; END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS post_comment_count_ad AFTER DELETE ON "
+        "comment WHEN old.is_soft_deleted = 0 BEGIN UPDATE post SET "
+        "comment_count = comment_count - 1, updated_at = CASE WHEN "
+        "strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' > COALESCE(updated_at, "
+        "'') THEN strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' WHEN "
+        "substr(updated_at, 21) < '999999' THEN substr(updated_at, 1, 20) || "
+        "printf('%06d', substr(updated_at, 21) + 1) ELSE strftime('%Y-%m-%d "
+        "%H:%M:%S', updated_at, '+1 seconds') || '.000000' END WHERE id = "
+        "old.post_id; END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS post_comment_count_au AFTER UPDATE OF "
+        "is_soft_deleted, post_id ON comment WHEN old.is_soft_deleted IS NOT "
+        "new.is_soft_deleted OR old.post_id IS NOT new.post_id BEGIN UPDATE "
+        "post SET comment_count = comment_count - 1, updated_at = CASE WHEN "
+        "strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' > COALESCE(updated_at, "
+        "'') THEN strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' WHEN "
+        "substr(updated_at, 21) < '999999' THEN substr(updated_at, 1, 20) || "
+        "printf('%06d', substr(updated_at, 21) + 1) ELSE strftime('%Y-%m-%d "
+        "%H:%M:%S', updated_at, '+1 seconds') || '.000000' END WHERE id = "
+        "old.post_id AND old.is_soft_deleted = 0; UPDATE post SET "
+        "comment_count = comment_count + 1, updated_at = CASE WHEN "
+        "strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' > COALESCE(updated_at, "
+        "'') THEN strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' WHEN "
+        "substr(updated_at, 21) < '999999' THEN substr(updated_at, 1, 20) || "
+        "printf('%06d', substr(updated_at, 21) + 1) ELSE strftime('%Y-%m-%d "
+        "%H:%M:%S', updated_at, '+1 seconds') || '.000000' END WHERE id = "
+        "new.post_id AND new.is_soft_deleted = 0; END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS comment_reply_count_ai AFTER INSERT ON "
+        "comment WHEN new.is_soft_deleted = 0 BEGIN UPDATE comment SET "
+        "reply_count = reply_count + 1, updated_at = CASE WHEN "
+        "strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' > COALESCE(updated_at, "
+        "'') THEN strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' WHEN "
+        "substr(updated_at, 21) < '999999' THEN substr(updated_at, 1, 20) || "
+        "printf('%06d', substr(updated_at, 21) + 1) ELSE strftime('%Y-%m-%d "
+        "%H:%M:%S', updated_at, '+1 seconds') || '.000000' END WHERE id = "
+        "new.parent_comment_id; END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS comment_reply_count_ad AFTER DELETE ON "
+        "comment WHEN old.is_soft_deleted = 0 BEGIN UPDATE comment SET "
+        "reply_count = reply_count - 1, updated_at = CASE WHEN "
+        "strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' > COALESCE(updated_at, "
+        "'') THEN strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' WHEN "
+        "substr(updated_at, 21) < '999999' THEN substr(updated_at, 1, 20) || "
+        "printf('%06d', substr(updated_at, 21) + 1) ELSE strftime('%Y-%m-%d "
+        "%H:%M:%S', updated_at, '+1 seconds') || '.000000' END WHERE id = "
+        "old.parent_comment_id; END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS comment_reply_count_au AFTER UPDATE OF "
+        "is_soft_deleted, parent_comment_id ON comment WHEN "
+        "old.is_soft_deleted IS NOT new.is_soft_deleted OR "
+        "old.parent_comment_id IS NOT new.parent_comment_id BEGIN UPDATE "
+        "comment SET reply_count = reply_count - 1, updated_at = CASE WHEN "
+        "strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' > COALESCE(updated_at, "
+        "'') THEN strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' WHEN "
+        "substr(updated_at, 21) < '999999' THEN substr(updated_at, 1, 20) || "
+        "printf('%06d', substr(updated_at, 21) + 1) ELSE strftime('%Y-%m-%d "
+        "%H:%M:%S', updated_at, '+1 seconds') || '.000000' END WHERE id = "
+        "old.parent_comment_id AND old.is_soft_deleted = 0; UPDATE comment SET "
+        "reply_count = reply_count + 1, updated_at = CASE WHEN "
+        "strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' > COALESCE(updated_at, "
+        "'') THEN strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' WHEN "
+        "substr(updated_at, 21) < '999999' THEN substr(updated_at, 1, 20) || "
+        "printf('%06d', substr(updated_at, 21) + 1) ELSE strftime('%Y-%m-%d "
+        "%H:%M:%S', updated_at, '+1 seconds') || '.000000' END WHERE id = "
+        "new.parent_comment_id AND new.is_soft_deleted = 0; END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS tag_post_count_ai AFTER INSERT ON "
+        "post_tags BEGIN UPDATE tag SET post_count = post_count + 1, "
+        "updated_at = CASE WHEN strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' "
+        "> COALESCE(updated_at, '') THEN strftime('%Y-%m-%d %H:%M:%f', 'now') "
+        "|| '000' WHEN substr(updated_at, 21) < '999999' THEN "
+        "substr(updated_at, 1, 20) || printf('%06d', substr(updated_at, 21) + "
+        "1) ELSE strftime('%Y-%m-%d %H:%M:%S', updated_at, '+1 seconds') || "
+        "'.000000' END WHERE id = new.tag_id AND EXISTS (SELECT 1 FROM post "
+        "WHERE id = new.post_id AND is_soft_deleted = 0); END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS tag_post_count_ad AFTER DELETE ON "
+        "post_tags BEGIN UPDATE tag SET post_count = post_count - 1, "
+        "updated_at = CASE WHEN strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' "
+        "> COALESCE(updated_at, '') THEN strftime('%Y-%m-%d %H:%M:%f', 'now') "
+        "|| '000' WHEN substr(updated_at, 21) < '999999' THEN "
+        "substr(updated_at, 1, 20) || printf('%06d', substr(updated_at, 21) + "
+        "1) ELSE strftime('%Y-%m-%d %H:%M:%S', updated_at, '+1 seconds') || "
+        "'.000000' END WHERE id = old.tag_id AND EXISTS (SELECT 1 FROM post "
+        "WHERE id = old.post_id AND is_soft_deleted = 0); END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS tag_post_count_au AFTER UPDATE OF "
+        "post_id, tag_id ON post_tags BEGIN UPDATE tag SET post_count = "
+        "post_count - 1, updated_at = CASE WHEN strftime('%Y-%m-%d %H:%M:%f', "
+        "'now') || '000' > COALESCE(updated_at, '') THEN strftime('%Y-%m-%d "
+        "%H:%M:%f', 'now') || '000' WHEN substr(updated_at, 21) < '999999' "
+        "THEN substr(updated_at, 1, 20) || printf('%06d', substr(updated_at, "
+        "21) + 1) ELSE strftime('%Y-%m-%d %H:%M:%S', updated_at, '+1 seconds') "
+        "|| '.000000' END WHERE id = old.tag_id AND EXISTS (SELECT 1 FROM post "
+        "WHERE id = old.post_id AND is_soft_deleted = 0); UPDATE tag SET "
+        "post_count = post_count + 1, updated_at = CASE WHEN "
+        "strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' > COALESCE(updated_at, "
+        "'') THEN strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' WHEN "
+        "substr(updated_at, 21) < '999999' THEN substr(updated_at, 1, 20) || "
+        "printf('%06d', substr(updated_at, 21) + 1) ELSE strftime('%Y-%m-%d "
+        "%H:%M:%S', updated_at, '+1 seconds') || '.000000' END WHERE id = "
+        "new.tag_id AND EXISTS (SELECT 1 FROM post WHERE id = new.post_id AND "
+        "is_soft_deleted = 0); END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS tag_post_count_live AFTER UPDATE OF "
+        "is_soft_deleted ON post WHEN old.is_soft_deleted IS NOT "
+        "new.is_soft_deleted BEGIN UPDATE tag SET post_count = post_count + "
+        "(CASE WHEN new.is_soft_deleted = 0 THEN 1 ELSE -1 END) * (SELECT "
+        "COUNT(*) FROM post_tags WHERE post_id = new.id AND tag_id = tag.id), "
+        "updated_at = CASE WHEN strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' "
+        "> COALESCE(updated_at, '') THEN strftime('%Y-%m-%d %H:%M:%f', 'now') "
+        "|| '000' WHEN substr(updated_at, 21) < '999999' THEN "
+        "substr(updated_at, 1, 20) || printf('%06d', substr(updated_at, 21) + "
+        "1) ELSE strftime('%Y-%m-%d %H:%M:%S', updated_at, '+1 seconds') || "
+        "'.000000' END WHERE id IN (SELECT tag_id FROM post_tags WHERE post_id "
+        "= new.id); END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS tag_post_count_pd AFTER DELETE ON post "
+        "WHEN old.is_soft_deleted = 0 BEGIN UPDATE tag SET post_count = "
+        "post_count - (SELECT COUNT(*) FROM post_tags WHERE post_id = old.id "
+        "AND tag_id = tag.id), updated_at = CASE WHEN strftime('%Y-%m-%d "
+        "%H:%M:%f', 'now') || '000' > COALESCE(updated_at, '') THEN "
+        "strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' WHEN substr(updated_at, "
+        "21) < '999999' THEN substr(updated_at, 1, 20) || printf('%06d', "
+        "substr(updated_at, 21) + 1) ELSE strftime('%Y-%m-%d %H:%M:%S', "
+        "updated_at, '+1 seconds') || '.000000' END WHERE id IN (SELECT tag_id "
+        "FROM post_tags WHERE post_id = old.id); END"
+    ),
+]
+
+# as created by 3d9a47c1e8b6
+PREVIOUS_TRIGGERS = [
+    (
+        "CREATE TRIGGER IF NOT EXISTS post_comment_count_ai AFTER INSERT ON "
+        "comment WHEN new.is_soft_deleted = 0 BEGIN UPDATE post SET "
+        "comment_count = comment_count + 1, updated_at = MAX(strftime('%Y-%m-%d"
+        " %H:%M:%f', 'now', '+0.001 seconds'), strftime('%Y-%m-%d %H:%M:%f', "
+        "COALESCE(updated_at, 'now'), '+0.001 seconds')) || '000' WHERE id = "
+        "new.post_id; END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS post_comment_count_ad AFTER DELETE ON "
+        "comment WHEN old.is_soft_deleted = 0 BEGIN UPDATE post SET "
+        "comment_count = comment_count - 1, updated_at = MAX(strftime('%Y-%m-%d"
+        " %H:%M:%f', 'now', '+0.001 seconds'), strftime('%Y-%m-%d %H:%M:%f', "
+        "COALESCE(updated_at, 'now'), '+0.001 seconds')) || '000' WHERE id = "
+        "old.post_id; END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS post_comment_count_au AFTER UPDATE OF "
+        "is_soft_deleted, post_id ON comment WHEN old.is_soft_deleted IS NOT "
+        "new.is_soft_deleted OR old.post_id IS NOT new.post_id BEGIN UPDATE "
+        "post SET comment_count = comment_count - 1, updated_at = "
+        "MAX(strftime('%Y-%m-%d %H:%M:%f', 'now', '+0.001 seconds'), "
+        "strftime('%Y-%m-%d %H:%M:%f', COALESCE(updated_at, 'now'), '+0.001 "
+        "seconds')) || '000' WHERE id = old.post_id AND old.is_soft_deleted = "
+        "0; UPDATE post SET comment_count = comment_count + 1, updated_at = "
+        "MAX(strftime('%Y-%m-%d %H:%M:%f', 'now', '+0.001 seconds'), "
+        "strftime('%Y-%m-%d %H:%M:%f', COALESCE(updated_at, 'now'), '+0.001 "
+        "seconds')) || '000' WHERE id = new.post_id AND new.is_soft_deleted = "
+        "0; END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS comment_reply_count_ai AFTER INSERT ON "
+        "comment WHEN new.is_soft_deleted = 0 BEGIN UPDATE comment SET "
+        "reply_count = reply_count + 1, updated_at = MAX(strftime('%Y-%m-%d "
+        "%H:%M:%f', 'now', '+0.001 seconds'), strftime('%Y-%m-%d %H:%M:%f', "
+        "COALESCE(updated_at, 'now'), '+0.001 seconds')) || '000' WHERE id = "
+        "new.parent_comment_id; END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS comment_reply_count_ad AFTER DELETE ON "
+        "comment WHEN old.is_soft_deleted = 0 BEGIN UPDATE comment SET "
+        "reply_count = reply_count - 1, updated_at = MAX(strftime('%Y-%m-%d "
+        "%H:%M:%f', 'now', '+0.001 seconds'), strftime('%Y-%m-%d %H:%M:%f', "
+        "COALESCE(updated_at, 'now'), '+0.001 seconds')) || '000' WHERE id = "
+        "old.parent_comment_id; END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS comment_reply_count_au AFTER UPDATE OF "
+        "is_soft_deleted, parent_comment_id ON comment WHEN old.is_soft_deleted"
+        " IS NOT new.is_soft_deleted OR old.parent_comment_id IS NOT "
+        "new.parent_comment_id BEGIN UPDATE comment SET reply_count = "
+        "reply_count - 1, updated_at = MAX(strftime('%Y-%m-%d %H:%M:%f', 'now',"
+        " '+0.001 seconds'), strftime('%Y-%m-%d %H:%M:%f', COALESCE(updated_at,"
+        " 'now'), '+0.001 seconds')) || '000' WHERE id = old.parent_comment_id "
+        "AND old.is_soft_deleted = 0; UPDATE comment SET reply_count = "
+        "reply_count + 1, updated_at = MAX(strftime('%Y-%m-%d %H:%M:%f', 'now',"
+        " '+0.001 seconds'), strftime('%Y-%m-%d %H:%M:%f', COALESCE(updated_at,"
+        " 'now'), '+0.001 seconds')) || '000' WHERE id = new.parent_comment_id "
+        "AND new.is_soft_deleted = 0; END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS tag_post_count_ai AFTER INSERT ON "
+        "post_tags BEGIN UPDATE tag SET post_count = post_count + 1, updated_at"
+        " = MAX(strftime('%Y-%m-%d %H:%M:%f', 'now', '+0.001 seconds'), "
+        "strftime('%Y-%m-%d %H:%M:%f', COALESCE(updated_at, 'now'), '+0.001 "
+        "seconds')) || '000' WHERE id = new.tag_id AND EXISTS (SELECT 1 FROM "
+        "post WHERE id = new.post_id AND is_soft_deleted = 0); END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS tag_post_count_ad AFTER DELETE ON "
+        "post_tags BEGIN UPDATE tag SET post_count = post_count - 1, updated_at"
+        " = MAX(strftime('%Y-%m-%d %H:%M:%f', 'now', '+0.001 seconds'), "
+        "strftime('%Y-%m-%d %H:%M:%f', COALESCE(updated_at, 'now'), '+0.001 "
+        "seconds')) || '000' WHERE id = old.tag_id AND EXISTS (SELECT 1 FROM "
+        "post WHERE id = old.post_id AND is_soft_deleted = 0); END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS tag_post_count_au AFTER UPDATE OF "
+        "post_id, tag_id ON post_tags BEGIN UPDATE tag SET post_count = "
+        "post_count - 1, updated_at = MAX(strftime('%Y-%m-%d %H:%M:%f', 'now', "
+        "'+0.001 seconds'), strftime('%Y-%m-%d %H:%M:%f', COALESCE(updated_at, "
+        "'now'), '+0.001 seconds')) || '000' WHERE id = old.tag_id AND EXISTS "
+        "(SELECT 1 FROM post WHERE id = old.post_id AND is_soft_deleted = 0); "
+        "UPDATE tag SET post_count = post_count + 1, updated_at = "
+        "MAX(strftime('%Y-%m-%d %H:%M:%f', 'now', '+0.001 seconds'), "
+        "strftime('%Y-%m-%d %H:%M:%f', COALESCE(updated_at, 'now'), '+0.001 "
+        "seconds')) || '000' WHERE id = new.tag_id AND EXISTS (SELECT 1 FROM "
+        "post WHERE id = new.post_id AND is_soft_deleted = 0); END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS tag_post_count_live AFTER UPDATE OF "
+        "is_soft_deleted ON post WHEN old.is_soft_deleted IS NOT "
+        "new.is_soft_deleted BEGIN UPDATE tag SET post_count = post_count + "
+        "(CASE WHEN new.is_soft_deleted = 0 THEN 1 ELSE -1 END) * (SELECT "
+        "COUNT(*) FROM post_tags WHERE post_id = new.id AND tag_id = tag.id), "
+        "updated_at = MAX(strftime('%Y-%m-%d %H:%M:%f', 'now', '+0.001 "
+        "seconds'), strftime('%Y-%m-%d %H:%M:%f', COALESCE(updated_at, 'now'), "
+        "'+0.001 seconds')) || '000' WHERE id IN (SELECT tag_id FROM post_tags "
+        "WHERE post_id = new.id); END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS tag_post_count_pd AFTER DELETE ON post "
+        "WHEN old.is_soft_deleted = 0 BEGIN UPDATE tag SET post_count = "
+        "post_count - (SELECT COUNT(*) FROM post_tags WHERE post_id = old.id "
+        "AND tag_id = tag.id), updated_at = MAX(strftime('%Y-%m-%d %H:%M:%f', "
+        "'now', '+0.001 seconds'), strftime('%Y-%m-%d %H:%M:%f', "
+        "COALESCE(updated_at, 'now'), '+0.001 seconds')) || '000' WHERE id IN "
+        "(SELECT tag_id FROM post_tags WHERE post_id = old.id); END"
+    ),
+]
+
+
+def replace_triggers(statements):
+    for name in TRIGGER_NAMES:
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    for statement in statements:
+        op.execute(statement)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    replace_triggers(TRIGGERS)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    replace_triggers(PREVIOUS_TRIGGERS)
@@ -0,0 +1,166 @@
+"""Add denormalized comment, reply and post counters
+
+Revision ID: 8e1f0c6b2d95
+Revises: 4b7d2e9a1c3f
+Create Date: 2026-10-17 13:41:05.118342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "8e1f0c6b2d95"
+down_revision: Union[str, Sequence[str], None] = "4b7d2e9a1c3f"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# table, column, SQL computing it for existing rows
+COUNTERS = [
+    (
+        "post",
+        "comment_count",
+        "(SELECT COUNT(*) FROM comment WHERE comment.post_id = post.id "
+        "AND comment.is_soft_deleted = 0)",
+    ),
+    (
+        "comment",
+        "reply_count",
+        "(SELECT COUNT(*) FROM comment AS reply "
+        "WHERE reply.parent_comment_id = comment.id AND reply.is_soft_deleted = 0)",
+    ),
+    (
+        "tag",
+        "post_count",
+        "(SELECT COUNT(*) FROM post_tags JOIN post ON post.id = post_tags.post_id "
+        "WHERE post_tags.tag_id = tag.id AND post.is_soft_deleted = 0)",
+    ),
+]
+
+# the counter triggers as fastbg.counters created them at this revision
+TRIGGERS = [
+    (
+        "CREATE TRIGGER IF NOT EXISTS post_comment_count_ai AFTER INSERT ON "
+        "comment WHEN new.is_soft_deleted = 0 BEGIN UPDATE post SET "
+        "comment_count = comment_count + 1, updated_at = strftime('%Y-%m-%d "
+        "%H:%M:%f', 'now') || '000' WHERE id = new.post_id; END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS post_comment_count_ad AFTER DELETE ON "
+        "comment WHEN old.is_soft_deleted = 0 BEGIN UPDATE post SET "
+        "comment_count = comment_count - 1, updated_at = strftime('%Y-%m-%d "
+        "%H:%M:%f', 'now') || '000' WHERE id = old.post_id; END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS post_comment_count_au AFTER UPDATE OF "
+        "is_soft_deleted, post_id ON comment WHEN old.is_soft_deleted IS NOT "
+        "new.is_soft_deleted OR old.post_id IS NOT new.post_id BEGIN UPDATE "
+        "post SET comment_count = comment_count - 1, updated_at = "
+        "strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' WHERE id = old.post_id "
+        "AND old.is_soft_deleted = 0; UPDATE post SET comment_count = "
+        "comment_count + 1, updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') "
+        "|| '000' WHERE id = new.post_id AND new.is_soft_deleted = 0; END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS comment_reply_count_ai AFTER INSERT ON "
+        "comment WHEN new.is_soft_deleted = 0 BEGIN UPDATE comment SET "
+        "reply_count = reply_count + 1, updated_at = strftime('%Y-%m-%d "
+        "%H:%M:%f', 'now') || '000' WHERE id = new.parent_comment_id; END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS comment_reply_count_ad AFTER DELETE ON "
+        "comment WHEN old.is_soft_deleted = 0 BEGIN UPDATE comment SET "
+        "reply_count = reply_count - 1, updated_at = strftime('%Y-%m-%d "
+        "%H:%M:%f', 'now') || '000' WHERE id = old.parent_comment_id; END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS comment_reply_count_au AFTER UPDATE OF "
+        "is_soft_deleted, parent_comment_id ON comment WHEN old.is_soft_deleted"
+        " IS NOT new.is_soft_deleted OR old.parent_comment_id IS NOT "
+        "new.parent_comment_id BEGIN UPDATE comment SET reply_count = "
+        "reply_count - 1, updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') || "
+        "'000' WHERE id = old.parent_comment_id AND old.is_soft_deleted = 0; "
+        "UPDATE comment SET reply_count = reply_count + 1, updated_at = "
+        "strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' WHERE id = "
+        "new.parent_comment_id AND new.is_soft_deleted = 0; END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS tag_post_count_ai AFTER INSERT ON "
+        "post_tags BEGIN UPDATE tag SET post_count = post_count + 1, updated_at"
+        " = strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' WHERE id = new.tag_id"
+        " AND EXISTS (SELECT 1 FROM post WHERE id = new.post_id AND "
+        "is_soft_deleted = 0); END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS tag_post_count_ad AFTER DELETE ON "
+        "post_tags BEGIN UPDATE tag SET post_count = post_count - 1, updated_at"
+        " = strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' WHERE id = old.tag_id"
+        " AND EXISTS (SELECT 1 FROM post WHERE id = old.post_id AND "
+        "is_soft_deleted = 0); END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS tag_post_count_au AFTER UPDATE OF "
+        "post_id, tag_id ON post_tags BEGIN UPDATE tag SET post_count = "
+        "post_count - 1, updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') || "
+        "'000' WHERE id = old.tag_id AND EXISTS (SELECT 1 FROM post WHERE id = "
+        "old.post_id AND is_soft_deleted = 0); UPDATE tag SET post_count = "
+        "post_count + 1, updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') || "
+        "'000' WHERE id = new.tag_id AND EXISTS (SELECT 1 FROM post WHERE id = "
+        "new.post_id AND is_soft_deleted = 0); END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS tag_post_count_live AFTER UPDATE OF "
+        "is_soft_deleted ON post WHEN old.is_soft_deleted IS NOT "
+        "new.is_soft_deleted BEGIN UPDATE tag SET post_count = post_count + "
+        "(CASE WHEN new.is_soft_deleted = 0 THEN 1 ELSE -1 END) * (SELECT "
+        "COUNT(*) FROM post_tags WHERE post_id = new.id AND tag_id = tag.id), "
+        "updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' WHERE id IN"
+        " (SELECT tag_id FROM post_tags WHERE post_id = new.id); END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS tag_post_count_pd AFTER DELETE ON post "
+        "WHEN old.is_soft_deleted = 0 BEGIN UPDATE tag SET post_count = "
+        "post_count - (SELECT COUNT(*) FROM post_tags WHERE post_id = old.id "
+        "AND tag_id = tag.id), updated_at = strftime('%Y-%m-%d %H:%M:%f', "
+        "'now') || '000' WHERE id IN (SELECT tag_id FROM post_tags WHERE "
+        "post_id = old.id); END"
+    ),
+]
+TRIGGER_NAMES = [
+    "post_comment_count_ai",
+    "post_comment_count_ad",
+    "post_comment_count_au",
+    "comment_reply_count_ai",
+    "comment_reply_count_ad",
+    "comment_reply_count_au",
+    "tag_post_count_ai",
+    "tag_post_count_ad",
+    "tag_post_count_au",
+    "tag_post_count_live",
+    "tag_post_count_pd",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # plain ADD COLUMN: a batch (copy and rename) would drop the FTS triggers
+    for table, column, _ in COUNTERS:
+        op.add_column(
+            table,
+            sa.Column(column, sa.Integer(), nullable=False, server_default="0"),
+        )
+    for table, column, count in COUNTERS:
+        op.execute(f"UPDATE {table} SET {column} = {count}")
+
+    # kept in sync from here on, see fastbg.counters
+    for statement in TRIGGERS:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in TRIGGER_NAMES:
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    for table, column, _ in COUNTERS:
+        op.drop_column(table, column)
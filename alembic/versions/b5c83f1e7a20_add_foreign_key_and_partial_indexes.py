@@ -0,0 +1,62 @@
+"""Add foreign key and partial soft-delete indexes
+
+Revision ID: b5c83f1e7a20
+Revises: 8e1f0c6b2d95
+Create Date: 2026-10-17 15:20:44.671903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "b5c83f1e7a20"
+down_revision: Union[str, Sequence[str], None] = "8e1f0c6b2d95"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SOFT_DELETE_TABLES = ["user", "post", "comment"]
+
+# name, table, columns
+FOREIGN_KEY_INDEXES = [
+    ("ix_post_author_id", "post", ["author_id"]),
+    ("ix_comment_author_id", "comment", ["author_id"]),
+    ("ix_comment_parent_comment_id", "comment", ["parent_comment_id"]),
+    ("ix_post_tags_post_id_tag_id", "post_tags", ["post_id", "tag_id"]),
+    ("ix_post_tags_tag_id_post_id", "post_tags", ["tag_id", "post_id"]),
+]
+
+# name, table, columns, is_soft_deleted value of the indexed rows
+PARTIAL_INDEXES = [
+    ("ix_post_author_id_live", "post", ["author_id", "id"], 0),
+    ("ix_comment_author_id_live", "comment", ["author_id", "id"], 0),
+    ("ix_comment_post_id_live", "comment", ["post_id", "id"], 0),
+    *((f"ix_{table}_deleted", table, ["id"], 1) for table in SOFT_DELETE_TABLES),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # nearly every row is live: the planner picked this over selective indexes
+    for table in SOFT_DELETE_TABLES:
+        op.drop_index(f"ix_{table}_is_soft_deleted", table_name=table)
+
+    for name, table, columns in FOREIGN_KEY_INDEXES:
+        op.create_index(name, table, columns)
+    for name, table, columns, deleted in PARTIAL_INDEXES:
+        where = sa.text(f"is_soft_deleted = {deleted}")
+        op.create_index(
+            name, table, columns, sqlite_where=where, postgresql_where=where
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, table, _, _ in PARTIAL_INDEXES:
+        op.drop_index(name, table_name=table)
+    for name, table, _ in FOREIGN_KEY_INDEXES:
+        op.drop_index(name, table_name=table)
+
+    for table in SOFT_DELETE_TABLES:
+        op.create_index(f"ix_{table}_is_soft_deleted", table, ["is_soft_deleted"])
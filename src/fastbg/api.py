@@ -1,49 +1,133 @@
 import logging
+from typing import NamedTuple
 
+from sqlalchemy import event, select
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 import jwt
 
 from fastbg.conf import settings
-from fastbg.query import base_query
-from fastbg.db import User
+from fastbg.query import live_filter
+from fastbg.db import User, sqlite_pragmas, sqlite_transactions
+from fastbg.cache import LRUCache, on_invalidate
+from fastbg.writer import Writer
 
 DB = settings.DATABASES["default"]
 URL = DB["engine"]
 config = DB.get("config", {})
+SQLITE = URL.startswith("sqlite")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="user/login")
 
 log = logging.getLogger("global")
 
-engine = create_async_engine(URL, **config)
+if SQLITE:
+    # a single writer connection: SQLite serializes writes anyway, queueing
+    # them here is cheaper than retrying on "database is locked"
+    engine = create_async_engine(URL, pool_size=1, max_overflow=0, **config)
+else:
+    engine = create_async_engine(URL, **config)
+sqlite_pragmas(engine)
+# the writer runs each job of a batch in a savepoint
+sqlite_transactions(engine)
 
 Session = async_sessionmaker(
     engine,
     class_=AsyncSession,
+    # writes return fresh rows (RETURNING), no need to reload them on commit
+    expire_on_commit=False,
 )
 
 
-async def get_db():
-    async with Session() as session:
-        try:
-            yield session
-            await session.commit()
-        except Exception:
-            # sqlalchemy exception?
-            await session.rollback()
-            raise
-        finally:
-            await session.close()
+def _query_only(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only = ON")
+    cursor.close()
+
+
+def make_read_engine(url: str, config: dict):
+    """
+    Engine whose connections refuse writes. SQLite gets its own pool of
+    `query_only` connections; other backends share the pool and open
+    READ ONLY transactions where the driver supports it.
+    """
+    if url.startswith("sqlite"):
+        read_engine = create_async_engine(url, **config)
+        # before query_only, journal_mode may have to write the header
+        sqlite_pragmas(read_engine)
+        event.listen(read_engine.sync_engine, "connect", _query_only)
+        return read_engine
+    if url.startswith("postgresql"):
+        return engine.execution_options(postgresql_readonly=True)
+    return engine
+
+
+read_config = config
+if SQLITE:
+    readers = settings.SQLITE_POOLS["readers"]
+    read_config = {**config, "pool_size": readers, "max_overflow": 0}
+read_engine = make_read_engine(URL, read_config)
+
+ReadSession = async_sessionmaker(
+    read_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+
+# write jobs, see `Writer.submit`
+writer = Writer(
+    Session, serialized=SQLITE, max_batch=settings.SQLITE_POOLS["max_batch"]
+)
+
+
+async def get_read_db():
+    """
+    Session for endpoints that only read: nothing is flushed or
+    committed, closing it just ends the read transaction
+    """
+    async with ReadSession() as session:
+        yield session
 
 
 ALGORITHM = "HS256"
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
-) -> User:
+class Principal(NamedTuple):
+    """
+    The columns of the authenticated user the endpoints need
+    """
+
+    id: int
+    name: str
+    is_soft_deleted: bool
+
+
+user_cache = None
+if settings.USER_CACHE.get("enabled"):
+    user_cache = LRUCache(
+        max_size=settings.USER_CACHE.get("max_size", 4096),
+        ttl=settings.USER_CACHE.get("ttl", 10),
+    )
+
+
+def forget_users(*user_ids: int):
+    # principals are looked up by name (the token subject) but
+    # invalidated by id, so both keys are stored
+    for user_id in user_ids:
+        name = user_cache.get(f"id:{user_id}")
+        user_cache.delete(f"id:{user_id}")
+        if name is not None:
+            user_cache.delete(f"name:{name}")
+
+
+if user_cache is not None:
+    on_invalidate(User, forget_users)
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -62,8 +146,23 @@ async def get_current_user(
     ) as e:
         raise credentials_exception from e
 
-    result = await db.execute(base_query(User).where(User.name == username))
-    user = result.scalar_one_or_none()
-    if user is None or user.is_soft_deleted:
+    if user_cache is not None:
+        cached = user_cache.get(f"name:{username}")
+        if cached is not None:
+            return Principal(*cached)
+
+    stmt = select(User.id, User.name, User.is_soft_deleted).where(
+        User.name == username, *live_filter(User)
+    )
+    # not a dependency: that would hold a read connection for the whole
+    # request, writes waiting on the writer included
+    async with ReadSession() as db:
+        row = (await db.execute(stmt)).one_or_none()
+    if row is None or row.is_soft_deleted:
         raise credentials_exception
+
+    user = Principal(*row)
+    if user_cache is not None:
+        user_cache.set(f"name:{user.name}", tuple(user))
+        user_cache.set(f"id:{user.id}", user.name)
     return user
@@ -1,19 +1,37 @@
 """
 Various authorization recipes can be found here
 """
-from functools import wraps
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Any, Callable, Optional, Union, List
+from typing import Optional
 
-from fastbg.api import get_current_user, get_db
 from fastbg.db import User
 from fastbg.query import base_query
 
 
+def not_authorized() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Not authorized to perform this action",
+    )
+
+
 class BaseAuthorizer:
-    async def check(self, user: User, *args, **kwargs) -> bool:
-        raise NotImplementedError("Subclasses must implement check method")
+    def filter(self, user: User) -> tuple:
+        """
+        WHERE clauses restricting a statement to the rows `user` may act on,
+        so the check happens inside the write itself
+        """
+        raise NotImplementedError("Subclasses must implement filter method")
+
+    async def denied(
+        self, db: AsyncSession, user: User, item_id: int
+    ) -> Optional[HTTPException]:
+        """
+        Called when a filtered write matched nothing. Returns the error to
+        raise if the row exists but `user` may not touch it
+        """
+        return None
 
 
 class OwnerAuthorizer(BaseAuthorizer):
@@ -23,46 +41,15 @@ class OwnerAuthorizer(BaseAuthorizer):
         self.model_class = model_class
         self.id_param = id_param
         self.owner_field = owner_field
-
-    async def check(self, user: User, db: AsyncSession, **kwargs) -> bool:
-        item_id = kwargs.get(self.id_param)
-        if not item_id:
-            return False
-
-        result = await db.execute(
-            base_query(self.model_class).where(self.model_class.id == item_id)
-        )
-        item = result.scalar_one_or_none()
-
-        if not item:
-            return False
-
-        return getattr(item, self.owner_field, None) == user.id
-
-
-async def authorize(
-    authorizer: BaseAuthorizer,
-    kwargs: dict,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
-) -> User:
-    is_authorized = await authorizer.check(**kwargs)
-    if not is_authorized:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Not authorized to perform this action",
-        )
-    return current_user
-
-
-def is_owner(model_class, id_param: str = "item_id", owner_field: str = "user_id"):
-    def decorator(func: Callable) -> Callable:
-        @wraps(func)
-        async def wrapper(*args, **kwargs):
-            authorizer = OwnerAuthorizer(model_class, id_param, owner_field)
-            await authorize(authorizer, kwargs)
-            return await func(*args, **kwargs)
-
-        return wrapper
-
-    return decorator
+        self.owner_column = getattr(model_class, owner_field)
+
+    def filter(self, user: User) -> tuple:
+        return (self.owner_column == user.id,)
+
+    async def denied(self, db: AsyncSession, user: User, item_id: int):
+        stmt = base_query(self.model_class).with_only_columns(self.owner_column)
+        result = await db.execute(stmt.where(self.model_class.id == item_id))
+        row = result.one_or_none()
+        if row is not None and row[0] != user.id:
+            return not_authorized()
+        return None
@@ -0,0 +1,396 @@
+"""
+Throughput and latency of every route of the app under concurrent load.
+The app is served in-process through httpx's ASGI transport or, with
+--uvicorn, by a uvicorn process on localhost. Each route gets
+`--requests` requests, `--concurrency` at a time, against a database
+seeded with `--rows` rows per model.
+
+    python -m fastbg.bench.load [--requests 200] [--concurrency 8]
+                                [--rows 1000] [--uvicorn] [--port 8765]
+
+Prints requests/s and p50/p95/p99 latencies (ms) per route as JSON.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+# before the settings are loaded: throwaway database, no SQL echo
+os.environ["TEST_DIR"] = tempfile.mkdtemp()
+os.environ.setdefault("FASTBG_SETTINGS_MODULE", "fastbg.conf.bench")
+
+import httpx
+from fastapi.routing import APIRoute
+from sqlalchemy import create_engine, insert
+
+from fastbg.auth.security import get_password_hash
+from fastbg.conf import settings
+from fastbg.db import Comment, Post, PostTags, Tag, User, create_db_sync
+
+SINCE = "2000-01-01T00:00:00"
+PAGE = {"page_size": 20}
+# items per request on the /bulk endpoints
+BULK = 10
+WORDS = ["sqlite", "fastapi", "index", "cursor", "thread", "cache", "query"]
+
+
+class Dataset(NamedTuple):
+    """
+    Ids 1..rows are read and updated; the ones after them are reserved
+    for the destructive routes so every delete hits a live row. Row 1 is
+    never updated, user 1 is the one the requests are authenticated as.
+    """
+
+    rows: int
+    requests: int
+
+    @property
+    def size(self) -> int:
+        return self.rows + self.requests * (1 + BULK)
+
+    def read_id(self, i: int) -> int:
+        return i % self.rows + 1
+
+    def update_id(self, i: int) -> int:
+        return i % (self.rows - 1) + 2
+
+    def delete_id(self, i: int) -> int:
+        return self.rows + i % self.requests + 1
+
+    def bulk_delete_ids(self, i: int) -> List[int]:
+        first = self.rows + self.requests + (i % self.requests) * BULK + 1
+        return list(range(first, first + BULK))
+
+
+def seed(dataset: Dataset):
+    """
+    Core inserts straight into the database, before the app starts
+    """
+    DB = settings.DATABASES["default"]
+    create_db_sync(DB["sync_engine"])
+    engine = create_engine(DB["sync_engine"])
+    now = datetime.utcnow()
+    ts = {"created_at": now, "updated_at": now}
+    password = get_password_hash("pw")
+    n = dataset.size
+    with engine.begin() as conn:
+        conn.execute(
+            insert(User),
+            [
+                {"name": "alice" if i == 0 else f"user{i}", "password": password, **ts}
+                for i in range(n)
+            ],
+        )
+        # every post belongs to alice, the user the requests log in as
+        conn.execute(
+            insert(Post),
+            [
+                {
+                    "title": f"post {i}",
+                    "content": " ".join(WORDS[i % len(WORDS) :] + WORDS),
+                    "author_id": 1,
+                    **ts,
+                }
+                for i in range(n)
+            ],
+        )
+        # a top-level comment and a reply per post
+        conn.execute(
+            insert(Comment),
+            [
+                {
+                    "content": f"comment {i} on {WORDS[i % len(WORDS)]}",
+                    "author_id": i % n + 1,
+                    "post_id": i // 2 % dataset.rows + 1,
+                    "parent_comment_id": i if i % 2 else None,
+                    **ts,
+                }
+                for i in range(n)
+            ],
+        )
+        conn.execute(insert(Tag), [{"name": f"tag{i}", **ts} for i in range(n)])
+        conn.execute(
+            insert(PostTags),
+            [
+                {"post_id": i % dataset.rows + 1, "tag_id": i % 50 + 1, **ts}
+                for i in range(n)
+            ],
+        )
+    engine.dispose()
+
+
+# model prefix -> (values of a new row, values of an update), by request index
+PAYLOADS: Dict[str, Tuple[Callable, Callable]] = {
+    "/user": (
+        lambda i: {"name": f"load{i}", "password": "pw"},
+        lambda i: {"name": f"renamed{i}"},
+    ),
+    "/post": (
+        lambda i: {"title": f"load {i}", "content": "load test", "author_id": 1},
+        lambda i: {"content": f"updated {i}"},
+    ),
+    "/comment": (
+        lambda i: {"content": f"load {i}", "post_id": 1, "author_id": 1},
+        lambda i: {"content": f"updated {i}"},
+    ),
+    "/tag": (
+        lambda i: {"name": f"load{i}"},
+        lambda i: {"description": f"updated {i}"},
+    ),
+    "/posttags": (
+        lambda i: {"post_id": i % 50 + 1, "tag_id": i % 50 + 1},
+        lambda i: {"tag_id": i % 50 + 2},
+    ),
+}
+
+# reads first; deleted rows are restored before the bulk deletes
+PHASES = {"GET": 0, "POST": 1, "PUT": 2, "PATCH": 2, "DELETE": 3}
+
+
+def build_request(method: str, path: str, dataset: Dataset):
+    """
+    Request factory `i -> (method, url, kwargs)` for a route template,
+    or None for routes the harness does not know
+    """
+    prefix, _, rest = path[1:].partition("/")
+    prefix = f"/{prefix}"
+    create, update = PAYLOADS.get(prefix, (None, None))
+    custom = {
+        ("GET", "/"): lambda i: ("/", {}),
+        ("GET", "/stats"): lambda i: ("/stats", {}),
+        ("POST", "/user/login"): lambda i: (
+            "/user/login",
+            {"data": {"username": "alice", "password": "pw"}},
+        ),
+        ("GET", "/post/{item_id}/thread"): lambda i: (
+            f"/post/{dataset.read_id(i)}/thread",
+            {"params": PAGE},
+        ),
+    }
+    if (method, path) in custom:
+        return custom[(method, path)]
+    if create is None:
+        return None
+
+    item = f"{prefix}/{{}}"
+
+    def bulk(i, k):
+        # past the indexes of the single-item requests, names are unique
+        return dataset.requests + i * BULK + k
+
+    routes = {
+        ("GET", ""): lambda i: (f"{prefix}/", {"params": PAGE}),
+        ("GET", "{item_id}"): lambda i: (item.format(dataset.read_id(i)), {}),
+        ("GET", "changes"): lambda i: (
+            f"{prefix}/changes",
+            {"params": {**PAGE, "since": SINCE}},
+        ),
+        ("GET", "deleted/"): lambda i: (f"{prefix}/deleted/", {"params": PAGE}),
+        ("GET", "export"): lambda i: (f"{prefix}/export", {}),
+        ("GET", "search"): lambda i: (
+            f"{prefix}/search",
+            {"params": {**PAGE, "q": WORDS[i % len(WORDS)]}},
+        ),
+        # lists of a single parent, e.g. /user/{item_id}/posts
+        ("GET", "{item_id}/posts"): lambda i: (f"{prefix}/1/posts", {"params": PAGE}),
+        ("GET", "{item_id}/comments"): lambda i: (
+            f"{prefix}/{dataset.read_id(i) if prefix == '/post' else 1}/comments",
+            {"params": PAGE},
+        ),
+        ("GET", "{item_id}/tags"): lambda i: (
+            item.format(dataset.read_id(i)) + "/tags",
+            {"params": PAGE},
+        ),
+        ("POST", ""): lambda i: (f"{prefix}/", {"json": create(i)}),
+        ("POST", "bulk"): lambda i: (
+            f"{prefix}/bulk",
+            {"json": [create(bulk(i, k)) for k in range(BULK)]},
+        ),
+        ("PUT", "{item_id}"): lambda i: (
+            item.format(dataset.update_id(i)),
+            {"json": update(i)},
+        ),
+        ("PATCH", "bulk"): lambda i: (
+            f"{prefix}/bulk",
+            {
+                "json": [
+                    {"id": dataset.update_id(bulk(i, k)), **update(bulk(i, k))}
+                    for k in range(BULK)
+                ]
+            },
+        ),
+        ("DELETE", "{item_id}"): lambda i: (item.format(dataset.delete_id(i)), {}),
+        ("POST", "{item_id}/restore"): lambda i: (
+            item.format(dataset.delete_id(i)) + "/restore",
+            {},
+        ),
+        ("DELETE", "bulk"): lambda i: (
+            f"{prefix}/bulk",
+            {"json": dataset.bulk_delete_ids(i)},
+        ),
+    }
+    return routes.get((method, rest))
+
+
+def phase(method: str, path: str) -> int:
+    if path.endswith("/restore"):
+        return PHASES["DELETE"] + 1
+    if method == "DELETE" and path.endswith("/bulk"):
+        return PHASES["DELETE"] + 2
+    return PHASES[method]
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    if len(latencies) < 2:
+        latencies = latencies * 2
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50_ms": round(cuts[49] * 1e3, 3),
+        "p95_ms": round(cuts[94] * 1e3, 3),
+        "p99_ms": round(cuts[98] * 1e3, 3),
+        "max_ms": round(max(latencies) * 1e3, 3),
+    }
+
+
+async def load(client, method, factory, requests, concurrency, headers) -> dict:
+    latencies, statuses = [], {}
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            url, kwargs = factory(i)
+            start = time.perf_counter()
+            response = await client.request(method, url, headers=headers, **kwargs)
+            await response.aread()
+            latencies.append(time.perf_counter() - start)
+            code = str(response.status_code)
+            statuses[code] = statuses.get(code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "rps": round(requests / elapsed, 1),
+        **percentiles(latencies),
+        "errors": sum(n for code, n in statuses.items() if code >= "400"),
+        "statuses": statuses,
+    }
+
+
+async def run(client, routes, dataset: Dataset, concurrency: int) -> dict:
+    response = await client.post(
+        "/user/login", data={"username": "alice", "password": "pw"}
+    )
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    results, uncovered = {}, []
+    start = time.perf_counter()
+    for method, path in sorted(routes, key=lambda route: phase(*route)):
+        factory = build_request(method, path, dataset)
+        if factory is None:
+            uncovered.append(f"{method} {path}")
+            continue
+        results[f"{method} {path}"] = await load(
+            client, method, factory, dataset.requests, concurrency, headers
+        )
+    elapsed = time.perf_counter() - start
+
+    total = dataset.requests * len(results)
+    return {
+        "total": {
+            "requests": total,
+            "rps": round(total / elapsed, 1),
+            "errors": sum(route["errors"] for route in results.values()),
+        },
+        "routes": results,
+        "uncovered": uncovered,
+    }
+
+
+@contextlib.contextmanager
+def uvicorn_server(port: int):
+    env = {**os.environ, "PYTHONPATH": str(settings.BASE_DIR.parent)}
+    command = [sys.executable, "-m", "uvicorn", "fastbg.server:app"]
+    command += ["--port", str(port), "--log-level", "warning", "--no-access-log"]
+    # the server prints a line per request
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL)
+    try:
+        for _ in range(100):
+            try:
+                httpx.get(f"http://127.0.0.1:{port}/")
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        else:
+            raise RuntimeError("uvicorn did not start")
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        process.wait()
+
+
+async def main(args) -> dict:
+    dataset = Dataset(args.rows, args.requests)
+    with contextlib.redirect_stdout(sys.stderr):
+        seed(dataset)
+
+    if args.uvicorn:
+        from fastbg.server import app
+
+        routes = app_routes(app)
+        limits = httpx.Limits(max_connections=args.concurrency)
+        with uvicorn_server(args.port) as url:
+            async with httpx.AsyncClient(base_url=url, limits=limits) as client:
+                results = await run(client, routes, dataset, args.concurrency)
+    else:
+        # the server prints a line per request
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            from fastbg.server import app
+
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://bench"
+            ) as client:
+                results = await run(client, app_routes(app), dataset, args.concurrency)
+
+    results = {
+        "mode": "uvicorn" if args.uvicorn else "asgi",
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "rows": args.rows,
+        **results,
+    }
+    print(json.dumps(results, indent=2))
+    return results
+
+
+def app_routes(app) -> List[Tuple[str, str]]:
+    return [
+        (method, route.path)
+        for route in app.routes
+        if isinstance(route, APIRoute)
+        for method in route.methods
+    ]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--requests", type=int, default=200, help="per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=1000, help="per model")
+    parser.add_argument("--uvicorn", action="store_true")
+    parser.add_argument("--port", type=int, default=8765)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,204 @@
+"""
+Micro-benchmarks of the hot internal functions: schema generation,
+statement construction, password hashing, JWT and response
+serialization. Timings (best per-call time over `--repeat` runs, in
+microseconds) can be stored as a baseline and compared against later.
+
+    python -m fastbg.bench.micro run [--save FILE] [-k NAME]
+    python -m fastbg.bench.micro compare [--baseline FILE] [--threshold 0.25]
+
+Every run also times `reference`, a fixed pure-Python loop, and `compare`
+scales the baseline by how much faster or slower it got: a baseline
+saved on another machine still applies. `compare` exits with 1 if a
+function got slower than its (scaled) baseline by more than `threshold`
+(a fraction, 0.25 is 25%).
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import timeit
+from pathlib import Path
+from typing import Callable, Dict
+
+os.environ.setdefault("FASTBG_SETTINGS_MODULE", "fastbg.conf.bench")
+
+import jwt
+from pydantic import TypeAdapter
+
+import fastbg.router  # registers the response schema of each model
+from fastbg.auth.security import ALGORITHM, create_access_token
+from fastbg.bench.serialize import make_rows
+from fastbg.conf import settings
+from fastbg.db import Comment, Post, PostTags, Tag, User
+from fastbg.query import base_query, query_deleted
+from fastbg.schema import page_schema, response_schema, sqlalchemy_to_pydantic
+
+BASELINE = Path(__file__).parent / "baselines" / "micro.json"
+MODELS = (User, Post, Comment, Tag, PostTags)
+PAGE_SIZE = settings.DEFAULT_PAGE_SIZE
+
+
+def reference() -> int:
+    # interpreter-bound work unrelated to the code under test
+    total = 0
+    for i in range(1000):
+        total += i * i % 7
+    return total
+
+
+def serialization(model) -> Dict[str, Callable]:
+    # what `render` does with a list page and with a single item
+    schema = response_schema(model)
+    page_adapter = TypeAdapter(page_schema(schema))
+    item_adapter = TypeAdapter(schema)
+    page = {"items": make_rows(model, PAGE_SIZE), "next_cursor": "abc"}
+    item = page["items"][0]
+
+    def dump(adapter, data):
+        return lambda: adapter.dump_json(
+            adapter.validate_python(data, from_attributes=True)
+        )
+
+    return {
+        f"serialize.page[{model.__name__}]": dump(page_adapter, page),
+        f"serialize.item[{model.__name__}]": dump(item_adapter, item),
+    }
+
+
+def functions() -> Dict[str, Callable]:
+    """
+    Benchmarked callables by name. Names are the keys of the baseline,
+    renaming one drops its history.
+    """
+    user = User(name="alice")
+    token = create_access_token({"sub": "alice"})
+    funcs = {
+        "User.__setattr__[password]": lambda: setattr(user, "password", "pw"),
+        "User.__setattr__[name]": lambda: setattr(user, "name", "alice"),
+        "jwt.encode": lambda: create_access_token({"sub": "alice"}),
+        "jwt.decode": lambda: jwt.decode(
+            token, settings.SECRET_KEY, algorithms=[ALGORITHM]
+        ),
+    }
+    for model in MODELS:
+        name = model.__name__
+        exclude = ["password"] if model is User else None
+        funcs.update(
+            {
+                f"sqlalchemy_to_pydantic[{name}]": lambda model=model, exclude=exclude: (
+                    sqlalchemy_to_pydantic(model, exclude=exclude)
+                ),
+                f"sqlalchemy_to_pydantic[{name},all_optional]": lambda model=model: (
+                    sqlalchemy_to_pydantic(model, all_optional=True)
+                ),
+                f"base_query[{name}]": lambda model=model: base_query(model),
+                f"query_deleted[{name}]": lambda model=model: query_deleted(model),
+            }
+        )
+        funcs.update(serialization(model))
+    return funcs
+
+
+def measure(func: Callable, repeat: int) -> float:
+    """
+    Best time per call in microseconds. Each run loops long enough
+    (0.2s) for the timer resolution not to matter.
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return round(best / number * 1e6, 3)
+
+
+def run(args, names=None) -> dict:
+    results = {
+        name: measure(func, args.repeat)
+        for name, func in functions().items()
+        if (args.k is None or args.k in name) and (names is None or name in names)
+    }
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "reference_us": measure(reference, args.repeat),
+        "results_us": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> dict:
+    # how much faster this machine (and interpreter) runs the same loop
+    scale = current["reference_us"] / baseline["reference_us"]
+    report, regressions = {}, []
+    for name, before in baseline["results_us"].items():
+        after = current["results_us"].get(name)
+        if after is None:
+            continue
+        expected = before * scale
+        change = after / expected - 1
+        report[name] = {
+            "baseline_us": before,
+            "expected_us": round(expected, 3),
+            "current_us": after,
+            "change": round(change, 3),
+        }
+        if change > threshold:
+            regressions.append(name)
+    return {
+        "threshold": threshold,
+        "scale": round(scale, 3),
+        "regressions": regressions,
+        "missing": sorted(set(baseline["results_us"]) - set(current["results_us"])),
+        "new": sorted(set(current["results_us"]) - set(baseline["results_us"])),
+        "functions": report,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("command", choices=["run", "compare"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("-k", help="only the functions whose name contains K")
+    parser.add_argument("--save", type=Path, help="write the timings to SAVE")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument(
+        "--retries", type=int, default=2, help="measurements of a suspect"
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "compare" and not args.baseline.exists():
+        parser.error(f"no baseline at {args.baseline}, create it with --save")
+
+    current = run(args)
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps(current, indent=2) + "\n")
+
+    if args.command == "run":
+        print(json.dumps(current, indent=2))
+        return 0
+
+    baseline = json.loads(args.baseline.read_text())
+    if args.k is not None:
+        baseline["results_us"] = {
+            name: value
+            for name, value in baseline["results_us"].items()
+            if args.k in name
+        }
+    results = compare(baseline, current, args.threshold)
+    # noise only ever makes a function slower: measure the suspects again
+    # and keep their best time before calling it a regression
+    for _ in range(args.retries):
+        if not results["regressions"]:
+            break
+        again = run(args, names=results["regressions"])["results_us"]
+        for name, value in again.items():
+            current["results_us"][name] = min(current["results_us"][name], value)
+        results = compare(baseline, current, args.threshold)
+    print(json.dumps(results, indent=2))
+    return 1 if results["regressions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+"""
+EXPLAIN QUERY PLAN of every statement the routers emit.
+Each route of the app is called against a throwaway database, the
+statements are captured as they run and their plans are checked for
+full table scans and temporary sorts.
+
+    python -m fastbg.bench.plans
+
+Exits with 1 if a statement scans a table or a route was not called.
+"""
+import contextlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from collections import defaultdict
+
+from sqlalchemy import event
+from starlette.routing import Match
+
+# the app reads its database location from the settings on import
+os.environ["TEST_DIR"] = tempfile.mkdtemp()
+
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+
+from fastbg.conf import settings
+
+# the JSON report goes to stdout
+settings.DATABASES["default"].setdefault("config", {})["echo"] = False
+
+from fastbg.api import engine, read_engine
+from fastbg.db import Base
+
+# the server prints as it builds the database and serves requests
+with contextlib.redirect_stdout(sys.stderr):
+    from fastbg.server import app
+
+# statements answered by design with a full pass over the table
+EXPECTED_SCANS = {"/post/export", "/comment/export"}
+SINCE = "2000-01-01T00:00:00"
+
+
+def scenario() -> list:
+    """
+    (method, path, request kwargs) covering every route. Lists are asked
+    for one row per page so cursors and watermarks get followed.
+    """
+    page = {"page_size": 1}
+
+    def post(title, content="text"):
+        return {"title": title, "content": content, "author_id": 1}
+
+    def comment(content, post_id):
+        return {"content": content, "post_id": post_id, "author_id": 1}
+
+    steps = [
+        ("POST", "/user/", {"json": {"name": "bob", "password": "pw"}}),
+        ("POST", "/post/", {"json": post("plans", "explain query")}),
+        ("POST", "/post/bulk", {"json": [post(f"bulk {i}") for i in range(3)]}),
+        ("POST", "/comment/", {"json": comment("first", 1)}),
+        ("POST", "/comment/", {"json": comment("reply", 1)}),
+        ("POST", "/comment/bulk", {"json": [comment("more", 2)] * 3}),
+        ("PUT", "/comment/2", {"json": {"parent_comment_id": 1}}),
+        ("POST", "/tag/", {"json": {"name": "sqlite"}}),
+        ("POST", "/tag/bulk", {"json": [{"name": "index"}, {"name": "plan"}]}),
+        ("POST", "/posttags/", {"json": {"post_id": 1, "tag_id": 1}}),
+        ("POST", "/posttags/bulk", {"json": [{"post_id": 2, "tag_id": 1}] * 2}),
+        ("GET", "/", {}),
+        ("GET", "/stats", {}),
+    ]
+    lists = {
+        "/user/": [{"name": "alice"}, {"name__prefix": "al"}, {"sort": "-name"}],
+        "/post/": [
+            {"title__prefix": "bulk"},
+            {"id__in": "1,2"},
+            {"updated_at__gte": SINCE, "sort": "updated_at"},
+            {"sort": "title"},
+            {"sort": "-updated_at"},
+            {"expand": "author,comments.author,tags"},
+            {"fields": "title"},
+        ],
+        "/comment/": [{"sort": "-updated_at"}, {"expand": "post,replies"}],
+        "/tag/": [{"name__prefix": "s"}, {"sort": "name"}, {"expand": "posts"}],
+        "/posttags/": [{"sort": "-id"}],
+    }
+    for path, variants in lists.items():
+        prefix = path.rstrip("/")
+        steps.append(("GET", path, {"params": page}))
+        steps += [("GET", path, {"params": {**page, **v}}) for v in variants]
+        steps.append(("GET", f"{prefix}/changes", {"params": {**page, "since": SINCE}}))
+        steps.append(("GET", f"{prefix}/1", {}))
+        steps.append(("GET", f"{prefix}/1", {"params": {"fields": "id"}}))
+    for prefix in ("/post", "/comment"):
+        steps += [
+            ("GET", f"{prefix}/export", {}),
+            ("GET", f"{prefix}/export", {"params": {"format": "csv"}}),
+            ("GET", f"{prefix}/export", {"params": {"updated_since": SINCE}}),
+            ("GET", f"{prefix}/search", {"params": {**page, "q": "first plans"}}),
+            ("GET", f"{prefix}/search", {"params": {**page, "q": "bulk*"}}),
+        ]
+    steps += [
+        ("GET", "/user/1/posts", {"params": page}),
+        ("GET", "/user/1/comments", {"params": page}),
+        ("GET", "/post/1/comments", {"params": page}),
+        ("GET", "/post/1/thread", {"params": page}),
+        ("GET", "/post/1/thread", {"params": {"depth": 0}}),
+        ("GET", "/post/1/tags", {"params": page}),
+        ("PUT", "/user/2", {"json": {"name": "robert"}}),
+        ("PUT", "/post/2", {"json": {"content": "updated"}}),
+        ("PUT", "/tag/2", {"json": {"description": "updated"}}),
+        ("PUT", "/posttags/2", {"json": {"tag_id": 2}}),
+        ("PATCH", "/post/bulk", {"json": [{"id": 3, "content": "x"}]}),
+        ("PATCH", "/comment/bulk", {"json": [{"id": 3, "content": "x"}]}),
+        ("PATCH", "/user/bulk", {"json": [{"id": 2, "name": "bobby"}]}),
+        ("PATCH", "/tag/bulk", {"json": [{"id": 3, "description": "x"}]}),
+        ("PATCH", "/posttags/bulk", {"json": [{"id": 3, "tag_id": 3}]}),
+    ]
+    for prefix, item_id in (("/user", 2), ("/post", 2), ("/comment", 3)):
+        steps += [
+            ("DELETE", f"{prefix}/{item_id}", {}),
+            ("GET", f"{prefix}/deleted/", {"params": page}),
+            ("POST", f"{prefix}/{item_id}/restore", {}),
+            ("DELETE", f"{prefix}/bulk", {"json": [item_id]}),
+        ]
+    steps += [
+        ("DELETE", "/comment/1", {"params": {"hard": True}}),
+        ("DELETE", "/comment/bulk", {"params": {"hard": True}, "json": [4]}),
+        ("DELETE", "/posttags/1", {}),
+        ("DELETE", "/posttags/bulk", {"json": [2]}),
+        ("DELETE", "/tag/3", {}),
+        ("DELETE", "/tag/bulk", {"json": [2]}),
+        ("DELETE", "/post/bulk", {"params": {"hard": True}, "json": [4]}),
+        ("DELETE", "/post/1", {"params": {"hard": True}}),
+        ("DELETE", "/user/bulk", {"params": {"hard": True}, "json": [2]}),
+        ("DELETE", "/user/1", {"params": {"hard": True}}),
+    ]
+    return steps
+
+
+def route_of(method: str, path: str) -> str:
+    scope = {"type": "http", "method": method, "path": path}
+    for route in app.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return path
+
+
+class Recorder:
+    """
+    Statements run while `route` is being served, grouped by route
+    """
+
+    def __init__(self):
+        self.route = None
+        self.called = set()
+        self.statements = defaultdict(dict)
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        verb = statement.lstrip().split(None, 1)[0].upper()
+        if self.route is None or verb not in {"SELECT", "UPDATE", "DELETE", "WITH"}:
+            return
+        if executemany:
+            parameters = parameters[0]
+        self.statements[self.route].setdefault(statement, parameters)
+
+
+def request(client, recorder, method, path, headers, **kwargs):
+    recorder.route = f"{method} {route_of(method, path)}"
+    recorder.called.add(recorder.route)
+    response = client.request(method, path, headers=headers, **kwargs)
+    json_body = response.headers.get("content-type", "").startswith("application/json")
+    body = response.json() if json_body else {}
+    # one more page, to see the cursor (or watermark) predicates
+    if isinstance(body, dict) and body.get("next_cursor"):
+        params = {**kwargs.get("params", {}), "cursor": body["next_cursor"]}
+        client.request(method, path, headers=headers, params=params)
+    elif isinstance(body, dict) and body.get("has_more"):
+        params = {**kwargs.get("params", {}), "watermark": body["watermark"]}
+        client.request(method, path, headers=headers, params=params)
+    recorder.route = None
+    return response
+
+
+def primary_key_page(statement: str, table: str) -> bool:
+    """
+    A page read in primary key order, filtered on nothing but the
+    soft-delete flag and the cursor: the scan stops after LIMIT rows
+    """
+    statement = " ".join(statement.split())
+    # joins (?expand=) load related rows by primary key
+    match = re.search(
+        rf"FROM {table}(?: LEFT OUTER JOIN (?:(?! WHERE ).)*)?(?: WHERE (.*?))? "
+        rf"ORDER BY {table}\.id( DESC)? LIMIT",
+        statement,
+    )
+    if match is None:
+        return False
+    terms = (match.group(1) or "").split(" AND ")
+    allowed = rf"^\(?{table}\.(is_soft_deleted = [01]|id [<>] \?)\)?$"
+    return all(re.match(allowed, term) for term in terms if term)
+
+
+def classify(statement: str, plan: list, tables: set) -> dict:
+    """
+    Full scans of base tables (not of CTEs, subqueries or FTS tables)
+    and sorts that could not use an index
+    """
+    scans, sorts = [], []
+    for row in plan:
+        detail = row[-1]
+        words = detail.split()
+        if words[0] == "SCAN" and words[1] in tables and "USING" not in words:
+            if not primary_key_page(statement, words[1]):
+                scans.append(detail)
+        if detail.startswith("USE TEMP B-TREE"):
+            sorts.append(detail)
+    return {"scans": scans, "sorts": sorts}
+
+
+def main() -> int:
+    recorder = Recorder()
+    for target in (engine, read_engine):
+        event.listen(target.sync_engine, "before_cursor_execute", recorder)
+
+    errors = []
+    with TestClient(app) as client, contextlib.redirect_stdout(sys.stderr):
+        user = {"name": "alice", "password": "pw"}
+        request(client, recorder, "POST", "/user/", {}, json=user)
+        login = {"username": "alice", "password": "pw"}
+        response = request(client, recorder, "POST", "/user/login", {}, data=login)
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        for method, path, kwargs in scenario():
+            response = request(client, recorder, method, path, headers, **kwargs)
+            if response.status_code >= 400:
+                errors.append(f"{method} {path}: {response.status_code}")
+
+    routes = {
+        f"{method} {route.path}"
+        for route in app.routes
+        if isinstance(route, APIRoute)
+        for method in route.methods
+    }
+
+    tables = set(Base.metadata.tables)
+    database = sqlite3.connect(settings.DATABASES["default"]["path"])
+    report, failures = {}, 0
+    for route, statements in sorted(recorder.statements.items()):
+        for statement, parameters in statements.items():
+            plan = database.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            found = classify(statement, plan.fetchall(), tables)
+            if not (found["scans"] or found["sorts"]):
+                continue
+            expected = route.split()[1] in EXPECTED_SCANS
+            if found["scans"] and not expected:
+                failures += 1
+            report.setdefault(route, []).append(
+                {"sql": " ".join(statement.split()), **found, "expected": expected}
+            )
+    database.close()
+
+    results = {
+        "statements": sum(len(s) for s in recorder.statements.values()),
+        "failures": failures,
+        "uncovered": sorted(routes - recorder.called),
+        "errors": errors,
+        "flagged": report,
+    }
+    print(json.dumps(results, indent=2))
+    return 1 if failures or results["uncovered"] or errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Read and write throughput of a SQLite file with the driver defaults
+against SQLITE_PRAGMAS, alone and with readers and a writer running
+concurrently.
+
+    python -m fastbg.bench.pragmas [rounds]
+"""
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from fastbg.conf import settings
+from fastbg.db import Base, Tag, sqlite_pragmas
+
+
+async def write(Session, i: int):
+    # one transaction per request
+    async with Session() as db:
+        await db.execute(insert(Tag).values(name=f"tag{i}"))
+        await db.commit()
+
+
+async def read(Session, i: int):
+    async with Session() as db:
+        result = await db.execute(select(Tag).where(Tag.id == i % 100 + 1))
+        result.scalar_one()
+
+
+async def run(func, Session, rounds: int, offset: int = 0) -> float:
+    start = time.perf_counter()
+    for i in range(rounds):
+        await func(Session, offset + i)
+    return time.perf_counter() - start
+
+
+async def measure(url: str, pragmas: dict, rounds: int) -> dict:
+    engine = create_async_engine(url)
+    sqlite_pragmas(engine, pragmas)
+    Session = async_sessionmaker(engine, class_=AsyncSession)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    for i in range(100):
+        await write(Session, i)
+
+    writes = await run(write, Session, rounds, offset=100)
+    reads = await run(read, Session, rounds)
+
+    # separate engines so readers and the writer hold their own connections
+    readers = []
+    for _ in range(4):
+        reader = create_async_engine(url)
+        sqlite_pragmas(reader, pragmas)
+        readers.append(reader)
+    start = time.perf_counter()
+    await asyncio.gather(
+        run(write, Session, rounds, offset=100 + rounds),
+        *(
+            run(read, async_sessionmaker(reader, class_=AsyncSession), rounds)
+            for reader in readers
+        ),
+    )
+    mixed = time.perf_counter() - start
+
+    for reader in readers:
+        await reader.dispose()
+    await engine.dispose()
+    return {
+        "writes_per_s": round(rounds / writes),
+        "reads_per_s": round(rounds / reads),
+        "mixed_ops_per_s": round(rounds * (1 + len(readers)) / mixed),
+    }
+
+
+async def main(rounds: int = 1000):
+    results = {}
+    for name, pragmas in (("defaults", {}), ("settings", settings.SQLITE_PRAGMAS)):
+        with tempfile.TemporaryDirectory() as tmp:
+            url = f"sqlite+aiosqlite:///{Path(tmp) / 'bench.sqlite'}"
+            results[name] = await measure(url, pragmas, rounds)
+
+    print(json.dumps(results, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*(int(arg) for arg in sys.argv[1:])))
@@ -0,0 +1,115 @@
+"""
+Throughput and memory of list pages read as ORM instances against
+`ReadMode.CORE` column rows, over a table of `rows` posts.
+
+    python -m fastbg.bench.reads [rows] [page_size]
+"""
+import asyncio
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from fastbg.db import Base, Post, User
+from fastbg.query import as_columns, base_query
+from fastbg.router.core import paginate
+from fastbg.schema import sqlalchemy_to_pydantic
+from fastbg.serializer import dump_rows, field_names
+from pydantic_core import to_json
+
+FIELDS = field_names(sqlalchemy_to_pydantic(Post))
+
+
+async def seed(Session, rows: int):
+    now = datetime.utcnow()
+    async with Session() as db:
+        await db.execute(insert(User), [{"name": "author", "password": b"x" * 60}])
+        batch = 10000
+        for start in range(0, rows, batch):
+            await db.execute(
+                insert(Post),
+                [
+                    {
+                        "title": f"post {i}",
+                        "content": "x" * 500,
+                        "author_id": 1,
+                        "created_at": now,
+                        "updated_at": now,
+                    }
+                    for i in range(start, min(start + batch, rows))
+                ],
+            )
+        await db.commit()
+
+
+async def read_page(Session, orm: bool, cursor, page_size: int):
+    stmt = base_query(Post)
+    if not orm:
+        stmt = as_columns(stmt, Post)
+    async with Session() as db:
+        page = await paginate(db, stmt, Post, cursor, page_size, orm=orm)
+        to_json({"items": dump_rows(page["items"], FIELDS), "next_cursor": None})
+    return page["next_cursor"]
+
+
+async def scan(Session, orm: bool, page_size: int) -> dict:
+    pages, cursor = 0, None
+    start = time.perf_counter()
+    while True:
+        cursor = await read_page(Session, orm, cursor, page_size)
+        pages += 1
+        if cursor is None:
+            break
+    elapsed = time.perf_counter() - start
+    return {
+        "pages": pages,
+        "rows_per_s": round(pages * page_size / elapsed),
+        "ms_per_page": round(elapsed / pages * 1e3, 3),
+    }
+
+
+async def peak_memory(Session, orm: bool, page_size: int, pages: int = 20) -> int:
+    """
+    Average peak of traced allocations per page, in KiB
+    """
+    total, cursor = 0, None
+    for _ in range(pages):
+        tracemalloc.start()
+        cursor = await read_page(Session, orm, cursor, page_size)
+        total += tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return round(total / pages / 1024, 1)
+
+
+async def main(rows: int = 100000, page_size: int = 100):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{Path(tmp) / 'bench.sqlite'}"
+        )
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        Session = async_sessionmaker(
+            engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+        )
+        await seed(Session, rows)
+
+        results = {}
+        for name, orm in (("orm", True), ("core", False)):
+            results[name] = {
+                **await scan(Session, orm, page_size),
+                "peak_kib_per_page": await peak_memory(Session, orm, page_size),
+            }
+        await engine.dispose()
+
+    print(json.dumps(results, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*(int(arg) for arg in sys.argv[1:])))
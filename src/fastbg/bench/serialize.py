@@ -0,0 +1,92 @@
+"""
+CPU cost of serializing one list page per model: FastAPI's
+`response_model` path, a precompiled TypeAdapter, and `Serializer.FAST`.
+
+    python -m fastbg.bench.serialize [page_size] [rounds]
+"""
+import json
+import sys
+import time
+from datetime import datetime
+
+from pydantic import TypeAdapter
+
+from fastbg.counters import counter_columns
+from fastbg.db import Comment, Post, PostTags, Tag, User
+from fastbg.schema import page_schema, sqlalchemy_to_pydantic
+from fastbg.serializer import dump_rows, field_names
+from pydantic_core import to_json
+
+NOW = datetime(2024, 1, 1, 12, 30)
+
+
+def make_rows(model, page_size: int) -> list:
+    common = {"created_at": NOW, "updated_at": NOW}
+    if hasattr(model, "is_soft_deleted"):
+        common.update(is_soft_deleted=False, soft_deleted_at=None)
+    # column defaults only apply on insert
+    common.update(dict.fromkeys(counter_columns(model.__tablename__), 0))
+
+    rows = []
+    for i in range(1, page_size + 1):
+        if model is User:
+            # the password is excluded from the response schema
+            values = {"name": f"user{i}"}
+        elif model is Post:
+            values = {"title": f"post {i}", "content": "x" * 2000, "author_id": 1}
+        elif model is Comment:
+            values = {"content": "x" * 200, "author_id": 1, "post_id": 1}
+        elif model is PostTags:
+            values = {"post_id": 1, "tag_id": i}
+        else:
+            values = {"name": f"tag{i}", "description": "x" * 100}
+        rows.append(model(id=i, **common, **values))
+    return rows
+
+
+def response_model_path(adapter, page):
+    # what FastAPI does with `response_model`: validate, dump, json.dumps
+    data = adapter.validate_python(page, from_attributes=True)
+    return json.dumps(adapter.dump_python(data, mode="json")).encode("utf-8")
+
+
+def adapter_path(adapter, page):
+    return adapter.dump_json(adapter.validate_python(page, from_attributes=True))
+
+
+def fast_path(fields, page):
+    items = dump_rows(page["items"], fields)
+    return to_json({"items": items, "next_cursor": page["next_cursor"]})
+
+
+def measure(func, arg, page, rounds: int) -> float:
+    func(arg, page)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(arg, page)
+    return round((time.perf_counter() - start) / rounds * 1e6, 1)
+
+
+def main(page_size: int = 100, rounds: int = 200):
+    results = {}
+    for model in (User, Post, Comment, Tag):
+        exclude = ["password"] if model is User else []
+        schema = sqlalchemy_to_pydantic(model, exclude=exclude)
+        adapter = TypeAdapter(page_schema(schema))
+        page = {"items": make_rows(model, page_size), "next_cursor": "abc"}
+
+        fast = fast_path(field_names(schema), page)
+        assert json.loads(fast) == json.loads(adapter_path(adapter, page))
+
+        results[model.__name__] = {
+            "response_model_us": measure(response_model_path, adapter, page, rounds),
+            "type_adapter_us": measure(adapter_path, adapter, page, rounds),
+            "fast_us": measure(fast_path, field_names(schema), page, rounds),
+        }
+
+    print(json.dumps(results, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,102 @@
+"""
+Per-request cost of a read-write session (committed per request) against the
+read-only one (`get_read_db`) for a primary key lookup. Both engines get
+the same SQLite pragmas; the two alternate for `runs` runs of `rounds`
+requests and the median run is reported.
+
+    python -m fastbg.bench.sessions [rounds] [runs]
+"""
+import asyncio
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from fastbg.db import Base, Tag, sqlite_pragmas
+from fastbg.api import make_read_engine
+
+
+async def read_write(Session, item_id):
+    # a session committed per request, around a GET
+    async with Session() as session:
+        try:
+            result = await session.execute(select(Tag).where(Tag.id == item_id))
+            result.scalar_one()
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+
+
+async def read_only(ReadSession, item_id):
+    async with ReadSession() as session:
+        result = await session.execute(select(Tag).where(Tag.id == item_id))
+        result.scalar_one()
+
+
+async def measure(func, Session, engine, rounds: int) -> dict:
+    calls = []
+    listener = lambda *args: calls.append(None)
+    event.listen(engine.sync_engine, "before_cursor_execute", listener)
+    start = time.perf_counter()
+    for i in range(rounds):
+        await func(Session, i % 100 + 1)
+    elapsed = time.perf_counter() - start
+    event.remove(engine.sync_engine, "before_cursor_execute", listener)
+    return {
+        "statements_per_request": len(calls) / rounds,
+        "us_per_request": round(elapsed / rounds * 1e6, 1),
+    }
+
+
+def median(runs: list) -> dict:
+    return {
+        "statements_per_request": runs[0]["statements_per_request"],
+        "us_per_request": statistics.median(run["us_per_request"] for run in runs),
+        "us_per_request_runs": [run["us_per_request"] for run in runs],
+    }
+
+
+async def main(rounds: int = 2000, runs: int = 5):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite+aiosqlite:///{Path(tmp) / 'bench.sqlite'}"
+        engine = create_async_engine(url)
+        sqlite_pragmas(engine)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        Session = async_sessionmaker(engine, class_=AsyncSession)
+        async with Session() as db:
+            db.add_all(Tag(name=f"tag{i}") for i in range(100))
+            await db.commit()
+
+        read_engine = make_read_engine(url, {})
+        ReadSession = async_sessionmaker(
+            read_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+        )
+        # warm up both pools
+        await read_write(Session, 1)
+        await read_only(ReadSession, 1)
+
+        measured = {"read_write": [], "get_read_db": []}
+        for _ in range(runs):
+            measured["read_write"].append(
+                await measure(read_write, Session, engine, rounds)
+            )
+            measured["get_read_db"].append(
+                await measure(read_only, ReadSession, read_engine, rounds)
+            )
+        results = {name: median(values) for name, values in measured.items()}
+        await engine.dispose()
+        await read_engine.dispose()
+
+    print(json.dumps(results, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*(int(arg) for arg in sys.argv[1:])))
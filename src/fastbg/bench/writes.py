@@ -0,0 +1,147 @@
+"""
+Statements and time per write: the old load/flush/refresh handlers
+against `fastbg.writes`, with and without RETURNING support.
+
+    python -m fastbg.bench.writes [rounds]
+"""
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from fastbg.db import Base, Tag, Comment, Post, User
+from fastbg import writes
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self)
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+
+# what the handlers in router/core.py did before
+async def legacy_create(db, values):
+    db_item = Tag(**values)
+    db.add(db_item)
+    await db.commit()
+    await db.refresh(db_item)
+    return db_item
+
+
+async def legacy_update(db, item_id, values):
+    result = await db.execute(select(Tag).where(Tag.id == item_id))
+    db_item = result.scalar_one_or_none()
+    for field, value in values.items():
+        setattr(db_item, field, value)
+    await db.commit()
+    await db.refresh(db_item)
+    return db_item
+
+
+async def legacy_soft_delete(db, item_id):
+    result = await db.execute(
+        select(Comment).where(Comment.id == item_id, Comment.is_soft_deleted == False)
+    )
+    db_item = result.scalar_one_or_none()
+    db_item.soft_delete()
+    await db.commit()
+
+
+async def returning_create(db, values):
+    db_item = await writes.insert_item(db, Tag, values)
+    await db.commit()
+    return db_item
+
+
+async def returning_update(db, item_id, values):
+    db_item = await writes.update_item(db, Tag, item_id, values)
+    await db.commit()
+    return db_item
+
+
+async def returning_soft_delete(db, item_id):
+    await writes.update_item(
+        db,
+        Comment,
+        item_id,
+        {"is_soft_deleted": True, "soft_deleted_at": datetime.utcnow()},
+        Comment.is_soft_deleted == False,
+    )
+    await db.commit()
+
+
+PATHS = {
+    "legacy": (legacy_create, legacy_update, legacy_soft_delete),
+    "returning": (returning_create, returning_update, returning_soft_delete),
+}
+
+
+async def run_path(path: str, rounds: int, fallback: bool = False) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{Path(tmp) / 'bench.sqlite'}"
+        )
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        if fallback:
+            dialect = engine.dialect
+            dialect.insert_returning = False
+            dialect.update_returning = False
+            dialect.delete_returning = False
+
+        Session = async_sessionmaker(
+            engine, class_=AsyncSession, expire_on_commit=path == "legacy"
+        )
+        async with Session() as db:
+            db.add(User(name="bench", password="x"))
+            await db.flush()
+            db.add(Post(title="bench", content="x", author_id=1))
+            await db.flush()
+            db.add_all(
+                Comment(content="x", author_id=1, post_id=1) for _ in range(rounds)
+            )
+            await db.commit()
+
+        create, update, soft_delete = PATHS[path]
+        counter = StatementCounter(engine)
+        report = {}
+        for name, op in (
+            ("create", lambda db, i: create(db, {"name": f"tag{i}"})),
+            ("update", lambda db, i: update(db, i + 1, {"name": f"new{i}"})),
+            ("soft_delete", lambda db, i: soft_delete(db, i + 1)),
+        ):
+            counter.count = 0
+            start = time.perf_counter()
+            for i in range(rounds):
+                async with Session() as db:
+                    await op(db, i)
+            elapsed = time.perf_counter() - start
+            report[name] = {
+                "statements_per_op": counter.count / rounds,
+                "ops_per_second": round(rounds / elapsed, 1),
+            }
+        await engine.dispose()
+    return report
+
+
+async def main(rounds: int = 200):
+    results = {
+        "legacy": await run_path("legacy", rounds),
+        "returning": await run_path("returning", rounds),
+        "fallback": await run_path("returning", rounds, fallback=True),
+    }
+    print(json.dumps(results, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*(int(arg) for arg in sys.argv[1:])))
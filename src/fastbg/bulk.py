@@ -0,0 +1,190 @@
+"""
+Batched writes for the /bulk endpoints.
+Each helper runs the whole batch as one statement and, only if that
+statement violates a constraint, retries row by row inside savepoints
+so a single bad item does not fail the rest.
+"""
+
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import and_, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fastbg.query import base_query, live_filter
+
+# (position in the request, payload)
+Row = Tuple[int, Any]
+
+
+def error(index: int, detail: Any, item_id: int = None) -> Dict[str, Any]:
+    return {"index": index, "id": item_id, "detail": detail}
+
+
+def validation_error(index: int, e: ValidationError, item_id: int = None):
+    # round-trip through JSON, `errors()` may hold exception instances
+    return error(index, json.loads(e.json(include_url=False)), item_id)
+
+
+def integrity_error(index: int, e: IntegrityError, item_id: int = None):
+    return error(index, str(e.orig), item_id)
+
+
+async def bulk_insert(
+    db: AsyncSession, model, rows: List[Row], errors: List[dict]
+) -> List[Row]:
+    """
+    INSERT `rows` with a single executemany. Returns (index, id) pairs
+    """
+    if not rows:
+        return []
+
+    stmt = insert(model).returning(model.id, sort_by_parameter_order=True)
+    try:
+        async with db.begin_nested():
+            result = await db.execute(stmt, [values for _, values in rows])
+            ids = result.scalars().all()
+        return [(index, item_id) for (index, _), item_id in zip(rows, ids)]
+    except IntegrityError:
+        pass
+
+    created = []
+    for index, values in rows:
+        try:
+            async with db.begin_nested():
+                result = await db.execute(stmt, [values])
+                created.append((index, result.scalar_one()))
+        except IntegrityError as e:
+            errors.append(integrity_error(index, e))
+    return created
+
+
+def unique_rows(ids: List[int]) -> Tuple[List[Row], List[dict]]:
+    rows, errors, seen = [], [], set()
+    for index, item_id in enumerate(ids):
+        if item_id in seen:
+            errors.append(error(index, "Duplicate id", item_id))
+            continue
+        seen.add(item_id)
+        rows.append((index, item_id))
+    return rows, errors
+
+
+def live_update(model):
+    stmt = update(model).where(*live_filter(model))
+    return stmt.execution_options(synchronize_session=False)
+
+
+async def live_ids(
+    db: AsyncSession, model, ids: List[int], where: tuple = ()
+) -> Dict[int, bool]:
+    """
+    Map the live rows among `ids` to whether they also satisfy `where`
+    (e.g. an ownership filter), in a single query
+    """
+    stmt = base_query(model).where(model.id.in_(ids))
+    if not where:
+        result = await db.execute(stmt.with_only_columns(model.id))
+        return {item_id: True for item_id in result.scalars().all()}
+
+    allowed = and_(*where).label("allowed")
+    result = await db.execute(stmt.with_only_columns(model.id, allowed))
+    return {item_id: bool(allowed) for item_id, allowed in result.all()}
+
+
+def drop_missing(
+    rows: List[Row], found: Dict[int, bool], errors: List[dict]
+) -> List[Row]:
+    kept = []
+    for index, item_id in rows:
+        if item_id not in found:
+            errors.append(error(index, "Item not found", item_id))
+        elif not found[item_id]:
+            errors.append(error(index, "Not authorized", item_id))
+        else:
+            kept.append((index, item_id))
+    return kept
+
+
+async def bulk_update(
+    db: AsyncSession,
+    model,
+    rows: List[Row],
+    values: Dict[int, dict],
+    errors: List[dict],
+    where: tuple = (),
+) -> List[Row]:
+    """
+    Set `values[item_id]` on each of the (index, id) `rows`. Rows
+    changing the same columns share one executemany UPDATE by primary
+    key, whatever the values
+    """
+    found = await live_ids(db, model, [item_id for _, item_id in rows], where)
+    groups: Dict[frozenset, List[Row]] = {}
+    for index, item_id in drop_missing(rows, found, errors):
+        groups.setdefault(frozenset(values[item_id]), []).append((index, item_id))
+
+    stmt = update(model).where(*live_filter(model), *where)
+    stmt = stmt.execution_options(synchronize_session=False)
+    updated = []
+    for rows in groups.values():
+        params = [{"id": item_id, **values[item_id]} for _, item_id in rows]
+        try:
+            async with db.begin_nested():
+                await db.execute(stmt, params)
+            updated.extend(rows)
+            continue
+        except IntegrityError:
+            pass
+
+        for (index, item_id), row in zip(rows, params):
+            try:
+                async with db.begin_nested():
+                    await db.execute(stmt, [row])
+                updated.append((index, item_id))
+            except IntegrityError as e:
+                errors.append(integrity_error(index, e, item_id))
+    return updated
+
+
+async def bulk_soft_delete(
+    db: AsyncSession, model, rows: List[Row], errors: List[dict], where: tuple = ()
+) -> List[Row]:
+    found = await live_ids(db, model, [item_id for _, item_id in rows], where)
+    rows = drop_missing(rows, found, errors)
+    if not rows:
+        return []
+
+    await db.execute(
+        live_update(model)
+        .where(model.id.in_([item_id for _, item_id in rows]), *where)
+        .values(is_soft_deleted=True, soft_deleted_at=datetime.utcnow())
+    )
+    return rows
+
+
+async def bulk_hard_delete(
+    db: AsyncSession, model, rows: List[Row], errors: List[dict], where: tuple = ()
+) -> List[Row]:
+    """
+    Rows are deleted through the session so relationship cascades still
+    apply; the unit of work batches the DELETEs per table.
+    """
+    stmt = base_query(model).where(model.id.in_([item_id for _, item_id in rows]))
+    if where:
+        stmt = stmt.add_columns(and_(*where).label("allowed"))
+        result = await db.execute(stmt)
+        items = {item.id: (item, bool(allowed)) for item, allowed in result.all()}
+    else:
+        result = await db.execute(stmt)
+        items = {item.id: (item, True) for item in result.scalars().all()}
+    rows = drop_missing(
+        rows, {item_id: allowed for item_id, (_, allowed) in items.items()}, errors
+    )
+
+    for _, item_id in rows:
+        await db.delete(items[item_id][0])
+    return rows
@@ -0,0 +1,155 @@
+"""
+In-process caching of serialized objects
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Type
+
+from fastbg.conf import settings
+
+
+class CacheBackend:
+    """
+    Subset of the Redis key/value API used by the routers.
+    Values must be JSON-compatible so any backend can store them.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError("Subclasses must implement get method")
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        raise NotImplementedError("Subclasses must implement set method")
+
+    def delete(self, key: str):
+        raise NotImplementedError("Subclasses must implement delete method")
+
+    def clear(self):
+        raise NotImplementedError("Subclasses must implement clear method")
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class LRUCache(CacheBackend):
+    """
+    Bounded least-recently-used cache where entries expire after `ttl` seconds
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 30, clock=time.monotonic):
+        super().__init__()
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._data = OrderedDict()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, expires_at = entry
+        if expires_at <= self.clock():
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self._data[key] = (value, self.clock() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        return {
+            **super().stats(),
+            "size": len(self._data),
+            "max_size": self.max_size,
+        }
+
+
+# per-model backends, keyed by table name
+_caches: Dict[str, CacheBackend] = {}
+# other caches derived from a model, see `on_invalidate`
+_hooks: Dict[str, List[Callable]] = {}
+# invalidations per model, see `generation`
+_generations: Dict[str, int] = {}
+
+
+def cache_key(model: Type, item_id: int) -> str:
+    # prefixed so several models can share one (remote) backend
+    return f"{model.__tablename__}:{item_id}"
+
+
+def register_cache(model: Type, backend: CacheBackend) -> CacheBackend:
+    _caches[model.__tablename__] = backend
+    return backend
+
+
+def get_cache(model: Type) -> Optional[CacheBackend]:
+    """
+    Return the backend for `model`, creating the default one on first use.
+    None if caching is disabled in the settings.
+    """
+    name = model.__tablename__
+    if name not in _caches:
+        config = settings.OBJECT_CACHE
+        if not config.get("enabled"):
+            return None
+        _caches[name] = LRUCache(
+            max_size=config.get("max_size", 1024), ttl=config.get("ttl", 30)
+        )
+    return _caches[name]
+
+
+def on_invalidate(model: Type, func: Callable):
+    """
+    Call `func(*item_ids)` whenever rows of `model` are invalidated
+    """
+    _hooks.setdefault(model.__tablename__, []).append(func)
+
+
+def generation(model: Type) -> int:
+    """
+    Number of invalidations of `model` so far. A row read from the
+    database is only cached if it did not change meanwhile, or a write
+    committed during the read would be cached stale.
+    """
+    return _generations.get(model.__tablename__, 0)
+
+
+def invalidate(model: Type, *item_ids: int):
+    _generations[model.__tablename__] = generation(model) + 1
+    for func in _hooks.get(model.__tablename__, ()):
+        func(*item_ids)
+
+    cache = _caches.get(model.__tablename__)
+    if cache is None:
+        return
+    for item_id in item_ids:
+        cache.delete(cache_key(model, item_id))
+
+
+def clear_cache(model: Type):
+    cache = _caches.get(model.__tablename__)
+    if cache is not None:
+        cache.clear()
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    return {name: cache.stats() for name, cache in _caches.items()}
@@ -10,6 +10,67 @@ SECRET_KEY = "PYPPbMsYt9JzSfuNi80mj8nW3kh2IiuLMAQdOcK4jTu3n9FORLSyVdmzc7V4K9KUDu
 # Config
 DEBUG = False
 
+# Pagination
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+# items per request on the /bulk endpoints
+MAX_BULK_SIZE = 1000
+# ?expand=comments.author is 2 levels
+MAX_EXPAND_DEPTH = 2
+# reply levels returned by /post/{id}/thread
+MAX_THREAD_DEPTH = 64
+# rows fetched per round trip by the /export endpoints
+EXPORT_BATCH_SIZE = 1000
+# seconds; /changes only reports rows older than this, so a write stamped
+# before a poll but committed after it is not left behind the watermark
+CHANGES_SAFETY_MARGIN = 1.0
+
+# Password hashing
+# bcrypt runs on a dedicated pool ("thread" or "process") so it does not
+# block the event loop; calls beyond max_pending are answered with a 429
+PASSWORD_HASHING = {
+    "executor": "thread",
+    "workers": 4,
+    "max_pending": 64,
+}
+
+# Caching
+# serialized objects served by GET /{model}/{item_id}
+OBJECT_CACHE = {
+    "enabled": True,
+    "max_size": 1024,
+    # seconds; bounds staleness across workers
+    "ttl": 30,
+}
+# token subject -> authenticated user, saves a query per request
+USER_CACHE = {
+    "enabled": True,
+    "max_size": 4096,
+    "ttl": 10,
+}
+
+# SQLite
+# run on every new connection, see fastbg.db.sqlite_pragmas
+SQLITE_PRAGMAS = {
+    # readers do not block the writer and vice versa
+    "journal_mode": "WAL",
+    # with WAL only a power loss can drop the last commits
+    "synchronous": "NORMAL",
+    # negative: KiB, i.e. 64 MiB of page cache per connection
+    "cache_size": -64000,
+    "mmap_size": 256 * 1024 * 1024,
+    # ms to wait for a lock instead of failing with "database is locked"
+    "busy_timeout": 5000,
+    "temp_store": "MEMORY",
+}
+# writes go through one connection and a queue (see fastbg.writer),
+# GET requests use `readers` query_only connections
+SQLITE_POOLS = {
+    "readers": 8,
+    # queued write jobs committed in one transaction
+    "max_batch": 64,
+}
+
 # Logging
 LOGGERS = {
     "version": 1,
@@ -0,0 +1,8 @@
+from fastbg.conf.pro import *
+
+# benchmarks (fastbg.bench): logging every statement would dominate the timings
+DEBUG = False
+DATABASES = {
+    **DATABASES,
+    "default": {**DATABASES["default"], "config": {"echo": DEBUG}},
+}
@@ -0,0 +1,10 @@
+from fastbg.conf.pro import *
+
+# tests (fastbg.test): keep the output readable
+DEBUG = False
+# the writes of a test are committed before it polls /changes
+CHANGES_SAFETY_MARGIN = 0
+DATABASES = {
+    **DATABASES,
+    "default": {**DATABASES["default"], "config": {"echo": DEBUG}},
+}
@@ -0,0 +1,248 @@
+"""
+Denormalized counters, e.g. `post.comment_count`.
+They count live (not soft-deleted) rows and are kept up to date by
+SQLite triggers, so every write path (single, bulk, cascades) changes
+them in its own transaction. `repair` recomputes them from scratch.
+"""
+from typing import Collection, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, text
+
+# SQLAlchemy's storage format for DateTime on SQLite is in microseconds,
+# SQLite's clock in milliseconds. A new version is the clock, never ahead
+# of it; if the row's previous version is not behind the clock (written by
+# the app within this millisecond) it moves one microsecond past it, so
+# ETags still change. `/changes` leaves out the most recent rows
+# (CHANGES_SAFETY_MARGIN) for the writes stamped before they commit.
+NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now') || '000'"
+TOUCH = (
+    f"updated_at = CASE WHEN {NOW} > COALESCE(updated_at, '') THEN {NOW} "
+    "WHEN substr(updated_at, 21) < '999999' "
+    "THEN substr(updated_at, 1, 20) || printf('%06d', substr(updated_at, 21) + 1) "
+    "ELSE strftime('%Y-%m-%d %H:%M:%S', updated_at, '+1 seconds') || '.000000' END"
+)
+
+
+class Counter(NamedTuple):
+    """
+    `table.column` is the number of live `counted` rows pointing at it
+    through `foreign_key`, or through the `(association, link)` table
+    if `through` is set
+    """
+
+    table: str
+    column: str
+    counted: str
+    foreign_key: str
+    through: Optional[Tuple[str, str]] = None
+
+
+COUNTERS = (
+    Counter("post", "comment_count", "comment", "post_id"),
+    Counter("comment", "reply_count", "comment", "parent_comment_id"),
+    Counter("tag", "post_count", "post", "tag_id", through=("post_tags", "post_id")),
+)
+
+
+def counter_columns(tablename: str) -> List[str]:
+    return [c.column for c in COUNTERS if c.table == tablename]
+
+
+def dependent_tables(tablename: str) -> List[str]:
+    """
+    Tables whose counters change when rows of `tablename` do
+    """
+    return [
+        c.table
+        for c in COUNTERS
+        if tablename == c.counted or (c.through and tablename == c.through[0])
+    ]
+
+
+def watched_columns(tablename: str) -> List[str]:
+    """
+    Columns of `tablename` that decide which counter rows its rows count
+    towards; changing one of them moves the row from one to another
+    """
+    columns = []
+    for c in COUNTERS:
+        if c.through and tablename == c.through[0]:
+            columns += [c.foreign_key, c.through[1]]
+        elif not c.through and tablename == c.counted:
+            columns.append(c.foreign_key)
+    return columns
+
+
+async def parents(db, tablename: str, ids: Collection[int]) -> Dict[str, Set[int]]:
+    """
+    Ids of the counter rows the `tablename` rows `ids` currently count
+    towards, per counter table
+    """
+    found = {}
+    for c in COUNTERS:
+        if c.through and tablename == c.counted:
+            association, link = c.through
+            query = f"SELECT {c.foreign_key} FROM {association} WHERE {link} IN :ids"
+        elif tablename == (c.through[0] if c.through else c.counted):
+            query = f"SELECT {c.foreign_key} FROM {tablename} WHERE id IN :ids"
+        else:
+            continue
+        stmt = text(query).bindparams(bindparam("ids", expanding=True))
+        result = await db.execute(stmt, {"ids": list(ids)})
+        found.setdefault(c.table, set()).update(
+            item_id for item_id in result.scalars() if item_id is not None
+        )
+    return found
+
+
+def trigger_names(counter: Counter) -> List[str]:
+    prefix = f"{counter.table}_{counter.column}"
+    suffixes = ["ai", "ad", "au"]
+    if counter.through:
+        # the counted rows themselves are deleted or restored
+        suffixes += ["live", "pd"]
+    return [f"{prefix}_{suffix}" for suffix in suffixes]
+
+
+def _bump(counter: Counter, delta: str, where: str) -> str:
+    # the counter is part of the row, so its version changes too
+    return (
+        f"UPDATE {counter.table} SET {counter.column} = {counter.column} {delta}, "
+        f"{TOUCH} WHERE {where};"
+    )
+
+
+def _direct_triggers(counter: Counter) -> List[str]:
+    ai, ad, au = trigger_names(counter)
+    counted, fk = counter.counted, counter.foreign_key
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {ai} AFTER INSERT ON {counted} "
+        f"WHEN new.is_soft_deleted = 0 BEGIN "
+        f"{_bump(counter, '+ 1', f'id = new.{fk}')} END",
+        f"CREATE TRIGGER IF NOT EXISTS {ad} AFTER DELETE ON {counted} "
+        f"WHEN old.is_soft_deleted = 0 BEGIN "
+        f"{_bump(counter, '- 1', f'id = old.{fk}')} END",
+        # soft delete, restore or a row moving to another parent
+        f"CREATE TRIGGER IF NOT EXISTS {au} "
+        f"AFTER UPDATE OF is_soft_deleted, {fk} ON {counted} "
+        f"WHEN old.is_soft_deleted IS NOT new.is_soft_deleted "
+        f"OR old.{fk} IS NOT new.{fk} BEGIN "
+        f"{_bump(counter, '- 1', f'id = old.{fk} AND old.is_soft_deleted = 0')} "
+        f"{_bump(counter, '+ 1', f'id = new.{fk} AND new.is_soft_deleted = 0')} END",
+    ]
+
+
+def _through_triggers(counter: Counter) -> List[str]:
+    ai, ad, au, live, pd = trigger_names(counter)
+    counted, fk = counter.counted, counter.foreign_key
+    association, link = counter.through
+
+    def is_live(row: str) -> str:
+        return (
+            f"EXISTS (SELECT 1 FROM {counted} WHERE id = {row}.{link} "
+            f"AND is_soft_deleted = 0)"
+        )
+
+    # association rows of a counted row, per counter row
+    links = (
+        f"(SELECT COUNT(*) FROM {association} WHERE {link} = {{row}}.id "
+        f"AND {fk} = {counter.table}.id)"
+    )
+    linked = f"id IN (SELECT {fk} FROM {association} WHERE {link} = {{row}}.id)"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {ai} AFTER INSERT ON {association} BEGIN "
+        f"{_bump(counter, '+ 1', f'id = new.{fk} AND ' + is_live('new'))} END",
+        f"CREATE TRIGGER IF NOT EXISTS {ad} AFTER DELETE ON {association} BEGIN "
+        f"{_bump(counter, '- 1', f'id = old.{fk} AND ' + is_live('old'))} END",
+        f"CREATE TRIGGER IF NOT EXISTS {au} "
+        f"AFTER UPDATE OF {link}, {fk} ON {association} BEGIN "
+        f"{_bump(counter, '- 1', f'id = old.{fk} AND ' + is_live('old'))} "
+        f"{_bump(counter, '+ 1', f'id = new.{fk} AND ' + is_live('new'))} END",
+        f"CREATE TRIGGER IF NOT EXISTS {live} AFTER UPDATE OF is_soft_deleted "
+        f"ON {counted} WHEN old.is_soft_deleted IS NOT new.is_soft_deleted BEGIN "
+        + _bump(
+            counter,
+            f"+ (CASE WHEN new.is_soft_deleted = 0 THEN 1 ELSE -1 END) * "
+            + links.format(row="new"),
+            linked.format(row="new"),
+        )
+        + " END",
+        # association rows left behind by a DELETE that skipped the ORM
+        f"CREATE TRIGGER IF NOT EXISTS {pd} AFTER DELETE ON {counted} "
+        f"WHEN old.is_soft_deleted = 0 BEGIN "
+        + _bump(counter, "- " + links.format(row="old"), linked.format(row="old"))
+        + " END",
+    ]
+
+
+def create_statements(counter: Counter) -> List[str]:
+    if counter.through:
+        return _through_triggers(counter)
+    return _direct_triggers(counter)
+
+
+def drop_statements(counter: Counter) -> List[str]:
+    return [f"DROP TRIGGER IF EXISTS {name}" for name in trigger_names(counter)]
+
+
+def count_expression(counter: Counter) -> str:
+    """
+    Correlated subquery computing the counter of a `counter.table` row.
+    The counted table is aliased, it may be the same table (replies).
+    """
+    counted, fk = counter.counted, counter.foreign_key
+    if counter.through:
+        association, link = counter.through
+        return (
+            f"(SELECT COUNT(*) FROM {association} "
+            f"JOIN {counted} AS counted ON counted.id = {association}.{link} "
+            f"WHERE {association}.{fk} = {counter.table}.id "
+            f"AND counted.is_soft_deleted = 0)"
+        )
+    return (
+        f"(SELECT COUNT(*) FROM {counted} AS counted "
+        f"WHERE counted.{fk} = {counter.table}.id AND counted.is_soft_deleted = 0)"
+    )
+
+
+async def check(db) -> Dict[str, List[int]]:
+    """
+    Ids of the rows whose counter is wrong, per counter
+    """
+    wrong = {}
+    for counter in COUNTERS:
+        result = await db.execute(
+            text(
+                f"SELECT id FROM {counter.table} "
+                f"WHERE {counter.column} != {count_expression(counter)} ORDER BY id"
+            )
+        )
+        wrong[f"{counter.table}.{counter.column}"] = result.scalars().all()
+    return wrong
+
+
+async def repair(Session, batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Recompute every counter, `batch_size` rows per transaction so writers
+    are not locked out for long. Returns the number of rows fixed.
+    """
+    fixed = {}
+    for counter in COUNTERS:
+        name = f"{counter.table}.{counter.column}"
+        fixed[name] = 0
+        async with Session() as db:
+            last = await db.scalar(text(f"SELECT MAX(id) FROM {counter.table}"))
+        expression = count_expression(counter)
+        statement = text(
+            f"UPDATE {counter.table} SET {counter.column} = {expression}, "
+            f"{TOUCH} "
+            f"WHERE id > :low AND id <= :high AND {counter.column} != {expression}"
+        )
+        for low in range(0, last or 0, batch_size):
+            async with Session() as db:
+                result = await db.execute(
+                    statement, {"low": low, "high": low + batch_size}
+                )
+                await db.commit()
+            fixed[name] += result.rowcount
+    return fixed
@@ -5,7 +5,7 @@ from datetime import datetime
 import re
 
 from sqlalchemy.orm import relationship, as_declarative, declared_attr
-from sqlalchemy import MetaData, create_engine
+from sqlalchemy import DDL, MetaData, create_engine, event
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy import (
     Boolean,
@@ -15,10 +15,17 @@ from sqlalchemy import (
     Text,
     ForeignKey,
     Column,
+    Index,
 )
 
 from fastbg.conf import settings
-from fastbg.auth.security import get_password_hash, verify_password
+from fastbg import counters, search
+from fastbg.auth.security import (
+    get_password_hash,
+    get_password_hash_async,
+    verify_password,
+)
+
 
 # Mixins
 class TsMixin:
@@ -30,12 +37,18 @@ class TsMixin:
     # sqlalchemy has a convenient hook for auto-updates
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    @declared_attr
+    def __table_args__(cls):
+        # seek index for the /changes endpoints
+        return (Index(f"ix_{cls.__tablename__}_updated_at_id", "updated_at", "id"),)
+
 
 class SoftDeleteMixin:
     """Mixin to add soft-delete functionality to models"""
 
-    # since we will be doing this a lot might as well add an index
-    is_soft_deleted = Column(Boolean, default=False, nullable=False, index=True)
+    # almost every row is live, so an index on the flag alone selects nothing
+    # (and misleads the planner); see the partial indexes below the models
+    is_soft_deleted = Column(Boolean, default=False, nullable=False)
     soft_deleted_at = Column(DateTime, nullable=True)
 
     def soft_delete(self):
@@ -67,6 +80,14 @@ class Base(TsMixin):
 
     id = Column(Integer, primary_key=True, autoincrement=True)
 
+    @classmethod
+    async def bulk_values(cls, values: dict) -> dict:
+        """
+        Hook to adapt validated values before they are written with Core
+        statements, which bypass the ORM attribute machinery
+        """
+        return values
+
     def __str__(self):
         return f"[{self.__class__.__name__}] ({self.as_dict()})"
 
@@ -102,11 +123,24 @@ class User(Base, SoftDeleteMixin):
     )
 
     def set_password(self, password: str):
+        """
+        Hashes on the calling thread: for scripts and the shell only.
+        Request handlers pass raw values through `bulk_values`, which
+        hashes on `hashing_pool` instead.
+        """
         self.password = get_password_hash(password)
 
     def check_password(self, password: str) -> bool:
         return verify_password(password, self.password)
 
+    @classmethod
+    async def bulk_values(cls, values):
+        password = values.get("password")
+        if isinstance(password, str):
+            password = await get_password_hash_async(password)
+            values = {**values, "password": password}
+        return values
+
     def __setattr__(self, name, value):
         if name == "password" and isinstance(value, str):
             self.set_password(value)
@@ -123,8 +157,13 @@ class User(Base, SoftDeleteMixin):
 
 
 class Post(Base, SoftDeleteMixin):
+    # full-text index, see fastbg.search
+    __searchable__ = ("title", "content")
+
     title = Column(String(200), nullable=False, unique=True)
     content = Column(Text(10000), nullable=False)
+    # maintained by triggers, see fastbg.counters
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     author_id = Column(Integer, ForeignKey("user.id"), nullable=False)
     author = relationship("User", back_populates="posts")
@@ -136,7 +175,10 @@ class Post(Base, SoftDeleteMixin):
 
 
 class Comment(Base, SoftDeleteMixin):
+    __searchable__ = ("content",)
+
     content = Column(Text, nullable=False)
+    reply_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     author_id = Column(Integer, ForeignKey("user.id"), nullable=False)
     author = relationship("User", back_populates="comments")
@@ -154,16 +196,128 @@ class Comment(Base, SoftDeleteMixin):
     )
 
 
+# children of a comment within a post, see fastbg.thread
+Index(
+    "ix_comment_post_id_parent_comment_id",
+    Comment.post_id,
+    Comment.parent_comment_id,
+)
+
+
 # no need to include soft-delete bloat in tags
 class Tag(Base):
     name = Column(String(50), unique=True, nullable=False)
     description = Column(String(200), nullable=True)
+    post_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     posts = relationship("Post", secondary=PostTags.__table__, back_populates="tags")
 
 
+def live_index(name: str, *columns, deleted: bool = False) -> Index:
+    """
+    Partial index over live (or soft-deleted) rows only: queries filtering
+    on the same flag are answered without looking at the other rows
+    """
+    table = columns[0].table
+    where = table.c.is_soft_deleted == deleted
+    return Index(name, *columns, sqlite_where=where, postgresql_where=where)
+
+
+# foreign keys: joins, relationship loads and delete cascades
+Index("ix_post_author_id", Post.author_id)
+Index("ix_comment_author_id", Comment.author_id)
+Index("ix_comment_parent_comment_id", Comment.parent_comment_id)
+Index("ix_post_tags_post_id_tag_id", PostTags.post_id, PostTags.tag_id)
+Index("ix_post_tags_tag_id_post_id", PostTags.tag_id, PostTags.post_id)
+
+# the /user/{id}/posts, /user/{id}/comments and /post/{id}/comments pages
+live_index("ix_post_author_id_live", Post.author_id, Post.id)
+live_index("ix_comment_author_id_live", Comment.author_id, Comment.id)
+live_index("ix_comment_post_id_live", Comment.post_id, Comment.id)
+
+# the /deleted/ pages
+for model in (User, Post, Comment):
+    live_index(f"ix_{model.__tablename__}_deleted", model.id, deleted=True)
+
+
+def _search_ddl():
+    """
+    FTS5 tables and triggers live outside the ORM metadata; create and
+    drop them along with the tables they index
+    """
+    for model in search.searchable_models(Base):
+        tablename = model.__tablename__
+        for statement in search.create_statements(tablename, model.__searchable__):
+            ddl = DDL(statement).execute_if(dialect="sqlite")
+            event.listen(model.__table__, "after_create", ddl)
+        for statement in search.drop_statements(tablename):
+            ddl = DDL(statement).execute_if(dialect="sqlite")
+            event.listen(model.__table__, "before_drop", ddl)
+
+
+_search_ddl()
+
+
+def _counter_ddl():
+    """
+    Counter triggers span several tables, so they are created once
+    every table exists
+    """
+    for counter in counters.COUNTERS:
+        for statement in counters.create_statements(counter):
+            # DDL() applies %-formatting, the strftime() format must survive it
+            ddl = DDL(statement.replace("%", "%%")).execute_if(dialect="sqlite")
+            event.listen(Base.metadata, "after_create", ddl)
+        for statement in counters.drop_statements(counter):
+            ddl = DDL(statement).execute_if(dialect="sqlite")
+            event.listen(Base.metadata, "before_drop", ddl)
+
+
+_counter_ddl()
+
+
+def sqlite_pragmas(engine, pragmas: dict = None):
+    """
+    Run `PRAGMA name = value` for each of `pragmas` (SQLITE_PRAGMAS by
+    default) on every new connection of a sync or async `engine`
+    """
+    engine = getattr(engine, "sync_engine", engine)
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = settings.SQLITE_PRAGMAS if pragmas is None else pragmas
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+    event.listen(engine, "connect", set_pragmas)
+
+
+def sqlite_transactions(engine):
+    """
+    Let SQLAlchemy emit BEGIN itself. pysqlite only begins a transaction
+    before DML, so a SAVEPOINT opened first starts one of its own and
+    its RELEASE commits; with this, savepoints nest in the transaction
+    """
+    engine = getattr(engine, "sync_engine", engine)
+    if engine.dialect.name != "sqlite":
+        return
+
+    def no_implicit_begin(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    def begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+    event.listen(engine, "connect", no_implicit_begin)
+    event.listen(engine, "begin", begin)
+
+
 async def create_db(name=settings.DATABASES["default"]["engine"]):
     engine = create_async_engine(name)
+    sqlite_pragmas(engine)
     await drop_db(name)
 
     async with engine.begin() as conn:
@@ -184,6 +338,7 @@ async def drop_db(name=settings.DATABASES["default"]["engine"]):
 
 def create_db_sync(name=settings.DATABASES["default"]["engine"]):
     engine = create_engine(name)
+    sqlite_pragmas(engine)
     drop_db_sync(name)
 
     Base.metadata.create_all(engine)
@@ -0,0 +1,121 @@
+"""
+HTTP validators (ETag / Last-Modified) derived from TsMixin.updated_at
+"""
+import hashlib
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import false, or_
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _micros(updated_at: Optional[datetime]) -> int:
+    if updated_at is None:
+        return 0
+    return (updated_at - EPOCH) // timedelta(microseconds=1)
+
+
+def item_etag(item_id: int, updated_at: Optional[datetime]) -> str:
+    """
+    Strong ETag for a single row. It encodes the row version so
+    `If-Match` can be checked inside the WHERE clause of the write.
+    """
+    return f'"{item_id}-{_micros(updated_at):x}"'
+
+
+def parse_item_etag(etag: str) -> Optional[Tuple[int, Optional[datetime]]]:
+    etag = etag.strip()
+    if etag.startswith("W/") or len(etag) < 2:
+        return None
+    try:
+        item_id, micros = etag.strip('"').split("-")
+        item_id, micros = int(item_id), int(micros, 16)
+    except ValueError:
+        return None
+    if micros == 0:
+        return item_id, None
+    return item_id, EPOCH + timedelta(microseconds=micros)
+
+
+def page_etag(rows: Iterable[Tuple[int, Optional[datetime]]], has_more: bool) -> str:
+    """
+    Weak ETag for a list page built from (id, updated_at) pairs only
+    """
+    digest = hashlib.sha1()
+    for item_id, updated_at in rows:
+        digest.update(f"{item_id}-{_micros(updated_at):x};".encode("ascii"))
+    digest.update(b"+" if has_more else b"$")
+    return f'W/"{digest.hexdigest()}"'
+
+
+def http_date(dt: datetime) -> str:
+    # timestamps are stored as naive UTC
+    return format_datetime(dt.replace(tzinfo=timezone.utc), usegmt=True)
+
+
+def item_validators(item_id: int, updated_at: Optional[datetime]) -> Dict[str, str]:
+    headers = {"ETag": item_etag(item_id, updated_at)}
+    if updated_at is not None:
+        headers["Last-Modified"] = http_date(updated_at)
+    return headers
+
+
+def _opaque(etag: str) -> str:
+    etag = etag.strip()
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """
+    Weak comparison, as used by If-None-Match
+    """
+    if header.strip() == "*":
+        return True
+    return _opaque(etag) in {_opaque(candidate) for candidate in header.split(",")}
+
+
+def not_modified(
+    headers: Dict[str, str],
+    if_none_match: Optional[str],
+    if_modified_since: Optional[str],
+) -> bool:
+    """
+    Evaluate conditional GET headers against the validators in `headers`.
+    If-None-Match takes precedence over If-Modified-Since.
+    """
+    if if_none_match is not None:
+        return etag_matches(if_none_match, headers["ETag"])
+
+    if if_modified_since is not None and "Last-Modified" in headers:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        last_modified = parsedate_to_datetime(headers["Last-Modified"])
+        return last_modified <= since
+    return False
+
+
+def if_match_clause(model, item_id: int, if_match: str):
+    """
+    Turn an If-Match header into a predicate on `updated_at` so the
+    precondition is evaluated by the same statement that loads the row
+    """
+    if if_match.strip() == "*":
+        return None
+
+    clauses = []
+    for candidate in if_match.split(","):
+        parsed = parse_item_etag(candidate)
+        if parsed is None or parsed[0] != item_id:
+            continue
+        updated_at = parsed[1]
+        if updated_at is None:
+            clauses.append(model.updated_at.is_(None))
+        else:
+            clauses.append(model.updated_at == updated_at)
+    if not clauses:
+        return false()
+    return or_(*clauses)
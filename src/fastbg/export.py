@@ -0,0 +1,55 @@
+"""
+Streaming exports of whole tables as NDJSON or CSV.
+Rows are fetched in batches through a server-side cursor, so memory
+does not grow with the size of the table.
+"""
+import csv
+import io
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+
+from pydantic_core import to_json
+
+from fastbg.conf import settings
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def naive_utc(dt: Optional[datetime]) -> Optional[datetime]:
+    # timestamps are stored as naive UTC
+    if dt is None or dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _csv_lines(rows) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(
+            value.isoformat() if isinstance(value, datetime) else value for value in row
+        )
+    return buffer.getvalue()
+
+
+async def stream_rows(
+    Session, stmt, fields: tuple, fmt: str = "ndjson"
+) -> AsyncIterator[bytes]:
+    """
+    Execute the column select `stmt` in its own session (the request one
+    is closed before the body is sent) and yield one chunk per batch
+    """
+    batch_size = settings.EXPORT_BATCH_SIZE
+    if fmt == "csv":
+        yield _csv_lines([fields]).encode("utf-8")
+
+    async with Session() as db:
+        result = await db.stream(stmt.execution_options(yield_per=batch_size))
+        async for rows in result.partitions():
+            if fmt == "csv":
+                yield _csv_lines(rows).encode("utf-8")
+            else:
+                yield b"".join(to_json(dict(zip(fields, row))) + b"\n" for row in rows)
@@ -5,6 +5,39 @@ from fastbg.db import create_db
 from fastbg.conf import settings
 
 
+async def rebuild_search():
+    from fastbg.api import Session
+    from fastbg.db import Base
+    from fastbg import search
+
+    async with Session() as db:
+        for tablename in await search.rebuild(db, Base):
+            print(f"INFO - Rebuilt search index of {tablename}")
+
+
+async def repair_counters(batch_size: int = 1000):
+    from fastbg.api import Session
+    from fastbg import counters
+
+    fixed = await counters.repair(Session, batch_size)
+    for name, count in fixed.items():
+        print(f"INFO - Fixed {count} rows of {name}")
+
+
+async def check_counters() -> bool:
+    from fastbg.api import ReadSession
+    from fastbg import counters
+
+    async with ReadSession() as db:
+        wrong = await counters.check(db)
+    for name, ids in wrong.items():
+        if ids:
+            print(f"ERROR - {name} is wrong for {len(ids)} rows: {ids[:20]}")
+        else:
+            print(f"INFO - {name} is consistent")
+    return not any(wrong.values())
+
+
 def get_command(command: list = sys.argv[1]):
     """Macros to maange the db"""
     if command == "shell":
@@ -16,9 +49,50 @@ def get_command(command: list = sys.argv[1]):
         asyncio.run(create_db(settings.DATABASES["default"]["engine"]))
 
     elif command == "test":
-        from fastbg.test import test_db
+        import subprocess
+        import tempfile
+
+        # a fresh interpreter, this one loaded the settings already
+        env = {
+            **os.environ,
+            "TEST_DIR": tempfile.mkdtemp(),
+            "FASTBG_SETTINGS_MODULE": "fastbg.conf.test",
+        }
+        src = settings.BASE_DIR.parent
+        sys.exit(
+            subprocess.call(
+                [sys.executable, "-m", "unittest", "discover", "-s", "fastbg/test"],
+                cwd=src,
+                env=env,
+            )
+        )
+
+    elif command == "rebuild_search":
+        import asyncio
+
+        asyncio.run(rebuild_search())
+
+    elif command == "repair_counters":
+        import asyncio
+
+        # ./fastbg repair_counters [batch_size]
+        batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+        asyncio.run(repair_counters(batch_size))
+
+    elif command == "check_counters":
+        import asyncio
+
+        if not asyncio.run(check_counters()):
+            sys.exit(1)
+
+    elif command == "seed":
+        from fastbg import seed
 
-        test_db.run()
+        # ./fastbg seed [--users N] [--comments N] [--tag-skew S] ... (see --help)
+        options = seed.parse_args(sys.argv[2:])
+        counts = seed.seed(settings.DATABASES["default"]["sync_engine"], options)
+        for tablename, count in counts.items():
+            print(f"INFO - Inserted {count} rows into {tablename}")
 
     elif command == "runserver":
         os.system(
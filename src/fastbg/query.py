@@ -1,4 +1,22 @@
-from sqlalchemy import select
+import base64
+import json
+import operator
+from datetime import datetime
+from functools import lru_cache
+from typing import Container, Iterable, List, Set, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import select, tuple_, and_, DateTime, String, UniqueConstraint
+from sqlalchemy.orm import joinedload, load_only, selectinload
+
+
+def live_filter(model) -> tuple:
+    """
+    WHERE clauses selecting rows that are not soft-deleted
+    """
+    if hasattr(model, "is_soft_deleted"):
+        return (model.is_soft_deleted == False,)
+    return ()
 
 
 def base_query(model):
@@ -11,3 +29,210 @@ def query_deleted(model):
     if hasattr(model, "is_soft_deleted"):
         return select(model).where(model.is_soft_deleted == True)
     return select(model)
+
+
+def as_columns(stmt, model, names=None):
+    """
+    Turn a select of `model` into a Core select of its columns: rows come
+    back as plain tuples, without ORM instances or identity map bookkeeping
+    """
+    columns = model.__table__.columns
+    names = names or columns.keys()
+    return stmt.with_only_columns(*(columns[name] for name in dict.fromkeys(names)))
+
+
+# keyset pagination
+def encode_cursor(value, item_id: int) -> str:
+    """
+    Opaque token for the last row of a page. Only the (sort_key, id)
+    pair is stored; clients should not rely on its format.
+    """
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, item_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, column) -> tuple:
+    """
+    Inverse of `encode_cursor`. Raises ValueError for malformed tokens.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, item_id = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+    if not isinstance(item_id, int):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    if value is not None and isinstance(column.type, DateTime):
+        value = datetime.fromisoformat(value)
+    return value, item_id
+
+
+def seek(
+    stmt,
+    model,
+    cursor: str = None,
+    limit: int = 10,
+    sort_key: str = "id",
+    descending: bool = False,
+):
+    """
+    Apply keyset pagination on (sort_key, id) to `stmt`.
+    One extra row is fetched so the caller knows if there is a next page.
+    """
+    column = getattr(model, sort_key)
+    after = operator.lt if descending else operator.gt
+    if cursor is not None:
+        value, item_id = decode_cursor(cursor, column)
+        if sort_key == "id":
+            stmt = stmt.where(after(model.id, item_id))
+        else:
+            stmt = stmt.where(after(tuple_(column, model.id), tuple_(value, item_id)))
+
+    order = (model.id,) if sort_key == "id" else (column, model.id)
+    if descending:
+        order = tuple(column.desc() for column in order)
+    return stmt.order_by(*order).limit(limit + 1)
+
+
+# filtering
+FILTER_OPERATORS = {
+    "eq": operator.eq,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "gt": operator.gt,
+    "gte": operator.ge,
+}
+
+
+def indexed_columns(model) -> Set[str]:
+    """
+    Columns leading an index (or the primary key), i.e. the ones a
+    predicate or ORDER BY can use without scanning the table
+    """
+    table = model.__table__
+    names = {column.name for column in table.primary_key.columns}
+    for index in table.indexes:
+        names.add(list(index.columns)[0].name)
+    for constraint in table.constraints:
+        if isinstance(constraint, UniqueConstraint) and constraint.columns:
+            names.add(list(constraint.columns)[0].name)
+    return names
+
+
+@lru_cache(maxsize=None)
+def _adapter(python_type: type) -> TypeAdapter:
+    return TypeAdapter(python_type)
+
+
+def _python_type(column) -> type:
+    column_type = getattr(column.type, "impl", column.type)
+    return column_type.python_type
+
+
+def prefix_range(column, prefix: str):
+    """
+    `column LIKE 'prefix%'` as a range, which any index on `column` can
+    serve (SQLite only uses an index for LIKE on NOCASE columns)
+    """
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(column >= prefix, column < upper)
+
+
+def parse_filters(
+    model, params: Iterable[Tuple[str, str]], allowed: Container[str]
+) -> List:
+    """
+    Compile `field=value` / `field__op=value` pairs into WHERE clauses.
+    Operators are those in FILTER_OPERATORS plus "in" (comma separated)
+    and "prefix" (strings). Raises ValueError for anything else.
+    """
+    clauses = []
+    for key, raw in params:
+        name, _, op = key.partition("__")
+        op = op or "eq"
+        if name not in allowed:
+            raise ValueError(f"Filtering on {name} is not allowed")
+        column = model.__table__.columns[name]
+        adapter = _adapter(_python_type(column))
+        try:
+            if op == "in":
+                values = [adapter.validate_python(v) for v in raw.split(",")]
+                clauses.append(column.in_(values))
+            elif op == "prefix":
+                if not isinstance(column.type, String):
+                    raise ValueError(f"{name} is not a string")
+                if raw:
+                    clauses.append(prefix_range(column, raw))
+            elif op in FILTER_OPERATORS:
+                clauses.append(
+                    FILTER_OPERATORS[op](column, adapter.validate_python(raw))
+                )
+            else:
+                raise ValueError(f"Unknown filter operator: {op}")
+        except ValidationError:
+            raise ValueError(f"Invalid value for {key}: {raw}")
+    return clauses
+
+
+def parse_sort(sort: str) -> Tuple[str, bool]:
+    """
+    "-created_at" -> ("created_at", True)
+    """
+    if sort.startswith("-"):
+        return sort[1:], True
+    return sort, False
+
+
+# relationship expansion
+def parse_expand(model, expand: str, max_depth: int) -> dict:
+    """
+    Turn "author,comments.author" into {"author": {}, "comments": {"author": {}}}.
+    Raises ValueError for unknown relationships or paths deeper than `max_depth`.
+    """
+    tree = {}
+    for path in filter(None, (part.strip() for part in expand.split(","))):
+        names = path.split(".")
+        if len(names) > max_depth:
+            raise ValueError(f"{path} is deeper than {max_depth} levels")
+
+        current, node = model, tree
+        for name in names:
+            relationships = current.__mapper__.relationships
+            if name not in relationships:
+                raise ValueError(f"{current.__name__} has no relationship {name}")
+            current = relationships[name].mapper.class_
+            node = node.setdefault(name, {})
+    return tree
+
+
+def expand_options(model, tree: dict) -> list:
+    """
+    Eager loaders for `tree`: joinedload for many-to-one, selectinload for
+    collections. Soft-deleted related rows are filtered out.
+    """
+    options = []
+    for name, subtree in tree.items():
+        attr = getattr(model, name)
+        relationship = attr.property
+        target = relationship.mapper.class_
+        criteria = live_filter(target)
+        if criteria:
+            attr = attr.and_(*criteria)
+
+        loader = selectinload(attr) if relationship.uselist else joinedload(attr)
+        children = expand_options(target, subtree)
+        if children:
+            loader = loader.options(*children)
+        options.append(loader)
+    return options
+
+
+def load_columns(model, names):
+    """
+    Restrict the SELECT of `model` to the columns in `names` (plus the
+    primary key, which the ORM always loads)
+    """
+    return load_only(*(getattr(model, name) for name in dict.fromkeys(names)))
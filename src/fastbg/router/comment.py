@@ -1,4 +1,10 @@
 from fastbg.router.core import make_crud_router
 from fastbg.db import Comment
 
-router = make_crud_router(Comment)
+router = make_crud_router(
+    Comment,
+    export=True,
+    filterable=["id", "author_id", "post_id", "parent_comment_id", "updated_at"],
+    sortable=["updated_at"],
+    search=True,
+)
@@ -1,18 +1,89 @@
 import logging
-from functools import wraps
+from datetime import datetime, timedelta
+from functools import lru_cache, wraps
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter, ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import List, Type, Optional, Set, Dict
+from typing import Annotated, Any, Collection, List, Literal, Type, Optional, Set, Dict
 
-from fastbg.api import get_db, get_current_user
-from fastbg.schema import sqlalchemy_to_pydantic
-from fastbg.query import base_query, query_deleted
+from fastbg.api import ReadSession, get_read_db, get_current_user, writer
+from fastbg.conf import settings
+from fastbg.schema import (
+    sqlalchemy_to_pydantic,
+    page_schema,
+    delta_schema,
+    expanded_schema,
+    subset_schema,
+    register_schema,
+    BulkResult,
+)
+from fastbg.query import (
+    base_query,
+    query_deleted,
+    live_filter,
+    seek,
+    encode_cursor,
+    as_columns,
+    parse_expand,
+    expand_options,
+    load_columns,
+    indexed_columns,
+    parse_filters,
+    parse_sort,
+)
 from fastbg.db import User
+from fastbg.auth.authorization import BaseAuthorizer
+from fastbg.cache import (
+    CacheBackend,
+    cache_key,
+    generation,
+    get_cache,
+    register_cache,
+    invalidate,
+)
+from fastbg.counters import (
+    counter_columns,
+    dependent_tables,
+    parents,
+    watched_columns,
+)
+from fastbg.etag import (
+    item_validators,
+    page_etag,
+    etag_matches,
+    not_modified,
+    if_match_clause,
+)
+from fastbg.serializer import (
+    Serializer,
+    field_names,
+    json_response,
+    render_list,
+    render_page,
+)
+from fastbg.export import MEDIA_TYPES, naive_utc, stream_rows
+from fastbg.search import search as text_search
+from fastbg import bulk, writes
 
 log = logging.getLogger("global")
 
+PageSize = Annotated[int, Query(ge=1, le=settings.MAX_PAGE_SIZE)]
+BulkItems = Annotated[List[Dict[str, Any]], Body(max_length=settings.MAX_BULK_SIZE)]
+BulkIds = Annotated[List[int], Body(max_length=settings.MAX_BULK_SIZE)]
+
 
 class CrudEndpoint:
     LIST = "list"
@@ -22,6 +93,302 @@ class CrudEndpoint:
     DELETE = "delete"
     RESTORE = "restore"
     LIST_DELETED = "list_deleted"
+    CHANGES = "changes"
+    BULK_CREATE = "bulk_create"
+    BULK_UPDATE = "bulk_update"
+    BULK_DELETE = "bulk_delete"
+
+
+class Pagination:
+    CURSOR = "cursor"
+    # legacy: deep pages get slower and shift under concurrent inserts
+    OFFSET = "offset"
+
+
+# query parameters of the list endpoints that are not filters
+LIST_PARAMS = {"cursor", "page", "page_size", "expand", "fields", "sort"}
+
+
+class ReadMode:
+    # list endpoints load ORM instances
+    ORM = "orm"
+    # list endpoints select plain column rows; `?expand=` still uses the ORM
+    CORE = "core"
+
+
+async def paginate(
+    db: AsyncSession,
+    stmt,
+    model: Type,
+    cursor: Optional[str] = None,
+    page_size: int = settings.DEFAULT_PAGE_SIZE,
+    sort_key: str = "id",
+    response: Response = None,
+    if_none_match: Optional[str] = None,
+    options: tuple = (),
+    orm: bool = True,
+    descending: bool = False,
+):
+    """
+    Execute `stmt` seeking on (sort_key, id) and return a page envelope.
+    If `response` is given the page ETag is attached to it; a matching
+    `if_none_match` is answered with a 304 after loading only (id, updated_at).
+    `options` (eager loaders, column projections) only apply to the full query.
+    `orm=False` is for column selects, whose rows are returned as they are.
+    """
+    try:
+        stmt = seek(stmt, model, cursor, page_size, sort_key, descending)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if if_none_match is not None:
+        result = await db.execute(stmt.with_only_columns(model.id, model.updated_at))
+        rows = result.all()
+        etag = page_etag(rows[:page_size], len(rows) > page_size)
+        if etag_matches(if_none_match, etag):
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+            )
+
+    result = await db.execute(stmt.options(*options))
+    items = result.scalars().all() if orm else result.all()
+
+    next_cursor = None
+    has_more = len(items) > page_size
+    if has_more:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, sort_key), last.id)
+
+    if response is not None:
+        rows = [(item.id, item.updated_at) for item in items]
+        response.headers["ETag"] = page_etag(rows, has_more)
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def expansion(model: Type, expand: Optional[str]) -> Optional[dict]:
+    """
+    Parse `?expand=`; None when nothing is expanded
+    """
+    if not expand:
+        return None
+    try:
+        return parse_expand(model, expand, settings.MAX_EXPAND_DEPTH) or None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def sparse_fields(model: Type, schema: Type, fields: Optional[str]) -> Optional[tuple]:
+    """
+    Parse `?fields=` against the columns exposed by `schema`;
+    None when every field is requested
+    """
+    if not fields:
+        return None
+    names = tuple(dict.fromkeys(filter(None, map(str.strip, fields.split(",")))))
+    allowed = [name for name in schema.model_fields if name in model.__table__.columns]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. "
+            f"Allowed: {', '.join(allowed)}",
+        )
+    return names or None
+
+
+def read_options(
+    model: Type, tree: Optional[dict], names: Optional[tuple], *required: str
+) -> tuple:
+    """
+    Loader options for `?expand=` and `?fields=`. `required` columns are
+    loaded even if not requested (sort key, version for the ETag).
+    """
+    options = ()
+    if tree is not None:
+        options += tuple(expand_options(model, tree))
+    if names is not None:
+        options += (load_columns(model, (*names, *required)),)
+    return options
+
+
+def response_type(
+    model: Type, schema: Type, tree: Optional[dict], names: Optional[tuple]
+) -> Type:
+    if names is not None:
+        schema = subset_schema(schema, names)
+    if tree is not None:
+        schema = expanded_schema(model, tree, schema)
+    return schema
+
+
+@lru_cache(maxsize=256)
+def _adapter(tp) -> TypeAdapter:
+    return TypeAdapter(tp)
+
+
+def render(tp, data, response: Response = None) -> Response:
+    """
+    Serialize `data` with a type chosen per request, bypassing the
+    route's `response_model`. Headers already set on `response` are kept.
+    """
+    adapter = _adapter(tp)
+    body = adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+    return json_response(body, response)
+
+
+def item_filter(model: Type, item_id: int, if_match: Optional[str] = None) -> tuple:
+    """
+    WHERE clauses for a live row, including an If-Match precondition so it
+    is evaluated by the same statement that reads or writes the row
+    """
+    clauses = (model.id == item_id, *live_filter(model))
+    if if_match is not None:
+        clause = if_match_clause(model, item_id, if_match)
+        if clause is not None:
+            clauses += (clause,)
+    return clauses
+
+
+def item_not_found(if_match: Optional[str] = None) -> HTTPException:
+    # a stale version and a missing row look the same from `item_filter`;
+    # both are 412 when the client sent If-Match
+    if if_match is not None:
+        return HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Precondition failed",
+        )
+    return HTTPException(status_code=404, detail="Item not found")
+
+
+async def write_failed(
+    db: AsyncSession,
+    model: Type,
+    item_id: int,
+    if_match: Optional[str] = None,
+    user: User = None,
+    authorizer: BaseAuthorizer = None,
+) -> HTTPException:
+    """
+    Work out why a filtered write matched no row. Only runs on failure,
+    the successful path never pays for the extra query.
+    """
+    if authorizer is not None:
+        denied = await authorizer.denied(db, user, item_id)
+        if denied is not None:
+            return denied
+    return item_not_found(if_match)
+
+
+def authorized(authorizer: Optional[BaseAuthorizer], user: User) -> tuple:
+    if authorizer is None:
+        return ()
+    return authorizer.filter(user)
+
+
+async def soft_delete(
+    db: AsyncSession,
+    model: Type,
+    item_id: int,
+    if_match: Optional[str] = None,
+    user: User = None,
+    authorizer: BaseAuthorizer = None,
+):
+    db_item = await writes.update_item(
+        db,
+        model,
+        item_id,
+        {"is_soft_deleted": True, "soft_deleted_at": datetime.utcnow()},
+        *item_filter(model, item_id, if_match),
+        *authorized(authorizer, user),
+    )
+    if not db_item:
+        raise await write_failed(db, model, item_id, if_match, user, authorizer)
+
+
+async def hard_delete(
+    db: AsyncSession,
+    model: Type,
+    item_id: int,
+    if_match: Optional[str] = None,
+    user: User = None,
+    authorizer: BaseAuthorizer = None,
+):
+    where = (*item_filter(model, item_id, if_match), *authorized(authorizer, user))
+    if not writes.has_cascades(model):
+        if not await writes.delete_item(db, model, item_id, *where):
+            raise await write_failed(db, model, item_id, if_match, user, authorizer)
+        return
+
+    # the session has to load the row to apply relationship cascades
+    result = await db.execute(select(model).where(*where))
+    db_item = result.scalar_one_or_none()
+    if not db_item:
+        raise await write_failed(db, model, item_id, if_match, user, authorizer)
+    await db.delete(db_item)
+
+
+def bulk_result(rows, errors) -> dict:
+    return {
+        "items": [{"index": index, "id": item_id} for index, item_id in rows],
+        "errors": sorted(errors, key=lambda e: e["index"]),
+    }
+
+
+async def counter_parents(
+    db: AsyncSession, model: Type, item_ids: Collection[int], values: dict = None
+) -> Dict[str, Set[int]]:
+    """
+    Rows holding counters of the `model` rows `item_ids` (see
+    fastbg.counters). For an update (`values`) only if it can move the
+    rows to other parents: look them up before and after
+    """
+    tablename = model.__tablename__
+    if not item_ids or not dependent_tables(tablename):
+        return {}
+    if values is not None and not set(values) & set(watched_columns(tablename)):
+        return {}
+    return await parents(db, tablename, item_ids)
+
+
+async def cascaded_rows(
+    db: AsyncSession, model: Type, item_ids: Collection[int]
+) -> Dict[str, Set[int]]:
+    """
+    Rows a hard delete of the `model` rows `item_ids` removes through
+    the cascades and the rows holding their counters, looked up before
+    the delete
+    """
+    if not item_ids or not writes.has_cascades(model):
+        return {}
+    children = await writes.cascaded(db, model, item_ids)
+    models = mapped_models(model)
+    found = [children]
+    for tablename, child_ids in children.items():
+        found.append(await counter_parents(db, models[tablename], child_ids))
+    return merge_parents(*found)
+
+
+def mapped_models(model: Type) -> Dict[str, Type]:
+    return {mapper.local_table.name: mapper.class_ for mapper in model.registry.mappers}
+
+
+def forget_parents(model: Type, *found: Dict[str, Set[int]]):
+    """
+    Drop the cached rows found by `counter_parents` or `cascaded_rows`,
+    the write changed or removed them
+    """
+    models = mapped_models(model)
+    for tablename, item_ids in merge_parents(*found).items():
+        invalidate(models[tablename], *item_ids)
+
+
+def merge_parents(*found: Dict[str, Set[int]]) -> Dict[str, Set[int]]:
+    merged = {}
+    for parents_found in found:
+        for tablename, item_ids in parents_found.items():
+            merged.setdefault(tablename, set()).update(item_ids)
+    return merged
 
 
 def protected(func):
@@ -55,12 +422,98 @@ def make_crud_router(
     exclude_fields_create: List[str] = None,
     exclude_fields_update: List[str] = None,
     disabled: Dict[str, str] = None,
+    pagination: str = Pagination.CURSOR,
+    sort_key: str = "id",
+    cache: CacheBackend = None,
+    authorizer: BaseAuthorizer = None,
+    serializer: str = Serializer.PYDANTIC,
+    read_mode: str = ReadMode.ORM,
+    export: bool = False,
+    filterable: Collection[str] = (),
+    sortable: Collection[str] = (),
+    search: bool = False,
 ):
+    """
+    `authorizer` restricts updates and deletes (single and bulk) to the
+    rows it allows, e.g. `OwnerAuthorizer` for the author of a post.
+    `serializer=Serializer.FAST` dumps list pages without validating each
+    item; only use it when `schema` has no validators or aliases.
+    `read_mode=ReadMode.CORE` serves list endpoints from column rows
+    instead of ORM instances.
+    `export` adds `GET /export`, streaming every live row as NDJSON or CSV.
+    `filterable` and `sortable` columns can be used in list queries, e.g.
+    `?title__prefix=intro&sort=-updated_at`; they must be indexed.
+    `search` adds `GET /search?q=` over the model's `__searchable__` columns.
+    """
     enable_soft_delete = hasattr(model, "is_soft_deleted")
+    if pagination not in {Pagination.CURSOR, Pagination.OFFSET}:
+        raise ValueError(f"Unknown pagination mode: {pagination}")
+    if serializer not in {Serializer.PYDANTIC, Serializer.FAST}:
+        raise ValueError(f"Unknown serializer: {serializer}")
+    fast = serializer == Serializer.FAST
+    if read_mode not in {ReadMode.ORM, ReadMode.CORE}:
+        raise ValueError(f"Unknown read mode: {read_mode}")
+    core = read_mode == ReadMode.CORE
+    if sort_key not in model.__table__.columns:
+        raise ValueError(f"{model.__name__} has no column {sort_key}")
+    if search and not getattr(model, "__searchable__", None):
+        raise ValueError(f"{model.__name__} has no __searchable__ columns")
+    filterable, sortable = set(filterable), set(sortable)
+    indexed = indexed_columns(model)
+    for name in filterable | sortable:
+        if name not in model.__table__.columns:
+            raise ValueError(f"{model.__name__} has no column {name}")
+        if name not in indexed:
+            raise ValueError(
+                f"{model.__name__}.{name} is not indexed, "
+                "filtering or sorting on it would scan the table"
+            )
     exclude_fields = exclude_fields or []
     schema = schema or sqlalchemy_to_pydantic(model, exclude=exclude_fields)
+    # nested in other models' responses with ?expand=
+    register_schema(model, schema)
+    all_fields = field_names(schema)
+    # the columns `schema` exposes, e.g. not User.password
+    column_fields = tuple(
+        name for name in all_fields if name in model.__table__.columns
+    )
 
-    disabled = disabled or set()
+    def list_query(stmt, names: Optional[tuple], orm: bool, order_key: str = sort_key):
+        """
+        Apply the read mode to a list query of `model`
+        """
+        if orm:
+            return stmt
+        # cursors and ETags need these even if they are not returned
+        return as_columns(
+            stmt, model, (*(names or column_fields), order_key, "id", "updated_at")
+        )
+
+    def list_filters(request: Request) -> list:
+        params = [
+            (key, value)
+            for key, value in request.query_params.multi_items()
+            if key not in LIST_PARAMS
+        ]
+        # 422 like the query parameters FastAPI validates itself
+        try:
+            return parse_filters(model, params, filterable)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+    def list_order(sort: Optional[str]) -> tuple:
+        if not sort:
+            return sort_key, False
+        name, descending = parse_sort(sort)
+        if name != sort_key and name not in sortable:
+            raise HTTPException(
+                status_code=422, detail=f"Sorting on {name} is not allowed"
+            )
+        return name, descending
+
+    disabled = set(disabled or ())
+    # maintained by the database
+    counters = counter_columns(model.__tablename__)
 
     if create_schema is None:
         create_exclude = (exclude_fields_create or []) + [
@@ -70,6 +523,7 @@ def make_crud_router(
         ]
         if enable_soft_delete:
             create_exclude.extend(["is_soft_deleted", "soft_deleted_at"])
+        create_exclude.extend(counters)
         create_schema = sqlalchemy_to_pydantic(model, exclude=create_exclude)
 
     if update_schema is None:
@@ -80,28 +534,103 @@ def make_crud_router(
         ]
         if enable_soft_delete:
             update_exclude.extend(["is_soft_deleted", "soft_deleted_at"])
+        update_exclude.extend(counters)
         update_schema = sqlalchemy_to_pydantic(
             model, exclude=update_exclude, all_optional=True
         )
 
+    if cache is not None:
+        register_cache(model, cache)
+    cache = get_cache(model)
+
     prefix = prefix or f"/{model.__name__.lower()}"
 
     router = APIRouter(prefix=prefix)
 
     if not CrudEndpoint.LIST in disabled:
+        if pagination == Pagination.CURSOR:
 
-        @router.get("/", response_model=List[schema])
-        @protected
-        async def list_items(
-            page: Optional[int] = 0,
-            page_size: Optional[int] = 10,
-            db: AsyncSession = Depends(get_db),
-        ):
-            limit = page_size
-            offset = page * page_size
-            result = await db.execute(base_query(model).offset(offset).limit(limit))
-            items = result.scalars().all()
-            return items
+            @router.get("/", response_model=page_schema(schema))
+            @protected
+            async def list_items(
+                request: Request,
+                response: Response,
+                cursor: Optional[str] = None,
+                page_size: PageSize = settings.DEFAULT_PAGE_SIZE,
+                expand: Optional[str] = None,
+                fields: Optional[str] = None,
+                sort: Optional[str] = None,
+                if_none_match: Optional[str] = Header(None),
+                db: AsyncSession = Depends(get_read_db),
+            ):
+                tree = expansion(model, expand)
+                names = sparse_fields(model, schema, fields)
+                order_key, descending = list_order(sort)
+                # expanded pages carry no ETag: related rows can change
+                # without bumping `updated_at` of the parent
+                validated = tree is None
+                orm = not core or tree is not None
+                options = ()
+                if orm:
+                    options = read_options(model, tree, names, order_key, "updated_at")
+                stmt = base_query(model).where(*list_filters(request))
+                page = await paginate(
+                    db,
+                    list_query(stmt, names, orm, order_key),
+                    model,
+                    cursor,
+                    page_size,
+                    order_key,
+                    response=response if validated else None,
+                    if_none_match=if_none_match if validated else None,
+                    options=options,
+                    orm=orm,
+                    descending=descending,
+                )
+                if isinstance(page, Response):
+                    return page
+                if tree is None and fast:
+                    return render_page(page, names or all_fields, response)
+                if tree is None and names is None:
+                    return page
+                tp = page_schema(response_type(model, schema, tree, names))
+                return render(tp, page, response)
+
+        else:
+
+            @router.get("/", response_model=List[schema])
+            @protected
+            async def list_items(
+                request: Request,
+                page: Annotated[int, Query(ge=0)] = 0,
+                page_size: PageSize = settings.DEFAULT_PAGE_SIZE,
+                expand: Optional[str] = None,
+                fields: Optional[str] = None,
+                sort: Optional[str] = None,
+                db: AsyncSession = Depends(get_read_db),
+            ):
+                tree = expansion(model, expand)
+                names = sparse_fields(model, schema, fields)
+                order_key, descending = list_order(sort)
+                order = (model.id,)
+                if order_key != "id":
+                    order = (getattr(model, order_key), model.id)
+                if descending:
+                    order = tuple(column.desc() for column in order)
+                limit = page_size
+                offset = page * page_size
+                orm = not core or tree is not None
+                stmt = base_query(model).where(*list_filters(request))
+                stmt = list_query(stmt, names, orm, order_key).order_by(*order)
+                if orm:
+                    stmt = stmt.options(*read_options(model, tree, names))
+                result = await db.execute(stmt.offset(offset).limit(limit))
+                items = result.scalars().all() if orm else result.all()
+                if tree is None and fast:
+                    return render_list(items, names or all_fields)
+                if tree is None and names is None:
+                    return items
+                return render(List[response_type(model, schema, tree, names)], items)
 
     if not CrudEndpoint.CREATE in disabled:
 
@@ -109,28 +638,315 @@ def make_crud_router(
         @protected
         async def create_item(
             item: create_schema,
-            db: AsyncSession = Depends(get_db),
             user: "User" = Depends(get_current_user),
         ):
-            db_item = model(**item.dict())
-            db.add(db_item)
-            await db.commit()
-            await db.refresh(db_item)
+            # hashing and the like happen before queueing the write
+            values = await model.bulk_values(item.model_dump())
+
+            async def job(db):
+                db_item = await writes.insert_item(db, model, values)
+                return db_item, await counter_parents(db, model, [db_item.id])
+
+            db_item, found = await writer.submit(job)
+            invalidate(model, db_item.id)
+            forget_parents(model, found)
             return db_item
 
+    if export:
+
+        @router.get("/export")
+        @protected
+        async def export_items(
+            fmt: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+            fields: Optional[str] = None,
+            updated_since: Optional[datetime] = None,
+            user: "User" = Depends(get_current_user),
+        ):
+            names = sparse_fields(model, schema, fields) or column_fields
+            stmt = as_columns(base_query(model), model, names).order_by(model.id)
+            if updated_since is not None:
+                stmt = stmt.where(model.updated_at >= naive_utc(updated_since))
+            filename = f"{model.__tablename__}.{fmt}"
+            return StreamingResponse(
+                stream_rows(ReadSession, stmt, names, fmt),
+                media_type=MEDIA_TYPES[fmt],
+                headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+            )
+
+    if search:
+
+        @router.get("/search", response_model=page_schema(schema))
+        @protected
+        async def search_items(
+            q: Annotated[str, Query(min_length=1, max_length=256)],
+            cursor: Optional[str] = None,
+            page_size: PageSize = settings.DEFAULT_PAGE_SIZE,
+            db: AsyncSession = Depends(get_read_db),
+        ):
+            """
+            Full-text search, best matches first
+            """
+            try:
+                page = await text_search(db, model, q, cursor, page_size)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            if fast:
+                return render_page(page, all_fields)
+            return page
+
+    if not CrudEndpoint.CHANGES in disabled:
+
+        @router.get("/changes", response_model=delta_schema(schema))
+        @protected
+        async def list_changes(
+            since: Optional[datetime] = None,
+            watermark: Optional[str] = None,
+            page_size: PageSize = settings.DEFAULT_PAGE_SIZE,
+            db: AsyncSession = Depends(get_read_db),
+            user: "User" = Depends(get_current_user),
+        ):
+            """
+            Rows created, updated, soft deleted or restored after `watermark`
+            (or `since`), oldest first, up to CHANGES_SAFETY_MARGIN ago.
+            Soft-deleted rows are tombstones; hard deletes are not reported.
+            """
+            if watermark is None and since is not None:
+                # (since, 0) seeks to every row with updated_at >= since
+                watermark = encode_cursor(naive_utc(since), 0)
+
+            # rows are stamped before their transaction commits: the
+            # watermark stays behind the ones that may not be visible yet
+            horizon = datetime.utcnow() - timedelta(
+                seconds=settings.CHANGES_SAFETY_MARGIN
+            )
+            stmt = select(model).where(model.updated_at <= horizon)
+            page = await paginate(
+                db,
+                list_query(stmt, None, not core),
+                model,
+                watermark,
+                page_size,
+                "updated_at",
+                orm=not core,
+            )
+            items = page["items"]
+            if items:
+                watermark = encode_cursor(items[-1].updated_at, items[-1].id)
+            delta = {
+                "items": items,
+                "watermark": watermark,
+                "has_more": page["next_cursor"] is not None,
+            }
+            if fast:
+                return render_page(delta, all_fields)
+            return delta
+
+    # registered before the /{item_id} routes so "bulk" is not taken as an id
+    if not {CrudEndpoint.CREATE, CrudEndpoint.BULK_CREATE} & disabled:
+
+        @router.post("/bulk", response_model=BulkResult)
+        @protected
+        async def bulk_create_items(
+            items: BulkItems,
+            user: "User" = Depends(get_current_user),
+        ):
+            rows, errors = [], []
+            for index, raw in enumerate(items):
+                try:
+                    values = create_schema.model_validate(raw).model_dump()
+                except ValidationError as e:
+                    errors.append(bulk.validation_error(index, e))
+                    continue
+                rows.append((index, await model.bulk_values(values)))
+
+            async def job(db):
+                created = await bulk.bulk_insert(db, model, rows, errors)
+                ids = [item_id for _, item_id in created]
+                return created, await counter_parents(db, model, ids)
+
+            created, found = await writer.submit(job)
+            invalidate(model, *(item_id for _, item_id in created))
+            forget_parents(model, found)
+            return bulk_result(created, errors)
+
+    if not {CrudEndpoint.UPDATE, CrudEndpoint.BULK_UPDATE} & disabled:
+
+        @router.patch("/bulk", response_model=BulkResult)
+        @protected
+        async def bulk_update_items(
+            items: BulkItems,
+            user: "User" = Depends(get_current_user),
+        ):
+            rows, values, errors, seen = [], {}, [], set()
+            for index, raw in enumerate(items):
+                raw = dict(raw)
+                item_id = raw.pop("id", None)
+                if not isinstance(item_id, int) or isinstance(item_id, bool):
+                    errors.append(bulk.error(index, "An integer id is required"))
+                    continue
+                if item_id in seen:
+                    errors.append(bulk.error(index, "Duplicate id", item_id))
+                    continue
+                seen.add(item_id)
+
+                try:
+                    item = update_schema.model_validate(raw)
+                except ValidationError as e:
+                    errors.append(bulk.validation_error(index, e, item_id))
+                    continue
+                item = item.model_dump(exclude_unset=True)
+                if not item:
+                    errors.append(bulk.error(index, "No fields to update", item_id))
+                    continue
+                rows.append((index, item_id))
+                values[item_id] = await model.bulk_values(item)
+
+            where = authorized(authorizer, user)
+            # rows moving to other parents change the counters of both
+            watched = set(watched_columns(model.__tablename__))
+            moved = [item_id for item_id, item in values.items() if watched & set(item)]
+
+            async def job(db):
+                before = await counter_parents(db, model, moved)
+                updated = await bulk.bulk_update(db, model, rows, values, errors, where)
+                return updated, before, await counter_parents(db, model, moved)
+
+            updated, *found = await writer.submit(job)
+            invalidate(model, *(item_id for _, item_id in updated))
+            forget_parents(model, *found)
+            return bulk_result(updated, errors)
+
+    if not {CrudEndpoint.DELETE, CrudEndpoint.BULK_DELETE} & disabled:
+
+        async def bulk_remove(db, remove, rows, errors, where):
+            # looked up first, hard deleted rows are gone afterwards
+            item_ids = [item_id for _, item_id in rows]
+            found = await counter_parents(db, model, item_ids)
+            if remove is bulk.bulk_hard_delete:
+                found = merge_parents(found, await cascaded_rows(db, model, item_ids))
+            return await remove(db, model, rows, errors, where), found
+
+        if not enable_soft_delete:
+
+            @router.delete("/bulk", response_model=BulkResult)
+            @protected
+            async def bulk_delete_items(
+                ids: BulkIds,
+                user: "User" = Depends(get_current_user),
+            ):
+                rows, errors = bulk.unique_rows(ids)
+                where = authorized(authorizer, user)
+                deleted, found = await writer.submit(
+                    lambda db: bulk_remove(
+                        db, bulk.bulk_hard_delete, rows, errors, where
+                    )
+                )
+                invalidate(model, *(item_id for _, item_id in deleted))
+                forget_parents(model, found)
+                return bulk_result(deleted, errors)
+
+        else:
+
+            @router.delete("/bulk", response_model=BulkResult)
+            @protected
+            async def bulk_delete_items(
+                ids: BulkIds,
+                hard: Optional[bool] = False,
+                user: "User" = Depends(get_current_user),
+            ):
+                rows, errors = bulk.unique_rows(ids)
+                where = authorized(authorizer, user)
+                remove = bulk.bulk_hard_delete if hard else bulk.bulk_soft_delete
+                deleted, found = await writer.submit(
+                    lambda db: bulk_remove(db, remove, rows, errors, where)
+                )
+                invalidate(model, *(item_id for _, item_id in deleted))
+                forget_parents(model, found)
+                return bulk_result(deleted, errors)
+
     if not CrudEndpoint.GET in disabled:
 
         @router.get("/{item_id}", response_model=schema)
         @protected
         async def get_item(
             item_id: int,
-            db: AsyncSession = Depends(get_db),
+            response: Response,
+            expand: Optional[str] = None,
+            fields: Optional[str] = None,
+            if_none_match: Optional[str] = Header(None),
+            if_modified_since: Optional[str] = Header(None),
+            db: AsyncSession = Depends(get_read_db),
         ):
-            result = await db.execute(base_query(model).where(model.id == item_id))
+            tree = expansion(model, expand)
+            names = sparse_fields(model, schema, fields)
+            # before anything is read, see `generation`
+            seen = generation(model)
+            if tree is not None:
+                stmt = base_query(model).where(model.id == item_id)
+                result = await db.execute(
+                    stmt.options(*read_options(model, tree, names))
+                )
+                item = result.unique().scalar_one_or_none()
+                if not item:
+                    raise HTTPException(status_code=404, detail="Item not found")
+                return render(response_type(model, schema, tree, names), item)
+
+            conditional = if_none_match is not None or if_modified_since is not None
+
+            cached = None
+            if cache is not None:
+                cached = cache.get(cache_key(model, item_id))
+            if cached is not None:
+                updated_at = cached["updated_at"]
+                if updated_at is not None:
+                    updated_at = datetime.fromisoformat(updated_at)
+                validators = item_validators(item_id, updated_at)
+            elif conditional:
+                # only the version columns are needed to answer a 304
+                stmt = base_query(model).with_only_columns(model.id, model.updated_at)
+                result = await db.execute(stmt.where(model.id == item_id))
+                row = result.one_or_none()
+                if row is None:
+                    raise HTTPException(status_code=404, detail="Item not found")
+                validators = item_validators(*row)
+
+            if conditional and not_modified(
+                validators, if_none_match, if_modified_since
+            ):
+                return Response(
+                    status_code=status.HTTP_304_NOT_MODIFIED, headers=validators
+                )
+
+            if cached is not None:
+                response.headers.update(validators)
+                if names is not None:
+                    return render(
+                        subset_schema(schema, names), cached["data"], response
+                    )
+                return cached["data"]
+
+            stmt = base_query(model).where(model.id == item_id)
+            if names is not None:
+                # a partial row is not worth caching
+                stmt = stmt.options(*read_options(model, None, names, "updated_at"))
+            result = await db.execute(stmt)
             item = result.scalar_one_or_none()
             if not item:
                 raise HTTPException(status_code=404, detail="Item not found")
-            return item
+            response.headers.update(item_validators(item.id, item.updated_at))
+
+            if names is not None:
+                return render(subset_schema(schema, names), item, response)
+            if cache is None:
+                return item
+            data = schema.model_validate(item, from_attributes=True)
+            cached = {
+                "data": data.model_dump(mode="json"),
+                "updated_at": item.updated_at and item.updated_at.isoformat(),
+            }
+            if generation(model) == seen:
+                cache.set(cache_key(model, item_id), cached)
+            return cached["data"]
 
     if not CrudEndpoint.UPDATE in disabled:
 
@@ -139,38 +955,58 @@ def make_crud_router(
         async def update_item(
             item_id: int,
             item: update_schema,
-            db: AsyncSession = Depends(get_db),
+            response: Response,
+            if_match: Optional[str] = Header(None),
             user: "User" = Depends(get_current_user),
         ):
-            result = await db.execute(base_query(model).where(model.id == item_id))
-            db_item = result.scalar_one_or_none()
-            if not db_item:
-                raise HTTPException(status_code=404, detail="Item not found")
+            values = await model.bulk_values(item.model_dump(exclude_unset=True))
 
-            for field, value in item.dict(exclude_unset=True).items():
-                setattr(db_item, field, value)
+            async def job(db):
+                before = await counter_parents(db, model, [item_id], values)
+                db_item = await writes.update_item(
+                    db,
+                    model,
+                    item_id,
+                    values,
+                    *item_filter(model, item_id, if_match),
+                    *authorized(authorizer, user),
+                )
+                if not db_item:
+                    raise await write_failed(
+                        db, model, item_id, if_match, user, authorizer
+                    )
+                after = await counter_parents(db, model, [item_id], values)
+                return db_item, before, after
 
-            await db.commit()
-            await db.refresh(db_item)
+            db_item, *found = await writer.submit(job)
+            invalidate(model, item_id)
+            forget_parents(model, *found)
+            response.headers.update(item_validators(db_item.id, db_item.updated_at))
             return db_item
 
     if not CrudEndpoint.DELETE in disabled:
+
+        async def remove_item(db, remove, item_id, if_match, user):
+            found = await counter_parents(db, model, [item_id])
+            if remove is hard_delete:
+                found = merge_parents(found, await cascaded_rows(db, model, [item_id]))
+            await remove(db, model, item_id, if_match, user, authorizer)
+            return found
+
         if not enable_soft_delete:
 
             @router.delete("/{item_id}")
             @protected
             async def delete_item(
                 item_id: int,
-                db: AsyncSession = Depends(get_db),
+                if_match: Optional[str] = Header(None),
                 user: "User" = Depends(get_current_user),
             ):
-                result = await db.execute(base_query(model).where(model.id == item_id))
-                db_item = result.scalar_one_or_none()
-                if not db_item:
-                    raise HTTPException(status_code=404, detail="Item not found")
-
-                await db.delete(db_item)
-                await db.commit()
+                found = await writer.submit(
+                    lambda db: remove_item(db, hard_delete, item_id, if_match, user)
+                )
+                invalidate(model, item_id)
+                forget_parents(model, found)
                 return {"message": "Item deleted successfully"}
 
         else:
@@ -180,22 +1016,18 @@ def make_crud_router(
             async def delete_item(
                 item_id: int,
                 hard: Optional[bool] = False,
-                db: AsyncSession = Depends(get_db),
+                if_match: Optional[str] = Header(None),
                 user: "User" = Depends(get_current_user),
             ):
-                result = await db.execute(base_query(model).where(model.id == item_id))
-                db_item = result.scalar_one_or_none()
-                if not db_item:
-                    raise HTTPException(status_code=404, detail="Item not found")
-
+                remove = hard_delete if hard else soft_delete
+                found = await writer.submit(
+                    lambda db: remove_item(db, remove, item_id, if_match, user)
+                )
+                invalidate(model, item_id)
+                forget_parents(model, found)
                 if not hard:
-                    db_item.soft_delete()
-                    await db.commit()
                     return {"message": "Item soft deleted successfully"}
-                else:
-                    await db.delete(db_item)
-                    await db.commit()
-                    return {"message": "Item deleted successfully"}
+                return {"message": "Item deleted successfully"}
 
     # convenience endpoints
     if enable_soft_delete:
@@ -205,43 +1037,87 @@ def make_crud_router(
             @protected
             async def restore_item(
                 item_id: int,
-                db: AsyncSession = Depends(get_db),
                 user: "User" = Depends(get_current_user),
             ):
-                stmt = select(model).where(model.id == item_id)
-                result = await db.execute(stmt)
-                db_item = result.scalar_one_or_none()
-                if not db_item:
-                    raise HTTPException(status_code=404, detail="Item not found")
-
-                if not db_item.is_soft_deleted:
-                    raise HTTPException(
-                        status_code=400, detail="Item is not soft deleted"
+                async def job(db):
+                    db_item = await writes.update_item(
+                        db,
+                        model,
+                        item_id,
+                        {"is_soft_deleted": False, "soft_deleted_at": None},
+                        model.is_soft_deleted == True,
                     )
+                    if not db_item:
+                        # only the failure path needs to tell both cases apart
+                        result = await db.execute(
+                            select(model.id).where(model.id == item_id)
+                        )
+                        if result.scalar_one_or_none() is None:
+                            raise HTTPException(
+                                status_code=404, detail="Item not found"
+                            )
+                        raise HTTPException(
+                            status_code=400, detail="Item is not soft deleted"
+                        )
+                    return db_item, await counter_parents(db, model, [item_id])
 
-                db_item.restore()
-                await db.commit()
-                await db.refresh(db_item)
+                db_item, found = await writer.submit(job)
+                invalidate(model, item_id)
+                forget_parents(model, found)
                 return db_item
 
         if not CrudEndpoint.LIST_DELETED in disabled:
+            if pagination == Pagination.CURSOR:
 
-            @router.get(
-                "/deleted/",
-                response_model=List[schema],
-            )
-            @protected
-            async def list_deleted_items(
-                page: Optional[int] = 0,
-                page_size: Optional[int] = 10,
-                db: AsyncSession = Depends(get_db),
-                user: "User" = Depends(get_current_user),
-            ):
-                limit = page_size
-                offset = page * page_size
-                stmt = query_deleted(model).offset(offset).limit(limit)
-                result = await db.execute(stmt)
-                items = result.scalars().all()
-                return items
+                @router.get(
+                    "/deleted/",
+                    response_model=page_schema(schema),
+                )
+                @protected
+                async def list_deleted_items(
+                    response: Response,
+                    cursor: Optional[str] = None,
+                    page_size: PageSize = settings.DEFAULT_PAGE_SIZE,
+                    if_none_match: Optional[str] = Header(None),
+                    db: AsyncSession = Depends(get_read_db),
+                    user: "User" = Depends(get_current_user),
+                ):
+                    page = await paginate(
+                        db,
+                        list_query(query_deleted(model), None, not core),
+                        model,
+                        cursor,
+                        page_size,
+                        sort_key,
+                        response=response,
+                        if_none_match=if_none_match,
+                        orm=not core,
+                    )
+                    if fast and not isinstance(page, Response):
+                        return render_page(page, all_fields, response)
+                    return page
+
+            else:
+
+                @router.get(
+                    "/deleted/",
+                    response_model=List[schema],
+                )
+                @protected
+                async def list_deleted_items(
+                    page: Annotated[int, Query(ge=0)] = 0,
+                    page_size: PageSize = settings.DEFAULT_PAGE_SIZE,
+                    db: AsyncSession = Depends(get_read_db),
+                    user: "User" = Depends(get_current_user),
+                ):
+                    limit = page_size
+                    offset = page * page_size
+                    stmt = list_query(query_deleted(model), None, not core)
+                    stmt = stmt.order_by(model.id).offset(offset).limit(limit)
+                    result = await db.execute(stmt)
+                    items = result.all() if core else result.scalars().all()
+                    if fast:
+                        return render_list(items, all_fields)
+                    return items
 
     return router
@@ -1,21 +1,31 @@
-from typing import Optional, List
+from typing import Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from fastbg.router.core import make_crud_router, CrudEndpoint, protected
+from fastbg.router.core import (
+    make_crud_router,
+    protected,
+    paginate,
+    item_not_found,
+    PageSize,
+)
 from fastbg.db import Post, Tag, PostTags, Comment
-from fastbg.schema import sqlalchemy_to_pydantic
-from fastbg.auth.authorization import is_owner
-from fastbg.api import get_db, get_current_user
+from fastbg.schema import sqlalchemy_to_pydantic, page_schema, thread_schema
+from fastbg.auth.authorization import OwnerAuthorizer
+from fastbg.api import get_read_db
 from fastbg.query import base_query
+from fastbg.thread import fetch_thread
+from fastbg.conf import settings
 
-router = make_crud_router(Post, disabled={CrudEndpoint.UPDATE, CrudEndpoint.DELETE})
-
-update_schema = sqlalchemy_to_pydantic(
+# only the author may edit or delete a post
+router = make_crud_router(
     Post,
-    exclude=["id", "created_at", "updated_at", "is_soft_deleted", "soft_deleted_at"],
-    all_optional=True,
+    authorizer=OwnerAuthorizer(Post, owner_field="author_id"),
+    export=True,
+    filterable=["id", "title", "author_id", "updated_at"],
+    sortable=["title", "updated_at"],
+    search=True,
 )
 
 comment_schema = sqlalchemy_to_pydantic(
@@ -27,88 +37,54 @@ tag_schema = sqlalchemy_to_pydantic(
 )
 
 
-@router.put("/{item_id}", response_model=update_schema)
-@is_owner(Post, owner_field="author_id")
+@router.get("/{item_id}/comments", response_model=page_schema(comment_schema))
 @protected
-async def update_item(
+async def list_comments(
     item_id: int,
-    item: update_schema,
-    db: AsyncSession = Depends(get_db),
-    user: "User" = Depends(get_current_user),
+    cursor: Optional[str] = None,
+    page_size: PageSize = settings.DEFAULT_PAGE_SIZE,
+    db: AsyncSession = Depends(get_read_db),
 ):
-    result = await db.execute(base_query(Post).where(Post.id == item_id))
-    db_item = result.scalar_one_or_none()
-    if not db_item:
-        raise HTTPException(status_code=404, detail="Item not found")
-
-    for field, value in item.dict(exclude_unset=True).items():
-        setattr(db_item, field, value)
+    stmt = base_query(Comment).where(item_id == Comment.post_id)
+    return await paginate(db, stmt, Comment, cursor, page_size)
 
-    await db.commit()
-    await db.refresh(db_item)
-    return db_item
 
-
-@router.get("/{item_id}/comments", response_model=List[comment_schema])
+@router.get(
+    "/{item_id}/thread", response_model=page_schema(thread_schema(comment_schema))
+)
 @protected
-async def list_comments(
+async def get_thread(
     item_id: int,
-    page: Optional[int] = 0,
-    page_size: Optional[int] = 10,
-    db: AsyncSession = Depends(get_db),
+    cursor: Optional[str] = None,
+    page_size: PageSize = settings.DEFAULT_PAGE_SIZE,
+    depth: int = Query(settings.MAX_THREAD_DEPTH, ge=0, le=settings.MAX_THREAD_DEPTH),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    limit = page_size
-    offset = page * page_size
-    result = await db.execute(
-        base_query(Comment)
-        .where(item_id == Comment.author_id)
-        .offset(offset)
-        .limit(limit)
-    )
-    items = result.scalars().all()
-    return items
-
-
-@router.get("/{item_id}/tags", response_model=List[tag_schema])
+    """
+    Top-level comments with their replies nested `depth` levels deep.
+    Pages are over top-level comments; replies of a soft-deleted comment
+    are left out along with it.
+    """
+    post = await db.scalar(base_query(Post).where(Post.id == item_id))
+    if post is None:
+        raise item_not_found()
+    try:
+        return await fetch_thread(db, item_id, cursor, page_size, depth)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/{item_id}/tags", response_model=page_schema(tag_schema))
 @protected
 async def list_tags(
     item_id: int,
-    page: Optional[int] = 0,
-    page_size: Optional[int] = 10,
-    db: AsyncSession = Depends(get_db),
+    cursor: Optional[str] = None,
+    page_size: PageSize = settings.DEFAULT_PAGE_SIZE,
+    db: AsyncSession = Depends(get_read_db),
 ):
-    limit = page_size
-    offset = page * page_size
-    result = await db.execute(
+    stmt = (
         base_query(Tag)
         .join(PostTags, Tag.id == PostTags.tag_id)
         .where(item_id == PostTags.post_id)
-        .offset(offset)
-        .limit(limit)
     )
-    items = result.scalars().all()
-    return items
-
-
-@router.delete("/{item_id}")
-@is_owner(Post, owner_field="author_id")
-@protected
-async def delete_item(
-    item_id: int,
-    hard: Optional[bool] = False,
-    db: AsyncSession = Depends(get_db),
-    user: "User" = Depends(get_current_user),
-):
-    result = await db.execute(base_query(Post).where(Post.id == item_id))
-    db_item = result.scalar_one_or_none()
-    if not db_item:
-        raise HTTPException(status_code=404, detail="Item not found")
-
-    if not hard:
-        db_item.soft_delete()
-        await db.commit()
-        return {"message": "Item soft deleted successfully"}
-    else:
-        await db.delete(db_item)
-        await db.commit()
-        return {"message": "Item deleted successfully"}
+    return await paginate(db, stmt, Tag, cursor, page_size)
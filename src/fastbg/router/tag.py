@@ -1,4 +1,4 @@
 from fastbg.router.core import make_crud_router
 from fastbg.db import Tag
 
-router = make_crud_router(Tag)
+router = make_crud_router(Tag, filterable=["id", "name"], sortable=["name"])
@@ -6,15 +6,25 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel
 
-from fastbg.router.core import make_crud_router, CrudEndpoint, protected
+from fastbg.router.core import (
+    make_crud_router,
+    CrudEndpoint,
+    protected,
+    paginate,
+    PageSize,
+)
 from fastbg.db import User, Post, Comment
-from fastbg.api import get_db
+from fastbg.api import get_read_db, writer
 from fastbg.auth.security import (
     create_access_token,
+    verify_password_async,
     ACCESS_TOKEN_EXPIRE_MINUTES,
 )
 from fastbg.query import base_query
-from fastbg.schema import sqlalchemy_to_pydantic
+from fastbg.cache import invalidate
+from fastbg import writes
+from fastbg.conf import settings
+from fastbg.schema import sqlalchemy_to_pydantic, page_schema
 
 
 class Token(BaseModel):
@@ -23,7 +33,11 @@ class Token(BaseModel):
 
 
 router = make_crud_router(
-    User, exclude_fields=["password"], disabled={CrudEndpoint.CREATE}
+    User,
+    exclude_fields=["password"],
+    disabled={CrudEndpoint.CREATE},
+    filterable=["id", "name"],
+    sortable=["name"],
 )
 
 
@@ -40,65 +54,51 @@ comment_schema = sqlalchemy_to_pydantic(
     Comment,
 )
 
+
 # no auth
 @router.post("/", response_model=create_schema)
 @protected
-async def create_item(
-    item: create_schema,
-    db: AsyncSession = Depends(get_db),
-):
-    db_item = User(**item.dict())
-    db.add(db_item)
-    await db.commit()
-    await db.refresh(db_item)
+async def create_item(item: create_schema):
+    # hash the password before queueing the write
+    values = await User.bulk_values(item.model_dump())
+    db_item = await writer.submit(lambda db: writes.insert_item(db, User, values))
+    invalidate(User, db_item.id)
     return db_item
 
 
-@router.get("/{item_id}/posts", response_model=List[post_schema])
+@router.get("/{item_id}/posts", response_model=page_schema(post_schema))
 @protected
 async def list_posts(
     item_id: int,
-    page: Optional[int] = 0,
-    page_size: Optional[int] = 10,
-    db: AsyncSession = Depends(get_db),
+    cursor: Optional[str] = None,
+    page_size: PageSize = settings.DEFAULT_PAGE_SIZE,
+    db: AsyncSession = Depends(get_read_db),
 ):
-    limit = page_size
-    offset = page * page_size
-    result = await db.execute(
-        base_query(Post).where(item_id == Post.author_id).offset(offset).limit(limit)
-    )
-    items = result.scalars().all()
-    return items
+    stmt = base_query(Post).where(item_id == Post.author_id)
+    return await paginate(db, stmt, Post, cursor, page_size)
 
 
-@router.get("/{item_id}/comments", response_model=List[comment_schema])
+@router.get("/{item_id}/comments", response_model=page_schema(comment_schema))
 @protected
 async def list_comments(
     item_id: int,
-    page: Optional[int] = 0,
-    page_size: Optional[int] = 10,
-    db: AsyncSession = Depends(get_db),
+    cursor: Optional[str] = None,
+    page_size: PageSize = settings.DEFAULT_PAGE_SIZE,
+    db: AsyncSession = Depends(get_read_db),
 ):
-    limit = page_size
-    offset = page * page_size
-    result = await db.execute(
-        base_query(Comment)
-        .where(item_id == Comment.author_id)
-        .offset(offset)
-        .limit(limit)
-    )
-    items = result.scalars().all()
-    return items
+    stmt = base_query(Comment).where(item_id == Comment.author_id)
+    return await paginate(db, stmt, Comment, cursor, page_size)
 
 
 @router.post("/login", response_model=Token)
 async def login(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_read_db),
 ):
     result = await db.execute(base_query(User).where(User.name == form_data.username))
     user = result.scalar_one_or_none()
 
-    if not user or not user.check_password(form_data.password):
+    if not user or not await verify_password_async(form_data.password, user.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
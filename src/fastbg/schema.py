@@ -1,6 +1,7 @@
 # stolen from
 # https://github.com/tiangolo/pydantic-sqlalchemy/blob/master/pydantic_sqlalchemy/main.py
-from typing import Type, Container, Optional
+from typing import Any, Dict, Type, Container, Optional, List
+from functools import lru_cache
 import re
 
 from pydantic import BaseModel, create_model, Field
@@ -86,3 +87,125 @@ def sqlalchemy_to_pydantic(
     )
 
     return pydantic_model
+
+
+# public response schema of each model, used when it is nested in another
+_response_schemas: Dict[Type, Type[BaseModel]] = {}
+
+
+def register_schema(db_model: Type, schema: Type[BaseModel]):
+    _response_schemas[db_model] = schema
+
+
+def response_schema(db_model: Type) -> Type[BaseModel]:
+    # no fallback to every column: that would expose e.g. User.password
+    if db_model not in _response_schemas:
+        raise ValueError(f"{db_model.__name__} has no registered response schema")
+    return _response_schemas[db_model]
+
+
+def _freeze(tree: dict) -> tuple:
+    return tuple(sorted((name, _freeze(subtree)) for name, subtree in tree.items()))
+
+
+def expanded_schema(
+    db_model: Type, tree: dict, base: Type[BaseModel] = None
+) -> Type[BaseModel]:
+    """
+    Response schema of `db_model` (or `base`) with the relationships in
+    `tree` (see `fastbg.query.parse_expand`) nested in it
+    """
+    return _expanded_schema(db_model, _freeze(tree), base)
+
+
+@lru_cache(maxsize=256)
+def _expanded_schema(
+    db_model: Type, tree: tuple, base: Type[BaseModel] = None
+) -> Type[BaseModel]:
+    base = base or response_schema(db_model)
+    if not tree:
+        return base
+
+    relationships = inspect(db_model).relationships
+    fields = {}
+    for name, subtree in tree:
+        relationship = relationships[name]
+        nested = _expanded_schema(relationship.mapper.class_, subtree)
+        if relationship.uselist:
+            fields[name] = (List[nested], [])
+        else:
+            fields[name] = (Optional[nested], None)
+
+    suffix = "".join(name.title() for name, _ in tree)
+    return create_model(f"{base.__name__}With{suffix}", __base__=base, **fields)
+
+
+@lru_cache(maxsize=256)
+def subset_schema(schema: Type[BaseModel], fields: tuple) -> Type[BaseModel]:
+    """
+    Copy of `schema` with only `fields`, for sparse fieldsets
+    """
+    return create_model(
+        f"{schema.__name__}Only{''.join(name.title() for name in fields)}",
+        **{
+            name: (schema.model_fields[name].annotation, schema.model_fields[name])
+            for name in fields
+        },
+    )
+
+
+@lru_cache(maxsize=None)
+def page_schema(schema: Type[BaseModel]) -> Type[BaseModel]:
+    """
+    Wrap `schema` in a cursor-paginated envelope
+    """
+    return create_model(
+        f"{schema.__name__}Page",
+        items=(List[schema], ...),
+        next_cursor=(Optional[str], None),
+    )
+
+
+@lru_cache(maxsize=None)
+def delta_schema(schema: Type[BaseModel]) -> Type[BaseModel]:
+    """
+    Rows changed after a watermark, soft-deleted ones included.
+    `watermark` resumes the sync, even when `has_more` is false.
+    """
+    return create_model(
+        f"{schema.__name__}Delta",
+        items=(List[schema], ...),
+        watermark=(Optional[str], None),
+        has_more=(bool, False),
+    )
+
+
+@lru_cache(maxsize=None)
+def thread_schema(schema: Type[BaseModel]) -> Type[BaseModel]:
+    """
+    `schema` with its replies nested, recursively
+    """
+    name = f"{schema.__name__}Thread"
+    thread = create_model(name, __base__=schema, replies=(List[name], []))
+    thread.model_rebuild()
+    return thread
+
+
+class BulkItemResult(BaseModel):
+    index: int
+    id: int
+
+
+class BulkItemError(BaseModel):
+    index: int
+    id: Optional[int] = None
+    detail: Any
+
+
+class BulkResult(BaseModel):
+    """
+    Outcome of a bulk operation. `index` refers to the position in the request
+    """
+
+    items: List[BulkItemResult]
+    errors: List[BulkItemError]
@@ -0,0 +1,126 @@
+"""
+Full-text search with SQLite FTS5.
+Models listing columns in `__searchable__` get an external-content
+`<table>_fts` index (the text is not stored twice) kept in sync by
+triggers on the base table.
+"""
+from typing import List, Sequence
+
+from sqlalchemy import column, func, literal_column, select, table, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fastbg.query import decode_cursor, encode_cursor, live_filter
+
+
+def fts_name(tablename: str) -> str:
+    return f"{tablename}_fts"
+
+
+def create_statements(tablename: str, columns: Sequence[str]) -> List[str]:
+    fts = fts_name(tablename)
+    names = ", ".join(columns)
+    new = ", ".join(f"new.{name}" for name in columns)
+    old = ", ".join(f"old.{name}" for name in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{names}, content='{tablename}', content_rowid='id')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tablename} BEGIN "
+        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tablename} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {names}) "
+        f"VALUES ('delete', old.id, {old}); END",
+        # soft deletes do not touch the indexed columns, so they skip this
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {names} "
+        f"ON {tablename} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {names}) "
+        f"VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new}); END",
+    ]
+
+
+def drop_statements(tablename: str) -> List[str]:
+    fts = fts_name(tablename)
+    return [
+        *(f"DROP TRIGGER IF EXISTS {fts}_{suffix}" for suffix in ("ai", "ad", "au")),
+        f"DROP TABLE IF EXISTS {fts}",
+    ]
+
+
+def rebuild_statement(tablename: str) -> str:
+    """
+    Re-index every row of the base table
+    """
+    fts = fts_name(tablename)
+    return f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"
+
+
+def searchable_models(base) -> list:
+    return [
+        mapper.class_
+        for mapper in base.registry.mappers
+        if getattr(mapper.class_, "__searchable__", None)
+    ]
+
+
+def match_expression(q: str) -> str:
+    """
+    Quote every term so user input cannot hit FTS5 query syntax; terms
+    are ANDed and a trailing * keeps its prefix meaning
+    """
+    terms = []
+    for term in q.split():
+        prefix = term.endswith("*")
+        term = term.rstrip("*")
+        if not term:
+            continue
+        quoted = '"' + term.replace('"', '""') + '"'
+        terms.append(quoted + "*" if prefix else quoted)
+    if not terms:
+        raise ValueError("Empty search")
+    return " ".join(terms)
+
+
+async def search(
+    db: AsyncSession, model, q: str, cursor: str = None, limit: int = 10
+) -> dict:
+    """
+    Live rows matching `q`, best first (bm25), seek-paginated on (rank, id).
+    Raises ValueError for an empty query or a malformed cursor.
+    """
+    fts = table(fts_name(model.__tablename__), column("rowid"))
+    rank = func.bm25(literal_column(fts.name))
+
+    stmt = (
+        select(model, rank)
+        .join(fts, fts.c.rowid == model.id)
+        .where(literal_column(fts.name).op("MATCH")(match_expression(q)))
+        .where(*live_filter(model))
+    )
+    if cursor is not None:
+        value, item_id = decode_cursor(cursor, rank)
+        stmt = stmt.where(tuple_(rank, model.id) > tuple_(value, item_id))
+
+    result = await db.execute(stmt.order_by(rank, model.id).limit(limit + 1))
+    rows = result.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        item, value = rows[-1]
+        next_cursor = encode_cursor(value, item.id)
+    return {"items": [item for item, _ in rows], "next_cursor": next_cursor}
+
+
+async def rebuild(db: AsyncSession, base) -> List[str]:
+    """
+    Create missing indexes and re-index every searchable model
+    """
+    rebuilt = []
+    for model in searchable_models(base):
+        tablename = model.__tablename__
+        for statement in create_statements(tablename, model.__searchable__):
+            await db.execute(text(statement))
+        await db.execute(text(rebuild_statement(tablename)))
+        rebuilt.append(tablename)
+    await db.commit()
+    return rebuilt
@@ -0,0 +1,283 @@
+"""
+Synthetic data for large-scale testing (`./fastbg seed`).
+Rows come from a seeded RNG, so the same options give the same data,
+and are bulk-loaded with Core executemany inserts, `batch_size` rows per
+transaction. Every user gets the same bcrypt hash, computed once.
+The SQLite triggers are off while loading: stop the server first.
+"""
+import argparse
+import random
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta
+from itertools import accumulate, islice
+from typing import Dict, Iterable, Iterator, List, NamedTuple
+
+from sqlalchemy import create_engine, func, insert, select, text
+
+from fastbg.auth.security import get_password_hash
+from fastbg.counters import COUNTERS, count_expression
+from fastbg.db import Base, Comment, Post, PostTags, Tag, User, sqlite_pragmas
+from fastbg.search import fts_name, searchable_models
+
+START = datetime(2024, 1, 1)
+# rows of a table are spread evenly over this period, in id order
+SPAN = timedelta(days=365)
+WORDS = (
+    "async sqlite index cursor thread cache query schema router token "
+    "commit batch reply tag post comment search trigger counter page "
+    "latency throughput pool writer reader migration backup vacuum join"
+).split()
+
+
+class Options(NamedTuple):
+    """
+    Sizes and distributions. A `*_skew` is the exponent of a Zipf
+    distribution over ids (0 is uniform): low ids are the prolific
+    authors, the busy posts and the popular tags.
+    """
+
+    users: int = 1000
+    posts: int = 10_000
+    comments: int = 100_000
+    tags: int = 500
+    tags_per_post: int = 3
+    # share of the comments that reply to the post's open reply chain
+    reply_ratio: float = 0.5
+    # a chain this deep is closed, the next reply starts a new one
+    max_depth: int = 50
+    author_skew: float = 1.0
+    post_skew: float = 1.0
+    tag_skew: float = 1.2
+    seed: int = 0
+    password: str = "password"
+    batch_size: int = 50_000
+
+
+def zipf(rng: random.Random, ids: range, skew: float) -> Iterator[int]:
+    """
+    Endless stream of `ids`, the k-th one drawn with weight 1 / k**skew
+    """
+    cum_weights = list(accumulate(1 / rank**skew for rank in range(1, len(ids) + 1)))
+    while True:
+        yield from rng.choices(ids, cum_weights=cum_weights, k=1024)
+
+
+def texts(rng: random.Random, low: int, high: int, size: int = 4096) -> List[str]:
+    # rows pick from a pool, generating a text per row would cost more
+    # than inserting it
+    return [" ".join(rng.choices(WORDS, k=rng.randint(low, high))) for _ in range(size)]
+
+
+def timestamps(i: int, n: int) -> dict:
+    ts = START + SPAN * i / n
+    return {"created_at": ts, "updated_at": ts}
+
+
+def users(options: Options, first: int) -> Iterator[dict]:
+    password = get_password_hash(options.password)
+    for i in range(options.users):
+        yield {
+            "id": first + i,
+            "name": f"seed_{first + i}",
+            "password": password,
+            "is_soft_deleted": False,
+            **timestamps(i, options.users),
+        }
+
+
+def posts(options: Options, first: int, authors: range) -> Iterator[dict]:
+    rng = random.Random(f"{options.seed}:posts")
+    author = zipf(rng, authors, options.author_skew)
+    contents = texts(rng, 50, 300)
+    for i in range(options.posts):
+        yield {
+            "id": first + i,
+            "title": f"Seed post {first + i}",
+            "content": rng.choice(contents),
+            "author_id": next(author),
+            "is_soft_deleted": False,
+            **timestamps(i, options.posts),
+        }
+
+
+def comments(
+    options: Options, first: int, authors: range, post_ids: range
+) -> Iterator[dict]:
+    rng = random.Random(f"{options.seed}:comments")
+    author = zipf(rng, authors, options.author_skew)
+    post = zipf(rng, post_ids, options.post_skew)
+    contents = texts(rng, 5, 40)
+    # the open reply chain of each post: (id, depth) of its last reply
+    chains: Dict[int, tuple] = {}
+    for i in range(options.comments):
+        comment_id, post_id = first + i, next(post)
+        parent_id, depth = None, 0
+        tip = chains.get(post_id)
+        if tip is not None and rng.random() < options.reply_ratio:
+            parent_id, depth = tip[0], tip[1] + 1
+        if tip is None or depth:
+            chains[post_id] = (comment_id, depth)
+        if depth >= options.max_depth:
+            del chains[post_id]
+        yield {
+            "id": comment_id,
+            "content": rng.choice(contents),
+            "author_id": next(author),
+            "post_id": post_id,
+            "parent_comment_id": parent_id,
+            "is_soft_deleted": False,
+            **timestamps(i, options.comments),
+        }
+
+
+def tags(options: Options, first: int) -> Iterator[dict]:
+    rng = random.Random(f"{options.seed}:tags")
+    descriptions = texts(rng, 3, 10, size=256)
+    for i in range(options.tags):
+        yield {
+            "id": first + i,
+            "name": f"seed_{first + i}",
+            "description": rng.choice(descriptions),
+            **timestamps(i, options.tags),
+        }
+
+
+def post_tags(options: Options, post_ids: range, tag_ids: range) -> Iterator[dict]:
+    rng = random.Random(f"{options.seed}:post_tags")
+    tag = zipf(rng, tag_ids, options.tag_skew)
+    per_post = min(options.tags_per_post, len(tag_ids))
+    for i, post_id in enumerate(post_ids):
+        chosen = set()
+        while len(chosen) < per_post:
+            chosen.add(next(tag))
+        for tag_id in sorted(chosen):
+            yield {
+                "post_id": post_id,
+                "tag_id": tag_id,
+                **timestamps(i, len(post_ids)),
+            }
+
+
+def batches(rows: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def next_id(conn, model) -> int:
+    # seeded rows go after the existing ones
+    return (conn.scalar(select(func.max(model.id))) or 0) + 1
+
+
+def load(conn_factory, model, rows: Iterable[dict], batch_size: int) -> int:
+    count = 0
+    for batch in batches(rows, batch_size):
+        with conn_factory() as conn:
+            conn.execute(insert(model.__table__), batch)
+        count += len(batch)
+    return count
+
+
+@contextmanager
+def triggers_suspended(engine):
+    """
+    Drop the SQLite triggers (search index, counters) and create them
+    again afterwards: their per-row work is most of the cost of a bulk
+    insert. `fill_derived` does it for the seeded rows in one go.
+    """
+    with engine.begin() as conn:
+        triggers = conn.exec_driver_sql(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger'"
+        ).all()
+        for name, _ in triggers:
+            conn.exec_driver_sql(f"DROP TRIGGER {name}")
+    try:
+        yield
+    finally:
+        with engine.begin() as conn:
+            for _, sql in triggers:
+                conn.exec_driver_sql(sql)
+
+
+def fill_derived(engine, first: Dict[str, int]):
+    """
+    Counters and search index entries of the rows with ids from
+    `first[tablename]` on. Seeded rows only point at seeded rows, the
+    ones that were there before are not affected.
+    """
+    with engine.begin() as conn:
+        for counter in COUNTERS:
+            conn.execute(
+                text(
+                    f"UPDATE {counter.table} "
+                    f"SET {counter.column} = {count_expression(counter)} "
+                    f"WHERE id >= :first"
+                ),
+                {"first": first[counter.table]},
+            )
+        for model in searchable_models(Base):
+            table, columns = model.__tablename__, ", ".join(model.__searchable__)
+            conn.execute(
+                text(
+                    f"INSERT INTO {fts_name(table)}(rowid, {columns}) "
+                    f"SELECT id, {columns} FROM {table} WHERE id >= :first"
+                ),
+                {"first": first[table]},
+            )
+
+
+def seed(url: str, options: Options = Options()) -> Dict[str, int]:
+    """
+    Add the rows described by `options` to the database at `url` (sync
+    driver). Returns the number of rows inserted per table.
+    """
+    if options.posts and not options.users:
+        raise ValueError("Posts need at least one user")
+    if options.comments and not (options.users and options.posts):
+        raise ValueError("Comments need at least one user and one post")
+    if options.posts and options.tags_per_post and not options.tags:
+        raise ValueError("Posts can not be tagged without tags")
+
+    engine = create_engine(url)
+    sqlite_pragmas(engine)
+    with engine.connect() as conn:
+        first = {model: next_id(conn, model) for model in (User, Post, Comment, Tag)}
+
+    def ids(model, n):
+        return range(first[model], first[model] + n)
+
+    authors = ids(User, options.users)
+    post_ids = ids(Post, options.posts)
+    tag_ids = ids(Tag, options.tags)
+    steps = (
+        (User, users(options, first[User])),
+        (Post, posts(options, first[Post], authors)),
+        (Comment, comments(options, first[Comment], authors, post_ids)),
+        (Tag, tags(options, first[Tag])),
+        (PostTags, post_tags(options, post_ids, tag_ids)),
+    )
+    # the triggers (and so the derived data) only exist on SQLite
+    sqlite = engine.dialect.name == "sqlite"
+    counts = {}
+    try:
+        with triggers_suspended(engine) if sqlite else nullcontext():
+            for model, rows in steps:
+                counts[model.__tablename__] = load(
+                    engine.begin, model, rows, options.batch_size
+                )
+    finally:
+        # the batches committed before a failure too
+        if sqlite:
+            fill_derived(engine, {m.__tablename__: i for m, i in first.items()})
+        engine.dispose()
+    return counts
+
+
+def parse_args(argv: List[str]) -> Options:
+    parser = argparse.ArgumentParser(prog="fastbg seed", description=__doc__)
+    for name, default in Options._field_defaults.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default))
+    given = vars(parser.parse_args(argv))
+    return Options(
+        **{name: value for name, value in given.items() if value is not None}
+    )
@@ -7,6 +7,9 @@ from fastapi import FastAPI, Request
 from fastbg.db import create_db_sync
 from fastbg.router import ROUTERS
 from fastbg.conf import settings
+from fastbg.cache import cache_stats
+from fastbg.auth.security import hashing_pool
+from fastbg.api import user_cache, writer
 
 logger = logging.getLogger("global")
 
@@ -38,5 +41,15 @@ async def index():
     return {"status": "OK"}
 
 
+@app.get("/stats")
+async def stats():
+    return {
+        "cache": cache_stats(),
+        "users": user_cache.stats() if user_cache is not None else None,
+        "hashing": hashing_pool.stats(),
+        "writer": writer.stats(),
+    }
+
+
 for router in ROUTERS:
     app.include_router(router)
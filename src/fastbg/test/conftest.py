@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# before the settings are loaded: a throwaway database, no SQL echo
+os.environ["TEST_DIR"] = tempfile.mkdtemp()
+os.environ.setdefault("FASTBG_SETTINGS_MODULE", "fastbg.conf.test")
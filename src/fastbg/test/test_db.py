@@ -1,20 +1,61 @@
-import os
+import asyncio
+import csv
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import io
+import json
 from pathlib import Path
+import sqlite3
+import tempfile
+import time
 import unittest
+from unittest import mock
+
+from alembic import command
+from alembic.config import Config as AlembicConfig
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, insert, text, update
+from sqlalchemy.exc import OperationalError
 
 from fastbg.db import *
 from fastbg.api import *
+from fastbg import api
+from fastbg.auth.security import (
+    HashingPool,
+    create_access_token,
+    get_password_hash,
+)
+from fastbg.cache import cache_key, clear_cache, get_cache, invalidate
 from fastbg.conf import settings
+from fastbg.server import app
+from fastbg.router.core import ReadMode, make_crud_router
+from fastbg.serializer import Serializer
+from fastbg.writer import Writer
+from fastbg.counters import (
+    COUNTERS,
+    count_expression,
+    create_statements,
+    trigger_names,
+)
+from fastbg.seed import Options, seed
+from fastbg import writes
 
 db = settings.DATABASES["default"]
-ENGINE = db["engine"]
+ENGINE = db["sync_engine"]
 
-TEST_FILES = settings.TEST_FILES_DIR
 TEST_DIR = settings.TEST_DIR
+# migrations are not part of the package
+ALEMBIC_DIR = settings.BASE_DIR.parent.parent / "alembic"
+
+PASSWORD = "pw"
+# bcrypt is slow on purpose, the fixtures share one hash
+PASSWORD_HASH = get_password_hash(PASSWORD)
+
 
 def build_test_db(
-        name=ENGINE,
-    ):
+    name=ENGINE,
+):
     """
     Create test database and schema.
     """
@@ -26,17 +67,1059 @@ def build_test_db(
 
     return engine
 
+
+def reset_caches():
+    for mapper in Base.registry.mappers:
+        clear_cache(mapper.class_)
+    if user_cache is not None:
+        user_cache.clear()
+
+
 class Test_API(unittest.TestCase):
-    
+    """
+    Fresh database with two users, alice (id 1) and bob (id 2)
+    """
+
+    def setUp(self):
+        self.engine = build_test_db()
+        self.addCleanup(self.engine.dispose)
+        reset_caches()
+        self.client = TestClient(app)
+        self.insert(
+            User,
+            [
+                {"name": "alice", "password": PASSWORD_HASH},
+                {"name": "bob", "password": PASSWORD_HASH},
+            ],
+        )
+        self.headers = self.auth("alice")
+        self.other = self.auth("bob")
+
+    def auth(self, name: str) -> dict:
+        token = create_access_token({"sub": name})
+        return {"Authorization": f"Bearer {token}"}
+
+    def insert(self, model, rows: list):
+        """
+        Fixtures straight into the database, triggers included
+        """
+        now = datetime.utcnow()
+        rows = [{"created_at": now, "updated_at": now, **row} for row in rows]
+        with self.engine.begin() as conn:
+            conn.execute(insert(model), rows)
+
+    def insert_posts(self, n: int, author_id: int = 1):
+        self.insert(
+            Post,
+            [
+                {
+                    "title": f"post {author_id}.{i}",
+                    "content": "text",
+                    "author_id": author_id,
+                }
+                for i in range(1, n + 1)
+            ],
+        )
+
+    def ok(self, response, status_code: int = 200):
+        self.assertEqual(response.status_code, status_code, response.text)
+        return response.json() if response.content else None
+
+    def get(self, path: str, **kwargs):
+        return self.ok(self.client.get(path, headers=self.headers, **kwargs))
+
+    def send(self, method: str, path: str, status_code: int = 200, **kwargs):
+        response = self.client.request(method, path, headers=self.headers, **kwargs)
+        return self.ok(response, status_code)
+
+    @contextmanager
+    def statements(self, engine=api.engine):
+        """
+        SQL sent through `engine` (the writer by default) meanwhile
+        """
+        sent = []
+        listener = lambda conn, cursor, statement, *args: sent.append(statement)
+        event.listen(engine.sync_engine, "before_cursor_execute", listener)
+        try:
+            yield sent
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", listener)
+
+    def pages(self, path: str, **params) -> list:
+        """
+        Every page of a list endpoint, following `next_cursor`
+        """
+        pages, cursor = [], None
+        while True:
+            page = self.get(
+                path, params={**params, "cursor": cursor} if cursor else params
+            )
+            pages.append(page)
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return pages
+
+
+class Test_Pagination(Test_API):
+    def test_cursor_pages(self):
+        self.insert_posts(25)
+        pages = self.pages("/post/", page_size=10)
+        self.assertEqual([len(page["items"]) for page in pages], [10, 10, 5])
+        ids = [item["id"] for page in pages for item in page["items"]]
+        self.assertEqual(ids, list(range(1, 26)))
+
+    def test_cursor_descending(self):
+        self.insert_posts(5)
+        pages = self.pages("/post/", page_size=2, sort="-id")
+        ids = [item["id"] for page in pages for item in page["items"]]
+        self.assertEqual(ids, [5, 4, 3, 2, 1])
+
+    def test_cursor_stable_under_inserts(self):
+        # offsets would shift, a cursor seeks past the last row seen
+        self.insert_posts(4)
+        first = self.get("/post/", params={"page_size": 2, "sort": "-id"})
+        self.insert(Post, [{"title": "new", "content": "text", "author_id": 1}])
+        params = {"page_size": 2, "sort": "-id", "cursor": first["next_cursor"]}
+        second = self.get("/post/", params=params)
+        self.assertEqual([item["id"] for item in second["items"]], [2, 1])
+
+    def test_cursor_custom_endpoint(self):
+        self.insert_posts(3)
+        self.insert_posts(2, author_id=2)
+        pages = self.pages("/user/1/posts", page_size=2)
+        ids = [item["id"] for page in pages for item in page["items"]]
+        self.assertEqual(ids, [1, 2, 3])
+
+    def test_ties_on_sort_key(self):
+        # the rows of each INSERT share their updated_at
+        self.insert_posts(3)
+        self.insert_posts(4, author_id=2)
+        for sort, expected in (
+            ("updated_at", [1, 2, 3, 4, 5, 6, 7]),
+            ("-updated_at", [7, 6, 5, 4, 3, 2, 1]),
+        ):
+            for page_size in (1, 2, 3):
+                pages = self.pages("/post/", page_size=page_size, sort=sort)
+                ids = [item["id"] for page in pages for item in page["items"]]
+                self.assertEqual(ids, expected, (sort, page_size))
+
+    def test_ties_with_filter(self):
+        self.insert_posts(3)
+        self.insert_posts(4, author_id=2)
+        pages = self.pages("/post/", page_size=2, sort="-updated_at", author_id=2)
+        ids = [item["id"] for page in pages for item in page["items"]]
+        self.assertEqual(ids, [7, 6, 5, 4])
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/post/", params={"cursor": "garbage"})
+        self.assertEqual(self.ok(response, 400)["detail"], "Invalid cursor")
+
+    def test_invalid_thread_cursor(self):
+        self.insert_posts(1)
+        response = self.client.get("/post/1/thread", params={"cursor": "garbage"})
+        self.assertEqual(self.ok(response, 400)["detail"], "Invalid cursor")
+
+    def test_max_page_size(self):
+        params = {"page_size": settings.MAX_PAGE_SIZE + 1}
+        self.ok(self.client.get("/post/", params=params), 422)
+
+
+class Test_ETag(Test_API):
+    def setUp(self):
+        super().setUp()
+        self.insert_posts(2)
+
+    def test_not_modified(self):
+        etag = self.client.get("/post/1").headers["ETag"]
+        response = self.client.get("/post/1", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], etag)
+
+    def test_page_not_modified(self):
+        etag = self.client.get("/post/").headers["ETag"]
+        response = self.client.get("/post/", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+        self.send("PUT", "/post/2", json={"content": "changed"})
+        response = self.client.get("/post/", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_if_match(self):
+        etag = self.client.get("/post/1").headers["ETag"]
+        response = self.client.put(
+            "/post/1",
+            json={"content": "first"},
+            headers={**self.headers, "If-Match": etag},
+        )
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        # a lost update: the version it was based on is gone
+        response = self.client.put(
+            "/post/1",
+            json={"content": "second"},
+            headers={**self.headers, "If-Match": etag},
+        )
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(self.get("/post/1")["content"], "first")
+
+    def test_if_match_delete(self):
+        etag = self.client.get("/post/1").headers["ETag"]
+        self.send("PUT", "/post/1", json={"content": "changed"})
+        response = self.client.delete(
+            "/post/1", headers={**self.headers, "If-Match": etag}
+        )
+        self.assertEqual(response.status_code, 412)
+        self.get("/post/1")
+
+
+class Test_Changes(Test_API):
+    def changes(self, watermark=None, **params) -> dict:
+        if watermark is not None:
+            params["watermark"] = watermark
+        return self.get("/post/changes", params=params)
+
+    def ids(self, delta: dict) -> list:
+        return [item["id"] for item in delta["items"]]
+
+    def test_pages(self):
+        self.insert_posts(5)
+        delta = self.changes(page_size=3)
+        self.assertEqual((self.ids(delta), delta["has_more"]), ([1, 2, 3], True))
+        delta = self.changes(delta["watermark"], page_size=3)
+        self.assertEqual((self.ids(delta), delta["has_more"]), ([4, 5], False))
+        watermark = delta["watermark"]
+        # nothing new: the watermark stays
+        delta = self.changes(watermark)
+        self.assertEqual((delta["items"], delta["watermark"]), ([], watermark))
+
+    def test_tombstones(self):
+        self.insert_posts(3)
+        watermark = self.changes()["watermark"]
+        self.send("DELETE", "/post/2")
+        delta = self.changes(watermark)
+        self.assertEqual(self.ids(delta), [2])
+        self.assertTrue(delta["items"][0]["is_soft_deleted"])
+
+        self.send("POST", "/post/2/restore")
+        delta = self.changes(delta["watermark"])
+        self.assertEqual(self.ids(delta), [2])
+        self.assertFalse(delta["items"][0]["is_soft_deleted"])
+
+    def test_hard_delete_not_reported(self):
+        self.insert_posts(2)
+        watermark = self.changes()["watermark"]
+        self.send("DELETE", "/post/1", params={"hard": True})
+        self.assertEqual(self.ids(self.changes(watermark)), [])
+
+    def test_since(self):
+        self.insert_posts(1)
+        since = datetime.utcnow()
+        self.send("PUT", "/post/1", json={"content": "changed"})
+        self.insert_posts(1, author_id=2)
+        self.assertEqual(self.ids(self.changes(since=since.isoformat())), [1, 2])
+        self.assertEqual(
+            self.ids(self.changes(since=datetime.utcnow().isoformat())), []
+        )
+
+
+class Test_Bulk(Test_API):
+    def errors(self, result) -> dict:
+        return {error["index"]: error for error in result["errors"]}
+
+    def test_create_per_item_errors(self):
+        items = [
+            {"name": "a"},
+            {"name": "a"},
+            {"description": "no name"},
+            {"name": "b"},
+        ]
+        result = self.send("POST", "/tag/bulk", json=items)
+        self.assertEqual(
+            result["items"], [{"index": 0, "id": 1}, {"index": 3, "id": 2}]
+        )
+        errors = self.errors(result)
+        self.assertEqual(sorted(errors), [1, 2])
+        self.assertIn("UNIQUE", errors[1]["detail"])
+        self.assertEqual(errors[2]["detail"][0]["loc"], ["name"])
+        self.assertEqual(
+            [tag["name"] for tag in self.get("/tag/")["items"]], ["a", "b"]
+        )
+
+    def test_update_per_item_errors(self):
+        self.insert(Tag, [{"name": f"t{i}"} for i in range(1, 5)])
+        items = [
+            {"id": 1, "description": "x"},
+            {"id": 2, "description": "y"},
+            {"id": 99, "description": "z"},
+            {"id": 1, "description": "again"},
+            {"id": 3, "name": "t4"},
+            {"id": 4},
+            {"description": "no id"},
+        ]
+        result = self.send("PATCH", "/tag/bulk", json=items)
+        self.assertEqual(
+            result["items"], [{"index": 0, "id": 1}, {"index": 1, "id": 2}]
+        )
+        errors = self.errors(result)
+        self.assertEqual(errors[2]["detail"], "Item not found")
+        self.assertEqual(errors[3]["detail"], "Duplicate id")
+        self.assertIn("UNIQUE", errors[4]["detail"])
+        self.assertEqual(errors[5]["detail"], "No fields to update")
+        self.assertEqual(errors[6]["detail"], "An integer id is required")
+        tags = {tag["id"]: tag for tag in self.get("/tag/")["items"]}
+        self.assertEqual((tags[1]["description"], tags[2]["description"]), ("x", "y"))
+        self.assertEqual(tags[3]["name"], "t3")
+
+    def test_update_one_statement_per_column_set(self):
+        self.insert(Tag, [{"name": f"t{i}"} for i in range(1, 5)])
+        items = [{"id": i, "description": f"d{i}"} for i in range(1, 4)]
+        items.append({"id": 4, "name": "renamed"})
+        with self.statements() as sent:
+            result = self.send("PATCH", "/tag/bulk", json=items)
+        self.assertEqual(len(result["items"]), 4)
+        updates = [statement for statement in sent if statement.startswith("UPDATE")]
+        self.assertEqual(len(updates), 2)
+
+    def test_update_not_authorized(self):
+        self.insert_posts(1)
+        self.headers = self.other
+        result = self.send("PATCH", "/post/bulk", json=[{"id": 1, "content": "mine"}])
+        self.assertEqual(result["items"], [])
+        self.assertEqual(result["errors"][0]["detail"], "Not authorized")
+
+
+class Test_Expand(Test_API):
+    def setUp(self):
+        super().setUp()
+        self.insert_posts(3)
+        self.insert_posts(3, author_id=2)
+        self.insert(
+            Comment,
+            [
+                {"content": "c", "author_id": 1 + i % 2, "post_id": 1 + i % 6}
+                for i in range(12)
+            ],
+        )
+
+    def test_nested(self):
+        items = self.get("/post/", params={"expand": "author,comments.author"})["items"]
+        self.assertEqual([item["author"]["id"] for item in items], [1, 1, 1, 2, 2, 2])
+        for item in items:
+            self.assertEqual(len(item["comments"]), 2)
+            for comment in item["comments"]:
+                self.assertIn("name", comment["author"])
+                self.assertNotIn("password", comment["author"])
+
+    def test_depth(self):
+        params = {"expand": "comments.author.posts"}
+        self.ok(self.client.get("/post/", params=params), 400)
+        self.ok(self.client.get("/post/", params={"expand": "nothing"}), 400)
+
+    def test_no_query_per_row(self):
+        def expanded(page_size: int) -> int:
+            params = {"expand": "author,comments.author", "page_size": page_size}
+            with self.statements(api.read_engine) as sent:
+                self.get("/post/", params=params)
+            return len(sent)
+
+        self.assertEqual(expanded(2), expanded(6))
+
+    def test_sparse_fields(self):
+        items = self.get("/post/", params={"fields": "title,id"})["items"]
+        self.assertEqual(set(items[0]), {"id", "title"})
+        item = self.get("/post/1", params={"fields": "title"})
+        self.assertEqual(item, {"title": "post 1.1"})
+        self.ok(self.client.get("/user/", params={"fields": "password"}), 400)
+
+
+class Test_Serializer(Test_API):
+    def setUp(self):
+        super().setUp()
+        self.insert_posts(3)
+        self.insert_posts(2, author_id=2)
+        self.insert(Comment, [{"content": "c", "author_id": 2, "post_id": 1}])
+
+    def client_for(self, **options) -> TestClient:
+        app = FastAPI()
+        app.include_router(make_crud_router(Post, **options))
+        return TestClient(app)
+
+    def test_fast_matches_response_model(self):
+        for options in (
+            {"serializer": Serializer.FAST},
+            {"serializer": Serializer.FAST, "read_mode": ReadMode.CORE},
+        ):
+            client = self.client_for(**options)
+            for params in ({}, {"fields": "title,id"}, {"sort": "-id"}):
+                expected = self.get("/post/", params=params)
+                page = self.ok(client.get("/post/", params=params))
+                self.assertEqual(page["next_cursor"], expected["next_cursor"])
+                self.assertEqual(len(page["items"]), len(expected["items"]))
+                for item, expected_item in zip(page["items"], expected["items"]):
+                    self.assertEqual(list(item), list(expected_item), options)
+                    for name, value in expected_item.items():
+                        self.assertEqual(item[name], value, (options, name))
+
+
+class Test_Export(Test_API):
+    def setUp(self):
+        super().setUp()
+        self.insert_posts(5)
+        self.send("DELETE", "/post/3")
+        # several batches per export
+        patcher = mock.patch.object(settings, "EXPORT_BATCH_SIZE", 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def export(self, **params):
+        response = self.client.get("/post/export", params=params, headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.text)
+        return response
+
+    def test_ndjson(self):
+        response = self.export()
+        self.assertEqual(response.headers["content-type"], "application/x-ndjson")
+        self.assertIn('filename="post.ndjson"', response.headers["content-disposition"])
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([row["id"] for row in rows], [1, 2, 4, 5])
+        self.assertEqual(rows[0], {**self.get("/post/1"), "is_soft_deleted": False})
+
+    def test_csv(self):
+        response = self.export(format="csv", fields="id,title")
+        self.assertTrue(response.headers["content-type"].startswith("text/csv"))
+        rows = list(csv.reader(io.StringIO(response.text)))
+        self.assertEqual(rows[0], ["id", "title"])
+        self.assertEqual(rows[1:], [[str(i), f"post 1.{i}"] for i in (1, 2, 4, 5)])
+
+    def test_updated_since(self):
+        since = datetime.utcnow()
+        self.send("PUT", "/post/5", json={"content": "changed"})
+        response = self.export(updated_since=since.isoformat())
+        self.assertEqual(
+            [json.loads(line)["id"] for line in response.text.splitlines()], [5]
+        )
+
+
+class Test_Filters(Test_API):
+    def setUp(self):
+        super().setUp()
+        self.insert_posts(3)
+        self.insert_posts(2, author_id=2)
+
+    def ids(self, **params) -> list:
+        return [item["id"] for item in self.get("/post/", params=params)["items"]]
+
+    def test_filters(self):
+        self.assertEqual(self.ids(author_id=2), [4, 5])
+        self.assertEqual(self.ids(id__in="1,5,9"), [1, 5])
+        self.assertEqual(self.ids(id__gt=1, id__lte=3), [2, 3])
+        self.assertEqual(self.ids(title__prefix="post 2."), [4, 5])
+
+    def test_sort(self):
+        self.assertEqual(self.ids(sort="-title"), [5, 4, 3, 2, 1])
+
+    def test_not_allowed(self):
+        for params in (
+            # not in `filterable`/`sortable`, unknown or not a column
+            {"content": "text"},
+            {"password": "pw"},
+            {"sort": "content"},
+            {"sort": "-nothing"},
+            # bad operators and values
+            {"id__like": "1"},
+            {"id": "one"},
+            {"author_id__prefix": "1"},
+        ):
+            response = self.client.get("/post/", params=params)
+            self.ok(response, 422)
+
+
+class Test_Search(Test_API):
+    def setUp(self):
+        super().setUp()
+        contents = [
+            "sqlite sqlite sqlite",
+            "postgres and sqlite",
+            "nothing to see",
+            "sqlite tuning",
+            "SQLITE shouting",
+        ]
+        self.insert(
+            Post,
+            [
+                {"title": f"post {i}", "content": content, "author_id": 1}
+                for i, content in enumerate(contents, 1)
+            ],
+        )
+
+    def ids(self, q: str, **params) -> list:
+        pages = self.pages("/post/search", q=q, **params)
+        return [item["id"] for page in pages for item in page["items"]]
+
+    def indexed(self, term: str) -> list:
+        # straight from the index, soft-deleted rows included
+        with self.engine.connect() as conn:
+            result = conn.execute(
+                text("SELECT rowid FROM post_fts WHERE post_fts MATCH :q"), {"q": term}
+            )
+            return sorted(result.scalars())
+
+    def test_ranked_pages(self):
+        ids = self.ids("sqlite", page_size=2)
+        self.assertEqual(sorted(ids), [1, 2, 4, 5])
+        # the most occurrences first
+        self.assertEqual(ids[0], 1)
+        self.assertEqual(self.ids("sqlite tuning"), [4])
+        self.assertEqual(sorted(self.ids("post*")), [1, 2, 3, 4, 5])
+
+    def test_query_syntax_is_quoted(self):
+        for q in ('"', "sqlite OR", "NEAR(", "title:sqlite"):
+            self.get("/post/search", params={"q": q})
+        self.ok(self.client.get("/post/search", params={"q": "*"}), 400)
+
+    def test_index_follows_writes(self):
+        self.send("PUT", "/post/3", json={"content": "sqlite after all"})
+        self.assertIn(3, self.ids("sqlite"))
+        self.assertEqual(self.ids("nothing"), [])
+
+        self.send("DELETE", "/post/4")
+        self.assertNotIn(4, self.ids("sqlite"))
+        self.assertIn(4, self.indexed("tuning"))
+        self.send("DELETE", "/post/5", params={"hard": True})
+        self.assertEqual(self.indexed("shouting"), [])
+
+
+class Test_Thread(Test_API):
+    def setUp(self):
+        super().setUp()
+        self.insert_posts(2)
+        # (id, post, parent): 1 and 2 are top-level, 6 is three levels
+        # deep; 7 is on another post; 8 is soft deleted with its reply 9
+        comments = [
+            (1, 1, None),
+            (2, 1, None),
+            (3, 1, 1),
+            (4, 1, 3),
+            (5, 1, 1),
+            (6, 1, 4),
+            (7, 2, None),
+            (8, 1, None),
+            (9, 1, 8),
+        ]
+        self.insert(
+            Comment,
+            [
+                {
+                    "id": comment_id,
+                    "content": "c",
+                    "author_id": 1,
+                    "post_id": post_id,
+                    "parent_comment_id": parent_id,
+                    "is_soft_deleted": comment_id == 8,
+                }
+                for comment_id, post_id, parent_id in comments
+            ],
+        )
+
+    def shape(self, nodes: list) -> list:
+        return [(node["id"], self.shape(node["replies"])) for node in nodes]
+
+    def thread(self, **params) -> list:
+        pages = self.pages("/post/1/thread", **params)
+        return [self.shape(page["items"]) for page in pages]
+
+    def test_tree(self):
+        tree = [(1, [(3, [(4, [(6, [])])]), (5, [])]), (2, [])]
+        self.assertEqual(self.thread(), [tree])
+        # pages are over top-level comments, replies come with them
+        self.assertEqual(self.thread(page_size=1), [[tree[0]], [tree[1]]])
+
+    def test_depth(self):
+        self.assertEqual(self.thread(depth=1), [[(1, [(3, []), (5, [])]), (2, [])]])
+        self.assertEqual(self.thread(depth=0), [[(1, []), (2, [])]])
+        params = {"depth": settings.MAX_THREAD_DEPTH + 1}
+        self.ok(self.client.get("/post/1/thread", params=params), 422)
+
+    def test_one_query(self):
+        with self.statements(api.read_engine) as sent:
+            self.get("/post/1/thread")
+        self.assertEqual(len([st for st in sent if "RECURSIVE" in st]), 1)
+        self.ok(self.client.get("/post/9/thread"), 404)
+
+
+class Test_Authorization(Test_API):
+    def setUp(self):
+        super().setUp()
+        self.insert_posts(2)
+
+    def test_owner(self):
+        self.send("PUT", "/post/1", json={"content": "mine"})
+        self.send("DELETE", "/post/2")
+
+    def test_not_owner(self):
+        self.headers = self.other
+        # the row exists, so the filtered write is explained by `denied`
+        self.send("PUT", "/post/1", 401, json={"content": "theirs"})
+        self.send("DELETE", "/post/1", 401)
+        self.send("DELETE", "/post/1", 401, params={"hard": True})
+        self.assertEqual(self.get("/post/1")["content"], "text")
+
+    def test_missing(self):
+        self.send("DELETE", "/post/2")
+        for headers in (self.headers, self.other):
+            self.headers = headers
+            self.send("PUT", "/post/99", 404, json={"content": "x"})
+            self.send("PUT", "/post/2", 404, json={"content": "x"})
+            self.send("DELETE", "/post/2", 404)
+
+    def test_owner_no_extra_query(self):
+        # the authorization is part of the UPDATE; `denied` only runs
+        # when it matched nothing
+        with self.statements() as sent:
+            self.send("PUT", "/post/1", json={"content": "mine"})
+        self.assertFalse([st for st in sent if st.startswith("SELECT")])
+
+
+class Test_Cache(Test_API):
+    def setUp(self):
+        super().setUp()
+        self.insert_posts(1)
+        self.insert_posts(1, author_id=2)
+        # bob replies to alice on her post, alice comments on his
+        self.insert(Comment, [{"content": "c", "author_id": 1, "post_id": 1}])
+        self.insert(
+            Comment,
+            [
+                {"content": "r", "author_id": 2, "post_id": 1, "parent_comment_id": 1},
+                {
+                    "content": "c",
+                    "author_id": 1,
+                    "post_id": 2,
+                    "parent_comment_id": None,
+                },
+            ],
+        )
+
+    def cached(self, model, item_id: int) -> bool:
+        return get_cache(model).get(cache_key(model, item_id)) is not None
+
+    def test_hit(self):
+        self.assertFalse(self.cached(Post, 1))
+        first = self.get("/post/1")
+        self.assertTrue(self.cached(Post, 1))
+        with self.statements(api.read_engine) as sent:
+            self.assertEqual(self.get("/post/1"), first)
+        self.assertEqual(sent, [])
+
+    def test_invalidated_by_update(self):
+        self.get("/post/1")
+        self.send("PUT", "/post/1", json={"content": "changed"})
+        self.assertFalse(self.cached(Post, 1))
+        self.assertEqual(self.get("/post/1")["content"], "changed")
+
+    def test_cascaded_children(self):
+        for comment_id in (2, 3):
+            self.get(f"/comment/{comment_id}")
+        self.send("DELETE", "/comment/1", params={"hard": True})
+        self.ok(self.client.get("/comment/2"), 404)
+        self.headers = self.other
+        self.send("DELETE", "/post/2", params={"hard": True})
+        self.ok(self.client.get("/comment/3"), 404)
+
+    def test_cascaded_counters(self):
+        self.assertEqual(self.get("/post/1")["comment_count"], 2)
+        self.assertEqual(self.get("/comment/1")["reply_count"], 1)
+        # bob's reply goes with him
+        self.send("DELETE", "/user/2", params={"hard": True})
+        self.assertEqual(self.get("/post/1")["comment_count"], 1)
+        self.assertEqual(self.get("/comment/1")["reply_count"], 0)
+
+    def test_write_during_read(self):
+        writes = [1]
+
+        def committed(*args):
+            # a write commits and invalidates while the row is read
+            if writes:
+                invalidate(Post, writes.pop())
+
+        engine = api.read_engine.sync_engine
+        event.listen(engine, "after_cursor_execute", committed)
+        self.addCleanup(event.remove, engine, "after_cursor_execute", committed)
+        self.get("/post/1")
+        self.assertFalse(self.cached(Post, 1))
+        self.get("/post/1")
+        self.assertTrue(self.cached(Post, 1))
+
+
+class Test_Counters(Test_API):
+    def setUp(self):
+        super().setUp()
+        self.insert_posts(1)
+
+    def comment(self, **values) -> dict:
+        item = {"content": "c", "author_id": 1, "post_id": 1, **values}
+        return self.send("POST", "/comment/", json=item)
+
+    def post(self) -> dict:
+        return self.get("/post/1")
+
+    def test_counts(self):
+        self.comment()
+        self.comment(parent_comment_id=1)
+        self.assertEqual(self.post()["comment_count"], 2)
+        self.assertEqual(self.get("/comment/1")["reply_count"], 1)
+
+        self.send("DELETE", "/comment/2")
+        self.assertEqual(self.post()["comment_count"], 1)
+        self.assertEqual(self.get("/comment/1")["reply_count"], 0)
+        self.send("POST", "/comment/2/restore")
+        self.assertEqual(self.post()["comment_count"], 2)
+
+    def cached(self, model, item_id: int) -> bool:
+        return get_cache(model).get(cache_key(model, item_id)) is not None
+
+    def test_only_touched_parents_forgotten(self):
+        self.insert_posts(1, author_id=2)
+        self.assertEqual(self.post()["comment_count"], 0)
+        self.get("/post/2")
+        self.comment()
+        self.assertFalse(self.cached(Post, 1))
+        self.assertTrue(self.cached(Post, 2))
+        self.assertEqual(self.post()["comment_count"], 1)
+
+        # moved to another post: both counts change
+        self.get("/post/2")
+        self.send("PUT", "/comment/1", json={"post_id": 2})
+        self.assertEqual(self.post()["comment_count"], 0)
+        self.assertEqual(self.get("/post/2")["comment_count"], 1)
+
+    def test_tag_counts_cached(self):
+        self.insert(Tag, [{"name": "a"}, {"name": "b"}])
+        self.send("POST", "/posttags/", json={"post_id": 1, "tag_id": 1})
+        self.assertEqual(self.get("/tag/1")["post_count"], 1)
+        self.get("/tag/2")
+        self.send("DELETE", "/post/1")
+        self.assertTrue(self.cached(Tag, 2))
+        self.assertEqual(self.get("/tag/1")["post_count"], 0)
+
+    def test_changes_after_comment(self):
+        changes = self.get("/post/changes")
+        self.assertEqual([item["id"] for item in changes["items"]], [1])
+        self.comment()
+        changes = self.get("/post/changes", params={"watermark": changes["watermark"]})
+        self.assertEqual([item["id"] for item in changes["items"]], [1])
+        self.assertEqual(changes["items"][0]["comment_count"], 1)
+
+    def test_version_moves_forward(self):
+        # a version ahead of SQLite's clock, as microseconds can be
+        ahead = datetime.utcnow().replace(microsecond=999999) + timedelta(days=1)
+        with self.engine.begin() as conn:
+            conn.execute(update(Post).values(updated_at=ahead))
+        before = self.client.get("/post/1").headers["ETag"]
+
+        self.comment()
+        response = self.client.get("/post/1")
+        self.assertNotEqual(response.headers["ETag"], before)
+        self.assertGreater(datetime.fromisoformat(response.json()["updated_at"]), ahead)
+
+    def test_version_not_ahead_of_clock(self):
+        self.comment()
+        version = datetime.fromisoformat(self.post()["updated_at"])
+        self.assertLessEqual(version, datetime.utcnow())
+
+    def test_write_after_poll(self):
+        margin = 0.5
+        with mock.patch.object(settings, "CHANGES_SAFETY_MARGIN", margin):
+            self.comment()
+            watermark = self.get("/post/changes")["watermark"]
+            version = datetime.fromisoformat(self.post()["updated_at"])
+            # stamped within the millisecond of the first write, but
+            # committed after the poll
+            late = version - timedelta(microseconds=500)
+            self.insert(
+                Post,
+                [{"title": "late", "content": "c", "author_id": 2, "updated_at": late}],
+            )
+            time.sleep(margin)
+            params = {"watermark": watermark} if watermark else {}
+            changes = self.get("/post/changes", params=params)
+        self.assertIn(2, [item["id"] for item in changes["items"]])
+
+
+class Test_Principal(Test_API):
+    def test_no_read_connection_while_queued(self):
+        self.insert_posts(1)
+        pool = api.read_engine.sync_engine.pool
+        submit, held = api.writer.submit, []
+
+        async def queued(job):
+            held.append(pool.checkedout())
+            return await submit(job)
+
+        with mock.patch.object(api.writer, "submit", queued):
+            self.send("PUT", "/post/1", json={"content": "changed"})
+        self.assertEqual(held, [0])
+
+    def authenticated(self, headers: dict) -> int:
+        # the changes endpoint is one that requires a token
+        return self.client.get("/tag/changes", headers=headers).status_code
+
+    def test_cached(self):
+        self.assertEqual(self.authenticated(self.headers), 200)
+        with self.statements(api.read_engine) as sent:
+            self.assertEqual(self.authenticated(self.headers), 200)
+        self.assertFalse([st for st in sent if st.startswith("SELECT user.")])
+
+    def test_forgotten_on_soft_delete(self):
+        self.assertEqual(self.authenticated(self.headers), 200)
+        self.send("DELETE", "/user/1")
+        alice, self.headers = self.headers, self.other
+        self.assertEqual(self.authenticated(alice), 401)
+        self.send("POST", "/user/1/restore")
+        self.assertEqual(self.authenticated(alice), 200)
+
+    def test_forgotten_on_rename(self):
+        self.assertEqual(self.authenticated(self.headers), 200)
+        self.send("PUT", "/user/1", json={"name": "carol"})
+        self.assertEqual(self.authenticated(self.headers), 401)
+        self.assertEqual(self.authenticated(self.auth("carol")), 200)
+
+    def test_forgotten_on_hard_delete(self):
+        self.assertEqual(self.authenticated(self.other), 200)
+        self.send("DELETE", "/user/2", params={"hard": True})
+        self.assertEqual(self.authenticated(self.other), 401)
+
+
+class Test_Writer(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        build_test_db().dispose()
+        self.writer = Writer(api.Session, serialized=True)
+
+    async def asyncTearDown(self):
+        await self.writer.close()
+
+    def committed_tags(self) -> list:
+        # what other connections see
+        with sqlite3.connect(api.engine.url.database) as conn:
+            return [name for name, in conn.execute("SELECT name FROM tag")]
+
+    def add_tag(self, name: str):
+        return lambda db: writes.insert_item(db, Tag, {"name": name})
+
+    async def test_batch(self):
+        async def last(db):
+            seen = self.committed_tags()
+            await writes.insert_item(db, Tag, {"name": "b"})
+            return seen
+
+        results = await asyncio.gather(
+            self.writer.submit(self.add_tag("a")),
+            self.writer.submit(self.add_tag("a")),
+            self.writer.submit(last),
+            return_exceptions=True,
+        )
+        self.assertEqual(self.writer.stats()["largest_batch"], 3)
+        self.assertEqual(self.writer.stats()["batches"], 1)
+        # the failing job was rolled back alone
+        self.assertEqual(results[0].name, "a")
+        self.assertIsInstance(results[1], Exception)
+        self.assertEqual(sorted(self.committed_tags()), ["a", "b"])
+        # and the first one was not committed before the batch ended
+        self.assertEqual(results[2], [])
+
+
+class Test_Writes(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
-        pass
+        build_test_db().dispose()
+
+    async def write(self, returning: bool) -> tuple:
+        """
+        Insert, update, update a missing row and delete, with or without
+        RETURNING; the results and the statements sent
+        """
+        sent = []
+        listener = lambda conn, cursor, statement, *args: sent.append(statement)
+        event.listen(api.engine.sync_engine, "before_cursor_execute", listener)
+        self.addCleanup(
+            event.remove, api.engine.sync_engine, "before_cursor_execute", listener
+        )
+        name = f"returning {returning}"
+        with mock.patch.object(writes, "supports_returning", return_value=returning):
+            async with api.Session() as db:
+                created = await writes.insert_item(db, Tag, {"name": name})
+                updated = await writes.update_item(
+                    db, Tag, created.id, {"description": "d"}
+                )
+                missing = await writes.update_item(db, Tag, 99, {"description": "d"})
+                deleted = await writes.delete_item(db, Tag, created.id)
+                await db.commit()
+        results = (created.name, updated.description, missing, deleted)
+        return results, [st.split()[0] for st in sent if st != "BEGIN"]
+
+    async def test_returning(self):
+        results, sent = await self.write(True)
+        self.assertEqual(results, ("returning True", "d", None, True))
+        self.assertEqual(sent, ["INSERT", "UPDATE", "UPDATE", "DELETE"])
+
+    async def test_fallback(self):
+        results, sent = await self.write(False)
+        self.assertEqual(results, ("returning False", "d", None, True))
+        # the row is read back, except when nothing matched
+        self.assertEqual(
+            sent, ["INSERT", "SELECT", "UPDATE", "SELECT", "UPDATE", "DELETE"]
+        )
+
+
+class Test_Sessions(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        build_test_db().dispose()
+
+    async def pragmas(self, Session, *names: str) -> list:
+        async with Session() as db:
+            return [
+                (await db.execute(text(f"PRAGMA {name}"))).scalar() for name in names
+            ]
+
+    async def test_pragmas_on_connect(self):
+        names = ("journal_mode", "busy_timeout", "cache_size", "query_only")
+        pragmas = settings.SQLITE_PRAGMAS
+        expected = [
+            pragmas["journal_mode"].lower(),
+            pragmas["busy_timeout"],
+            pragmas["cache_size"],
+        ]
+        self.assertEqual(await self.pragmas(api.Session, *names), expected + [0])
+        self.assertEqual(await self.pragmas(api.ReadSession, *names), expected + [1])
+
+    async def test_read_session_refuses_writes(self):
+        async with api.ReadSession() as db:
+            with self.assertRaises(OperationalError):
+                await db.execute(insert(Tag).values(name="t"))
+
+
+@unittest.skipUnless(ALEMBIC_DIR.is_dir(), "needs a source checkout")
+class Test_Migrations(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.url = f"sqlite:///{Path(tmp.name) / 'migrated.sqlite'}"
+        # alembic/env.py takes the URL from the settings
+        patcher = mock.patch.dict(
+            settings.DATABASES["default"], {"sync_engine": self.url}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.config = AlembicConfig()
+        self.config.set_main_option("script_location", str(ALEMBIC_DIR))
+
+    def schema(self) -> dict:
+        engine = create_engine(self.url)
+        self.addCleanup(engine.dispose)
+        with engine.connect() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT type, name, sql FROM sqlite_master "
+                    "WHERE name NOT LIKE 'sqlite_%' AND name != 'alembic_version'"
+                )
+            )
+            return {(row.type, row.name): row.sql for row in rows}
+
+    def test_roundtrip(self):
+        command.upgrade(self.config, "head")
+        head = self.schema()
+        # the models and the migrations agree
+        tables = {name for kind, name in head if kind == "table"}
+        self.assertLessEqual(set(Base.metadata.tables), tables)
+        for counter in COUNTERS:
+            statements = create_statements(counter)
+            for name, statement in zip(trigger_names(counter), statements):
+                # SQLite keeps the statement, without IF NOT EXISTS
+                self.assertEqual(
+                    head[("trigger", name)], statement.replace("IF NOT EXISTS ", "")
+                )
+
+        command.downgrade(self.config, "base")
+        self.assertEqual(self.schema(), {})
+        command.upgrade(self.config, "head")
+        self.assertEqual(self.schema(), head)
+
+
+class Test_Seed(unittest.TestCase):
+    options = Options(
+        users=5, posts=20, comments=200, tags=6, max_depth=4, password=PASSWORD
+    )
+
+    def seeded(self, options: Options = options) -> dict:
+        """
+        Rows of a freshly seeded database, per table
+        """
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        url = f"sqlite:///{Path(tmp.name) / 'seed.sqlite'}"
+        build_test_db(url).dispose()
+        self.assertEqual(seed(url, options)["comment"], options.comments)
+
+        engine = create_engine(url)
+        self.addCleanup(engine.dispose)
+        with engine.connect() as conn:
+            for counter in COUNTERS:
+                wrong = conn.execute(
+                    text(
+                        f"SELECT id FROM {counter.table} "
+                        f"WHERE {counter.column} != {count_expression(counter)}"
+                    )
+                )
+                self.assertEqual(wrong.all(), [], counter)
+            found = conn.execute(
+                text(
+                    "SELECT count(*) FROM comment_fts WHERE comment_fts MATCH 'sqlite'"
+                )
+            )
+            self.assertGreater(found.scalar(), 0)
+            return {
+                table.name: conn.execute(
+                    # bcrypt salts differ from one run to the next
+                    table.select().with_only_columns(
+                        *(c for c in table.columns if c.name != "password")
+                    )
+                ).all()
+                for table in Base.metadata.sorted_tables
+            }
+
+    def test_reproducible(self):
+        first = self.seeded()
+        self.assertEqual(first, self.seeded())
+        self.assertNotEqual(first, self.seeded(self.options._replace(seed=1)))
+
+    def test_reply_chains(self):
+        comments = self.seeded()["comment"]
+        parents = {row.id: row.parent_comment_id for row in comments}
+        self.assertTrue(any(parent is not None for parent in parents.values()))
+        for comment_id in parents:
+            depth = 0
+            while parents[comment_id] is not None:
+                comment_id, depth = parents[comment_id], depth + 1
+            self.assertLessEqual(depth, self.options.max_depth)
+
+
+class Test_HashingPool(unittest.IsolatedAsyncioTestCase):
+    async def test_failures_are_not_completions(self):
+        pool = HashingPool(workers=1)
+        self.addCleanup(pool.shutdown)
+        await pool.run(get_password_hash, "pw")
+        with self.assertRaises(AttributeError):
+            await pool.run(get_password_hash, None)
+        stats = pool.stats()
+        self.assertEqual((stats["completed"], stats["failed"]), (1, 1))
+        self.assertEqual(stats["pending"], 0)
+
 
 def main_suite() -> unittest.TestSuite:
-    s = unittest.TestSuite()
-    load_from = unittest.defaultTestLoader.loadTestsFromTestCase
-    s.addTests(load_from(Test_API))
-    
-    return s
+    return unittest.defaultTestLoader.discover(
+        str(Path(__file__).parent), top_level_dir=str(settings.BASE_DIR.parent)
+    )
+
 
 def run():
     t = unittest.TextTestRunner()
@@ -0,0 +1,96 @@
+"""
+Comment threads. The reply tree of a post is fetched with one recursive
+query walking `(post_id, parent_comment_id)` and nested in Python in a
+single pass over the rows.
+"""
+from typing import List
+
+from sqlalchemy import func, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fastbg.db import Comment
+from fastbg.query import encode_cursor, live_filter, seek
+
+
+def thread_query(
+    post_id: int, cursor: str = None, limit: int = 10, max_depth: int = 64
+):
+    """
+    Top-level comments of `post_id` (seek-paginated on id) and their live
+    replies down to `max_depth` levels, ordered by (depth, id).
+    One extra top-level comment is fetched, without replies, so the
+    caller knows if there is a next page.
+    """
+    columns = list(Comment.__table__.columns)
+    roots = seek(
+        select(
+            *columns, func.row_number().over(order_by=Comment.id).label("position")
+        ).where(
+            Comment.post_id == post_id,
+            Comment.parent_comment_id == None,
+            *live_filter(Comment),
+        ),
+        Comment,
+        cursor,
+        limit,
+    ).cte("roots")
+
+    thread = select(
+        *(roots.c[column.name] for column in columns),
+        roots.c.position,
+        literal(0).label("depth"),
+    ).cte("thread", recursive=True)
+    replies = (
+        select(*columns, thread.c.position, thread.c.depth + 1).join(
+            thread, Comment.parent_comment_id == thread.c.id
+        )
+        # post_id first so the lookup uses the (post_id, parent) index
+        .where(
+            Comment.post_id == post_id,
+            *live_filter(Comment),
+            thread.c.depth < max_depth,
+            thread.c.position <= limit,
+        )
+    )
+    thread = thread.union_all(replies)
+    return select(thread).order_by(thread.c.depth, thread.c.id)
+
+
+def build_tree(rows, fields) -> List[dict]:
+    """
+    Nest (depth, id)-ordered rows: parents always come before their replies
+    """
+    nodes = {}
+    roots = []
+    for row in rows:
+        mapping = row._mapping
+        node = {name: mapping[name] for name in fields}
+        node["replies"] = []
+        nodes[node["id"]] = node
+        if mapping["depth"] == 0:
+            roots.append(node)
+        else:
+            nodes[node["parent_comment_id"]]["replies"].append(node)
+    return roots
+
+
+async def fetch_thread(
+    db: AsyncSession,
+    post_id: int,
+    cursor: str = None,
+    limit: int = 10,
+    max_depth: int = 64,
+) -> dict:
+    """
+    A page of the reply tree of `post_id`.
+    Raises ValueError for a malformed cursor.
+    """
+    result = await db.execute(thread_query(post_id, cursor, limit, max_depth))
+    rows = result.all()
+    roots = build_tree(rows, Comment.__table__.columns.keys())
+
+    next_cursor = None
+    if len(roots) > limit:
+        roots = roots[:limit]
+        next_cursor = encode_cursor(roots[-1]["id"], roots[-1]["id"])
+    return {"items": roots, "next_cursor": next_cursor}
@@ -0,0 +1,119 @@
+"""
+Serialized writes for SQLite, which allows a single writer at a time.
+Instead of connections fighting over the database lock, write jobs are
+queued and run one after another on a dedicated connection; jobs that
+queue up while a batch runs are committed together.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+log = logging.getLogger("global")
+
+T = TypeVar("T")
+Job = Callable[[AsyncSession], Awaitable[T]]
+
+
+class Writer:
+    """
+    Run `job(db)` coroutines on sessions from `Session`.
+    With `serialized` jobs go through a queue consumed by a single task,
+    each in its own savepoint so a failing job does not take its batch
+    down. Otherwise every job gets its own session and transaction.
+    """
+
+    def __init__(self, Session, serialized: bool = True, max_batch: int = 64):
+        self.Session = Session
+        self.serialized = serialized
+        self.max_batch = max_batch
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop = None
+        self.jobs = 0
+        self.batches = 0
+        self.largest_batch = 0
+
+    async def submit(self, job: Job) -> T:
+        """
+        Run `job` and return its result once it is committed.
+        Exceptions raised by the job (or the commit) are re-raised here.
+        """
+        if not self.serialized:
+            async with self.Session() as db:
+                result = await job(db)
+                await db.commit()
+                return result
+
+        future = asyncio.get_running_loop().create_future()
+        self._ensure_started()
+        await self._queue.put((job, future))
+        return await future
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        # a new loop (tests, reloads) needs its own queue and task
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._run_batch(batch)
+            except Exception as e:
+                log.error("Writer: %s", str(e))
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def _run_batch(self, batch: List[Tuple[Job, asyncio.Future]]):
+        outcomes = []
+        async with self.Session() as db:
+            if len(batch) == 1:
+                # nothing to isolate, skip the savepoint
+                job, future = batch[0]
+                try:
+                    outcomes.append((future, await job(db), None))
+                except Exception as e:
+                    await db.rollback()
+                    outcomes.append((future, None, e))
+            else:
+                for job, future in batch:
+                    try:
+                        async with db.begin_nested():
+                            outcomes.append((future, await job(db), None))
+                    except Exception as e:
+                        outcomes.append((future, None, e))
+            await db.commit()
+
+        self.jobs += len(batch)
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for future, result, error in outcomes:
+            if future.done():
+                # the request was cancelled
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "serialized": self.serialized,
+            "jobs": self.jobs,
+            "batches": self.batches,
+            "largest_batch": self.largest_batch,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,116 @@
+"""
+Single-statement writes using INSERT/UPDATE/DELETE ... RETURNING.
+On backends without RETURNING the statement is followed by a SELECT,
+which is still one round trip less than load, flush and refresh.
+"""
+
+from typing import Collection, Dict, Optional, Set, Type
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def supports_returning(db: AsyncSession, kind: str) -> bool:
+    """
+    `kind` is one of "insert", "update" or "delete"
+    """
+    return getattr(db.bind.dialect, f"{kind}_returning", False)
+
+
+async def _reload(db: AsyncSession, model: Type, item_id: int):
+    stmt = select(model).where(model.id == item_id)
+    result = await db.scalars(stmt.execution_options(populate_existing=True))
+    return result.one_or_none()
+
+
+async def insert_item(db: AsyncSession, model: Type, values: dict):
+    stmt = insert(model).values(**values)
+    if supports_returning(db, "insert"):
+        result = await db.scalars(stmt.returning(model))
+        return result.one()
+
+    result = await db.execute(stmt)
+    return await _reload(db, model, result.inserted_primary_key[0])
+
+
+async def update_item(
+    db: AsyncSession, model: Type, item_id: int, values: dict, *where
+):
+    """
+    UPDATE the row matching `item_id` and `where`. Returns the updated
+    instance or None if nothing matched.
+    """
+    stmt = (
+        update(model)
+        .where(model.id == item_id, *where)
+        .values(**values)
+        # an instance already in the session is refreshed from RETURNING
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    if supports_returning(db, "update"):
+        result = await db.scalars(stmt.returning(model))
+        return result.one_or_none()
+
+    result = await db.execute(stmt)
+    if result.rowcount == 0:
+        return None
+    return await _reload(db, model, item_id)
+
+
+async def delete_item(db: AsyncSession, model: Type, item_id: int, *where) -> bool:
+    """
+    Plain DELETE, bypassing relationship cascades; see `has_cascades`
+    """
+    stmt = (
+        delete(model)
+        .where(model.id == item_id, *where)
+        .execution_options(synchronize_session=False)
+    )
+    if supports_returning(db, "delete"):
+        result = await db.scalars(stmt.returning(model.id))
+        return result.one_or_none() is not None
+
+    result = await db.execute(stmt)
+    return result.rowcount > 0
+
+
+def has_cascades(model: Type) -> bool:
+    """
+    Whether deleting `model` through the session touches other rows
+    (child collections or association tables)
+    """
+    for rel in model.__mapper__.relationships:
+        if rel.secondary is not None or "delete" in rel.cascade:
+            return True
+    return False
+
+
+async def cascaded(
+    db: AsyncSession, model: Type, item_ids: Collection[int]
+) -> Dict[str, Set[int]]:
+    """
+    Ids of the rows a session delete of the `model` rows `item_ids`
+    removes along with them (child collections, recursively, and
+    association rows), per table
+    """
+    found: Dict[str, Set[int]] = {}
+    pending = [(model, set(item_ids))]
+    while pending:
+        model, item_ids = pending.pop()
+        for rel in model.__mapper__.relationships:
+            if rel.secondary is not None:
+                table = rel.secondary
+            elif "delete" in rel.cascade:
+                table = rel.mapper.local_table
+            else:
+                continue
+            # the parent's id and the column pointing at it
+            ((_, remote),) = rel.synchronize_pairs
+            result = await db.execute(select(table.c.id).where(remote.in_(item_ids)))
+            new = set(result.scalars()) - found.get(table.name, set())
+            if not new:
+                continue
+            found.setdefault(table.name, set()).update(new)
+            if rel.secondary is None:
+                pending.append((rel.mapper.class_, new))
+    return found